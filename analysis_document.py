@@ -0,0 +1,47 @@
+# 分析文件索引 - 每個請求建立一次，供內容分析三層共用
+# 小寫副本與關鍵字→首次出現位置的索引，取代各輔助函數各自的全文 .lower()/re.search
+
+from typing import Any, Dict, Iterable, Optional
+
+
+class AnalysisDocument:
+    """
+    單一文字的分析索引 (Gemini分析或整合內容)
+
+    小寫副本在建立時產生一次；關鍵字位置在首次查詢時計算並記住，
+    因此多個輔助函數查詢同一個關鍵字只需掃描一次
+    """
+
+    def __init__(self, text: str):
+        self.text = text or ''
+        self.lower = self.text.lower()
+        # 少數字元轉小寫後長度會改變 (例如 'İ')，此時小寫副本的位置不能對應回原文
+        self._aligned = len(self.lower) == len(self.text)
+        self._first: Dict[str, int] = {}
+
+    def first_offset(self, keyword: str) -> int:
+        """關鍵字 (不分大小寫) 第一次出現的位置，不存在時為 -1"""
+        key = keyword.lower()
+        if key not in self._first:
+            self._first[key] = self.lower.find(key)
+        return self._first[key]
+
+    def contains(self, keyword: str) -> bool:
+        return self.first_offset(keyword) >= 0
+
+    def contains_any(self, keywords: Iterable[str]) -> bool:
+        return any(self.first_offset(keyword) >= 0 for keyword in keywords)
+
+    def search(self, pattern: Any, keywords: Iterable[str]) -> Optional[Any]:
+        """
+        以正則 (或 extraction_patterns 中具相同 search 介面的規則) 搜尋原文，
+        但從任一關鍵字第一次出現的位置開始
+
+        pattern 必須以 keywords 之一開頭 (例如 r'(風險|挑戰)...')，
+        因此任何匹配都不可能出現在該位置之前；文件不含任何關鍵字時直接略過正則
+        """
+
+        starts = [offset for offset in (self.first_offset(k) for k in keywords) if offset >= 0]
+        if not starts:
+            return None
+        return pattern.search(self.text, min(starts) if self._aligned else 0)
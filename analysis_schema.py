@@ -0,0 +1,225 @@
+# 階段2 Gemini 結構化輸出 - 回應 schema、解析與文字呈現
+# 階段3直接讀取欄位；解析失敗時退回自由文字與正則擷取
+
+import copy
+import logging
+from typing import Dict, Any, List, Optional
+
+from serialization import loads
+
+logger = logging.getLogger('YourPods_AnalysisSchema')
+
+# Gemini response_schema (OpenAPI 子集)
+STAGE2_RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "catalyst": {
+            "type": "OBJECT",
+            "properties": {
+                "event": {"type": "STRING", "description": "最重要的價格驅動事件"},
+                "significance": {"type": "STRING", "description": "事件的重要性與時效性"}
+            },
+            "required": ["event"]
+        },
+        "metrics": {
+            "type": "OBJECT",
+            "properties": {
+                "price_change": {"type": "STRING", "description": "價格變動 (含百分比)"},
+                "volume": {"type": "STRING", "description": "成交量與交易行為"},
+                "financial_highlights": {"type": "STRING", "description": "關鍵財務指標"},
+                "peer_comparison": {"type": "STRING", "description": "與同業競爭對手比較"}
+            }
+        },
+        "sentiment": {
+            "type": "OBJECT",
+            "properties": {
+                "overall": {"type": "STRING", "enum": ["positive", "neutral", "negative"]},
+                "market_reaction": {"type": "STRING", "description": "投資者反應與情緒指標"},
+                "bull_points": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "看多理由"}
+            },
+            "required": ["overall"]
+        },
+        "consensus": {
+            "type": "OBJECT",
+            "properties": {
+                "summary": {"type": "STRING", "description": "分析師評級與目標價匯總"},
+                "rating_changes": {"type": "ARRAY", "items": {"type": "STRING"}}
+            }
+        },
+        "risks": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "主要風險因素"},
+        "outlook": {
+            "type": "OBJECT",
+            "properties": {
+                "short_term": {"type": "STRING", "description": "短期 (1-3個月) 展望"},
+                "medium_term": {"type": "STRING", "description": "中期 (3-12個月) 趨勢"}
+            }
+        },
+        "limitations": {"type": "STRING", "description": "資訊不足之處"}
+    },
+    "required": ["catalyst", "sentiment", "risks", "outlook"]
+}
+
+# 單次呼叫模式額外要求的投資觀點 (取代階段3的 Gemini 增強呼叫)
+INVESTMENT_VIEW_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "recommendation": {"type": "STRING", "enum": ["買入", "持有", "賣出"], "description": "整體投資建議"},
+        "watch_points": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "關鍵關注點和觸發條件"},
+        "risk_reward": {"type": "STRING", "description": "風險收益評估"},
+        "investor_fit": {"type": "STRING", "description": "適合的投資者類型"}
+    },
+    "required": ["recommendation", "risk_reward"]
+}
+
+
+def stage2_response_schema(include_investment_view: bool = False) -> Dict[str, Any]:
+    """階段2的回應 schema (單次呼叫模式加入 investment_view)"""
+    if not include_investment_view:
+        return STAGE2_RESPONSE_SCHEMA
+    schema = copy.deepcopy(STAGE2_RESPONSE_SCHEMA)
+    schema["properties"]["investment_view"] = INVESTMENT_VIEW_SCHEMA
+    schema["required"].append("investment_view")
+    return schema
+
+
+# 整體情緒的中文標籤
+SENTIMENT_LABELS = {"positive": "正面", "neutral": "中性", "negative": "負面"}
+
+_TEXT_FIELDS = {
+    "catalyst": ["event", "significance"],
+    "metrics": ["price_change", "volume", "financial_highlights", "peer_comparison"],
+    "sentiment": ["overall", "market_reaction"],
+    "consensus": ["summary"],
+    "outlook": ["short_term", "medium_term"]
+}
+_LIST_FIELDS = {"sentiment": ["bull_points"], "consensus": ["rating_changes"]}
+
+
+def parse_structured_analysis(text: str) -> Optional[Dict[str, Any]]:
+    """
+    解析並正規化Gemini的JSON回應
+
+    Returns:
+        只包含非空欄位的字典 (缺漏的區塊為空字典/空列表)；不是有效JSON物件時回傳 None
+    """
+
+    if not text:
+        return None
+
+    candidate = text.strip()
+    # 模型偶爾仍會包上 ```json 區塊
+    if candidate.startswith('```'):
+        candidate = candidate.strip('`')
+        candidate = candidate[candidate.find('{'):] if '{' in candidate else candidate
+
+    try:
+        data = loads(candidate)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    def clean_text(value: Any) -> str:
+        return value.strip() if isinstance(value, str) else ''
+
+    def clean_list(value: Any) -> List[str]:
+        if not isinstance(value, list):
+            return []
+        return [item.strip() for item in value if isinstance(item, str) and item.strip()]
+
+    structured: Dict[str, Any] = {}
+    for section, fields in _TEXT_FIELDS.items():
+        raw = data.get(section) if isinstance(data.get(section), dict) else {}
+        block = {field: clean_text(raw.get(field)) for field in fields}
+        for field in _LIST_FIELDS.get(section, []):
+            block[field] = clean_list(raw.get(field))
+        structured[section] = {k: v for k, v in block.items() if v}
+
+    structured["risks"] = clean_list(data.get("risks"))
+    structured["limitations"] = clean_text(data.get("limitations"))
+
+    raw_view = data.get("investment_view") if isinstance(data.get("investment_view"), dict) else {}
+    view = {
+        "recommendation": clean_text(raw_view.get("recommendation")),
+        "watch_points": clean_list(raw_view.get("watch_points")),
+        "risk_reward": clean_text(raw_view.get("risk_reward")),
+        "investor_fit": clean_text(raw_view.get("investor_fit"))
+    }
+    view = {k: v for k, v in view.items() if v}
+    if view:
+        structured["investment_view"] = view
+
+    if structured["sentiment"].get("overall") not in (None, "positive", "neutral", "negative"):
+        structured["sentiment"].pop("overall")
+
+    if not any(structured[section] for section in ("catalyst", "metrics", "sentiment", "consensus", "risks", "outlook")):
+        return None
+    return structured
+
+
+def render_analysis_text(structured: Dict[str, Any]) -> str:
+    """
+    將結構化分析呈現為Markdown文字 (用於顯示、滾動摘要與下游的自由文字處理)
+
+    標題沿用階段3備用正則所找的「核心事件：」、「關鍵數據：」、「市場反應：」
+    """
+
+    catalyst = structured.get("catalyst", {})
+    metrics = structured.get("metrics", {})
+    sentiment = structured.get("sentiment", {})
+    consensus = structured.get("consensus", {})
+    outlook = structured.get("outlook", {})
+
+    lines = ["## 1. 核心催化劑"]
+    if catalyst.get("event"):
+        lines.append(f"核心事件：{catalyst['event']}")
+    if catalyst.get("significance"):
+        lines.append(f"重要性：{catalyst['significance']}")
+
+    lines.append("\n## 2. 市場情緒分析")
+    if sentiment.get("overall"):
+        lines.append(f"整體情緒：{SENTIMENT_LABELS.get(sentiment['overall'], sentiment['overall'])}")
+    if sentiment.get("market_reaction"):
+        lines.append(f"市場反應：{sentiment['market_reaction']}")
+    lines.extend(f"- 看多：{point}" for point in sentiment.get("bull_points", []))
+
+    lines.append("\n## 3. 基本面評估")
+    for label, field in (("價格變動", "price_change"), ("成交量", "volume"),
+                         ("關鍵數據", "financial_highlights"), ("同業比較", "peer_comparison")):
+        if metrics.get(field):
+            lines.append(f"{label}：{metrics[field]}")
+
+    lines.append("\n## 4. 分析師觀點匯總")
+    if consensus.get("summary"):
+        lines.append(consensus["summary"])
+    lines.extend(f"- {change}" for change in consensus.get("rating_changes", []))
+
+    lines.append("\n## 5. 風險評估")
+    lines.extend(f"- {risk}" for risk in structured.get("risks", []))
+
+    lines.append("\n## 6. 投資建議")
+    if outlook.get("short_term"):
+        lines.append(f"短期 (1-3個月)：{outlook['short_term']}")
+    if outlook.get("medium_term"):
+        lines.append(f"中期 (3-12個月)：{outlook['medium_term']}")
+
+    if structured.get("limitations"):
+        lines.append(f"\n資訊限制：{structured['limitations']}")
+
+    return "\n".join(lines)
+
+
+def render_investment_view(view: Dict[str, Any]) -> str:
+    """將投資觀點呈現為與階段3增強分析相同的四點格式"""
+
+    lines = []
+    if view.get("recommendation"):
+        lines.append(f"1. 整體投資建議: {view['recommendation']}")
+    if view.get("watch_points"):
+        lines.append("2. 關鍵關注點和觸發條件:")
+        lines.extend(f"   - {point}" for point in view["watch_points"])
+    if view.get("risk_reward"):
+        lines.append(f"3. 風險收益評估: {view['risk_reward']}")
+    if view.get("investor_fit"):
+        lines.append(f"4. 適合的投資者類型: {view['investor_fit']}")
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+# 文章層級的增量擷取 - 將 StockTitan 頁面切分為具穩定ID的文章
+# 每支股票保留已處理文章集合與滾動摘要 (SQLite，每支股票一列)，刷新時只處理新文章
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Iterable
+
+from serialization import pack, unpack
+
+logger = logging.getLogger('YourPods_ArticleTracker')
+
+# StockTitan 個別新聞連結: /news/{TICKER}/{slug}.html
+ARTICLE_LINK_PATTERN = re.compile(r'stocktitan\.net/news/([A-Za-z0-9.\-]+)/([A-Za-z0-9\-_]+)\.html')
+
+# 文章起點：Markdown標題，或以個別新聞連結開頭的行
+ARTICLE_BOUNDARY_PATTERN = re.compile(
+    r'^(?:#{1,6}\s|\s*[-*]?\s*\[[^\]]+\]\(https?://(?:www\.)?stocktitan\.net/news/[^)]+\.html\))',
+    re.MULTILINE
+)
+
+
+def article_id(text: str) -> str:
+    """文章的穩定ID：優先使用URL slug，否則使用正規化內容的雜湊"""
+    link = ARTICLE_LINK_PATTERN.search(text)
+    if link:
+        return f"{link.group(1).upper()}/{link.group(2)}"
+
+    normalized = re.sub(r'\s+', ' ', text).strip().lower()
+    return 'sha1:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def split_articles(content: str) -> List[Dict[str, str]]:
+    """將頁面 Markdown 切分為文章列表 [{'id': ..., 'text': ...}]"""
+
+    if not content:
+        return []
+
+    starts = [m.start() for m in ARTICLE_BOUNDARY_PATTERN.finditer(content)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+
+    articles = []
+    seen_ids = set()
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(content)
+        text = content[start:end].strip()
+        if not text:
+            continue
+
+        aid = article_id(text)
+        # 同一頁面重複出現的文章只保留第一次
+        if aid in seen_ids:
+            continue
+        seen_ids.add(aid)
+        articles.append({"id": aid, "text": text})
+
+    return articles
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    ticker TEXT PRIMARY KEY,
+    seen BLOB NOT NULL,
+    seen_count INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    summary_updated REAL NOT NULL
+);
+"""
+
+
+class ArticleTracker:
+    """每支股票的已處理文章集合與滾動摘要，以 SQLite 每支股票一列持久化 (提交只寫入該股票的一列)"""
+
+    def __init__(self, state_path: str, summary_ttl_hours: float = 24.0,
+                 max_seen_per_ticker: int = 1000, max_summary_chars: int = 4000):
+        """
+        Args:
+            state_path: 狀態 SQLite 資料庫檔案
+            summary_ttl_hours: 滾動摘要有效期，過期後整頁重新處理
+            max_seen_per_ticker: 每支股票保留的文章ID上限
+            max_summary_chars: 滾動摘要保留的最大字數
+        """
+        self.state_path = state_path
+        self.summary_ttl_seconds = summary_ttl_hours * 3600
+        self.max_seen_per_ticker = max_seen_per_ticker
+        self.max_summary_chars = max_summary_chars
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(state_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def get_summary(self, ticker: str) -> Optional[str]:
+        """取得仍在有效期內的滾動摘要"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT summary, summary_updated FROM articles WHERE ticker = ?', (ticker,)
+            ).fetchone()
+        if not row or not row[0]:
+            return None
+        if time.time() - row[1] > self.summary_ttl_seconds:
+            return None
+        return row[0]
+
+    def new_articles(self, ticker: str, articles: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """過濾出尚未處理過的文章；滾動摘要失效時全部視為新文章"""
+        if self.get_summary(ticker) is None:
+            return list(articles)
+
+        seen = set(self._seen(ticker))
+        return [article for article in articles if article["id"] not in seen]
+
+    def commit(self, ticker: str, article_ids: Iterable[str], summary: str):
+        """記錄已處理的文章並更新滾動摘要 (僅在分析成功後呼叫)"""
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            row = self._conn.execute(
+                'SELECT seen, summary_updated FROM articles WHERE ticker = ?', (ticker,)
+            ).fetchone()
+
+            # 摘要已過期時舊的已處理集合一併失效
+            seen = unpack(row[0]) if row and time.time() - row[1] <= self.summary_ttl_seconds else []
+            known = set(seen)
+            for aid in article_ids:
+                if aid not in known:
+                    seen.append(aid)
+                    known.add(aid)
+            seen = seen[-self.max_seen_per_ticker:]
+
+            self._conn.execute(
+                'INSERT OR REPLACE INTO articles (ticker, seen, seen_count, summary, summary_updated) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (ticker, pack(seen), len(seen), summary[:self.max_summary_chars], time.time())
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """追蹤狀態摘要"""
+        with self._lock:
+            tracked, seen = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(seen_count), 0) FROM articles'
+            ).fetchone()
+        return {"tracked_tickers": tracked, "seen_articles": seen}
+
+    # === 內部函數 ===
+
+    def _seen(self, ticker: str) -> List[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT seen FROM articles WHERE ticker = ?', (ticker,)).fetchone()
+        return unpack(row[0]) if row else []
@@ -0,0 +1 @@
+# YourPods 效能基準測試套件
@@ -0,0 +1,138 @@
+# 公司名稱解析基準測試 - 以約1.2萬筆 (與 NASDAQ/NYSE 上市清單同量級) 的合成代碼主檔量測
+# name_index 的建立時間與每次解析的延遲 (p50/p99)，並列出各類輸入的解析結果
+#
+# 用法:
+#   python -m benchmarks.bench_name_index [--listings 12000] [--repeat 200] [--output name_index.json]
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, Any, List
+
+from name_index import NameIndex
+from symbol_master import SymbolMaster
+
+# 真實公司 (名稱寫法同 nasdaqlisted.txt / otherlisted.txt)
+REAL_LISTINGS = [
+    ('AAPL', 'Apple Inc. - Common Stock'),
+    ('APLE', 'Apple Hospitality REIT, Inc. Common Shares'),
+    ('AMAT', 'Applied Materials, Inc. - Common Stock'),
+    ('MSFT', 'Microsoft Corporation - Common Stock'),
+    ('NVDA', 'NVIDIA Corporation - Common Stock'),
+    ('GOOGL', 'Alphabet Inc. - Class A Common Stock'),
+    ('GOOG', 'Alphabet Inc. - Class C Capital Stock'),
+    ('NFLX', 'Netflix, Inc. - Common Stock'),
+    ('NTAP', 'NetApp, Inc. - Common Stock'),
+    ('NTES', 'NetEase, Inc. - American Depositary Shares'),
+    ('AMD', 'Advanced Micro Devices, Inc. - Common Stock'),
+    ('INTC', 'Intel Corporation - Common Stock'),
+    ('BRK.A', 'Berkshire Hathaway Inc.'),
+    ('BRK.B', 'Berkshire Hathaway Inc.'),
+    ('JPM', 'JP Morgan Chase & Co. Common Stock'),
+    ('F', 'Ford Motor Company Common Stock'),
+    ('KO', 'Coca-Cola Company (The) Common Stock'),
+    ('WMT', 'Walmart Inc. Common Stock'),
+    ('DIS', 'Walt Disney Company (The) Common Stock'),
+    ('PFE', 'Pfizer, Inc. Common Stock'),
+]
+
+# 查詢 → 預期結果 (代碼，或 ambiguous / not_found)
+QUERIES = {
+    "AAPL": "AAPL",
+    "apple": "AAPL",
+    "Microsft": "MSFT",
+    "nvida": "NVDA",
+    "Netflx": "NFLX",
+    "Advanced Micro Devices": "AMD",
+    "advanced micro": "AMD",
+    "intell": "INTC",
+    "walmart": "WMT",
+    "Pfizer Inc": "PFE",
+    "Coca Cola": "KO",
+    "ford motor": "F",
+    "brk.b": "BRK-B",
+    "Alphabet Inc.": "GOOGL",
+    "NET": "ambiguous",
+    "Berkshire Hathaway Inc": "BRK-B",
+    "zzqxv": "not_found",
+}
+
+_SYLLABLES = ['ar', 'bel', 'cor', 'dyn', 'en', 'fin', 'gen', 'hal', 'in', 'jet', 'kor', 'lum', 'mar', 'nex',
+              'or', 'pro', 'quan', 'ri', 'sol', 'tek', 'u', 'ver', 'wal', 'xen', 'yor', 'zen']
+_WORDS = ['Systems', 'Therapeutics', 'Energy', 'Financial', 'Bancorp', 'Technologies', 'Pharmaceuticals',
+          'Capital', 'Industries', 'Networks', 'Resources', 'Realty', 'Acquisition', 'Biosciences', 'Brands']
+_SUFFIXES = ['Inc.', 'Corporation', 'Corp.', 'Holdings, Inc.', 'Ltd.', 'plc', 'Group, Inc.']
+
+
+def synthetic_listing(count: int, seed: int = 7) -> str:
+    """產生 nasdaqlisted.txt 格式的合成上市清單 (前面是真實公司)"""
+    rng = random.Random(seed)
+    lines = ['Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares']
+    for symbol, name in REAL_LISTINGS:
+        lines.append(f"{symbol}|{name}|Q|N|N|100|N|N")
+    used = {symbol for symbol, _ in REAL_LISTINGS}
+    while len(lines) <= count:
+        stem = ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        name = f"{stem} {rng.choice(_WORDS)} {rng.choice(_SUFFIXES)} - Common Stock"
+        symbol = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(rng.randint(3, 5)))
+        if symbol in used:
+            continue
+        used.add(symbol)
+        lines.append(f"{symbol}|{name}|G|N|N|100|N|N")
+    lines.append('File Creation Time: 0101202600:00||||||')
+    return '\n'.join(lines)
+
+
+def run(listings: int, repeat: int) -> Dict[str, Any]:
+    master = SymbolMaster('/dev/null')
+    master.import_listings([synthetic_listing(listings)], save=False)
+
+    start = time.perf_counter()
+    index = NameIndex(master)
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    rows: List[Dict[str, Any]] = []
+    for query, expected in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            result = index.resolve(query)
+            timings.append((time.perf_counter() - begin) * 1e6)
+        timings.sort()
+        outcome = result["ticker"] or result["status"]
+        rows.append({
+            "query": query,
+            "status": result["status"],
+            "ticker": result["ticker"],
+            "candidates": [c["symbol"] for c in result["candidates"]],
+            "ok": outcome == expected,
+            "p50_us": round(statistics.median(timings), 1),
+            "p99_us": round(timings[int(len(timings) * 0.99) - 1], 1)
+        })
+    return {"listings": len(master), "build_ms": round(build_ms, 1), "queries": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='公司名稱解析基準測試')
+    parser.add_argument('--listings', type=int, default=12000, help='合成主檔的代碼數')
+    parser.add_argument('--repeat', type=int, default=200, help='每個查詢重複次數')
+    parser.add_argument('--output', help='將結果寫入JSON檔案')
+    args = parser.parse_args()
+
+    report = run(args.listings, args.repeat)
+    print(f"主檔 {report['listings']} 筆，建立名稱索引 {report['build_ms']:.1f}ms")
+    print(f"{'查詢':<26}{'結果':<12}{'代碼':<8}{'p50 µs':>9}{'p99 µs':>9}  候選")
+    for row in report["queries"]:
+        mark = '✅' if row["ok"] else '❌'
+        print(f"{row['query']:<26}{row['status']:<12}{row['ticker'] or '-':<8}{row['p50_us']:>9.1f}"
+              f"{row['p99_us']:>9.1f}  {mark} {', '.join(row['candidates'])}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
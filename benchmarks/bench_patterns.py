@@ -0,0 +1,118 @@
+# 內容分析擷取規則的最壞情況基準測試 - 舊版正則 vs extraction_patterns
+#
+# 用法:
+#   python -m benchmarks.bench_patterns [--sizes 100 200 400 800] [--output patterns.json]
+#
+# 每個情境以加倍的輸入長度量測，並回報相鄰長度的耗時倍數 (線性約2倍，平方約4倍，立方約8倍)；
+# 舊版正則的耗時超過 --legacy-limit 秒後不再加大輸入
+
+import argparse
+import json
+import re
+import time
+from typing import Dict, Any, Callable, List
+
+from extraction_patterns import GEMINI_PATTERNS, PERCENT_CHANGE
+
+LEGACY_PERCENT = re.compile(r'(\d+\.?\d*%|\+\d+\.?\d*%|-\d+\.?\d*%)')
+
+# 情境: 名稱 -> (規則名稱, 依長度產生輸入的函數)
+WORST_CASES: Dict[str, Any] = {
+    # 長串數字不接「%」(舊版每個起點都回溯整串)
+    "percent_long_digits": ("percent", lambda n: '1' * n),
+    "percent_digit_runs": ("percent", lambda n: ('9' * 50 + ' ') * (n // 50)),
+    # 很少「。」的長篇Gemini輸出，關鍵字密集但句段都不足50字
+    "tail_dense_short_runs": ("bull", lambda n: ('正面' + '好' * 40 + '。') * (n // 43)),
+    # 整篇沒有「。」，關鍵字重複出現
+    "tail_no_stop": ("bull", lambda n: ('正面' + 'x' * 8) * (n // 10)),
+    # 關鍵字後接大量換行 (\s* 回溯)
+    "catalyst_whitespace": ("catalyst", lambda n: '核心事件：' + ' \n' * (n // 2)),
+}
+
+
+def _legacy(rule: str):
+    if rule == 'percent':
+        return LEGACY_PERCENT
+    pattern = GEMINI_PATTERNS[rule][1]
+    return re.compile(pattern.legacy) if hasattr(pattern, 'legacy') else pattern
+
+
+def _current(rule: str):
+    return PERCENT_CHANGE if rule == 'percent' else GEMINI_PATTERNS[rule][1]
+
+
+def _time(func: Callable[[], Any], min_time: float = 0.05) -> float:
+    """單次呼叫的秒數 (短呼叫重複執行取平均)"""
+    iterations = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or elapsed > 1.0:
+            return elapsed / iterations
+
+
+def _groups(match) -> List[str]:
+    if match is None:
+        return []
+    groups = [match.group(0)]
+    i = 1
+    while True:
+        try:
+            groups.append(match.group(i))
+        except IndexError:
+            return groups
+        i += 1
+
+
+def run(sizes: List[int], legacy_limit: float) -> Dict[str, Any]:
+    report = {}
+    for name, (rule, make_input) in WORST_CASES.items():
+        legacy, current = _legacy(rule), _current(rule)
+        rows = []
+        legacy_stopped = False
+        for size in sizes:
+            text = make_input(size)
+            row = {"size": len(text), "current_ms": round(_time(lambda: current.search(text)) * 1e3, 4)}
+            if not legacy_stopped:
+                row["legacy_ms"] = round(_time(lambda: legacy.search(text)) * 1e3, 4)
+                # 結果必須與舊版相同
+                assert _groups(legacy.search(text)) == _groups(current.search(text)), (name, size)
+                legacy_stopped = row["legacy_ms"] / 1e3 > legacy_limit
+            rows.append(row)
+
+        for previous, row in zip(rows, rows[1:]):
+            for key in ("legacy_ms", "current_ms"):
+                if key in row and previous.get(key):
+                    row[key.replace('_ms', '_growth')] = round(row[key] / previous[key], 2)
+        report[name] = rows
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'情境':<26}{'長度':>9}{'舊版 ms':>12}{'倍數':>8}{'新版 ms':>12}{'倍數':>8}")
+    for name, rows in report.items():
+        for row in rows:
+            legacy = f"{row['legacy_ms']:.3f}" if 'legacy_ms' in row else '-'
+            print(f"{name:<26}{row['size']:>9}{legacy:>12}{row.get('legacy_growth', ''):>8}"
+                  f"{row['current_ms']:>12.4f}{row.get('current_growth', ''):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='擷取規則最壞情況基準測試')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 200, 400, 800, 1600, 3200])
+    parser.add_argument('--legacy-limit', type=float, default=0.5, help='舊版單次耗時超過此秒數後停止加大輸入')
+    parser.add_argument('--output', help='將結果寫入JSON檔案')
+    args = parser.parse_args()
+
+    report = run(sorted(args.sizes), args.legacy_limit)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# 序列化基準測試 - 以真實結果形狀量測各 JSON 後端與二進位內容格式的編碼/解碼速度與大小
+#
+# 用法:
+#   python -m benchmarks.bench_serialization [--articles 20] [--output serialization.json]
+#
+# 結果由假服務商驅動完整流程產生 (summary/standard/full 三種輸出模式，以及佇列檢查點用的階段2結果)，
+# 只量測已安裝的後端 (orjson、msgspec、msgpack 未安裝時略過)
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Any, Callable
+
+from benchmarks.load_test import prepare_environment
+
+
+def _time(func: Callable[[], Any], min_time: float = 0.2) -> float:
+    """單次呼叫的秒數 (重複執行取平均)"""
+    iterations = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / iterations
+
+
+async def build_payloads(articles: int) -> Dict[str, Any]:
+    """以假服務商跑一次完整流程，取得各輸出模式的結果與階段2檢查點"""
+    import main
+
+    orchestrator = main.YourPodsOrchestrator()
+    payloads = {}
+    for profile in main.RESULT_PROFILES:
+        payloads[f"result_{profile}"] = await orchestrator.process_stock_request('AAPL', True, profile)
+    payloads["checkpoint_stage2"] = payloads["result_full"]["detailed_analysis"]["stage2_information"]
+    payloads["batch_50_summary"] = [payloads["result_summary"]] * 50
+    return payloads
+
+
+def run(payloads: Dict[str, Any]) -> Dict[str, Any]:
+    from serialization import BinaryCodec, JSONCodec, available_json_backends
+
+    codecs = {}
+    for backend, installed in available_json_backends().items():
+        if installed:
+            codec = JSONCodec(backend)
+            codecs[f"json/{backend}"] = (codec.dumps_bytes, codec.loads)
+            codecs[f"json/{backend}/indent"] = (lambda obj, codec=codec: codec.dumps_bytes(obj, indent=True),
+                                                codec.loads)
+    binary = BinaryCodec(JSONCodec(), 'msgpack')
+    if binary.msgpack_available:
+        codecs["msgpack"] = (binary.pack, binary.unpack)
+    # 原本的寫法 (基準線)
+    codecs["baseline/json.dumps"] = (
+        lambda obj: json.dumps(obj, indent=2, ensure_ascii=False, default=str).encode('utf-8'),
+        json.loads
+    )
+
+    report = {}
+    for name, payload in payloads.items():
+        rows = {}
+        for codec_name, (encode, decode) in codecs.items():
+            data = encode(payload)
+            rows[codec_name] = {
+                "bytes": len(data),
+                "encode_us": round(_time(lambda: encode(payload)) * 1e6, 1),
+                "decode_us": round(_time(lambda: decode(data)) * 1e6, 1)
+            }
+        report[name] = rows
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'內容':<24}{'編碼器':<26}{'大小':>10}{'編碼 µs':>12}{'解碼 µs':>12}")
+    for name, rows in report.items():
+        baseline = rows["baseline/json.dumps"]
+        for codec_name, row in rows.items():
+            speedup = baseline["encode_us"] / row["encode_us"] if row["encode_us"] else 0
+            print(f"{name:<24}{codec_name:<26}{row['bytes']:>10}{row['encode_us']:>12.1f}"
+                  f"{row['decode_us']:>12.1f}   ×{speedup:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='序列化基準測試')
+    parser.add_argument('--articles', type=int, default=20, help='每個假頁面的文章數 (影響結果大小)')
+    parser.add_argument('--output', help='將結果寫入JSON檔案')
+    args = parser.parse_args()
+
+    prepare_environment(argparse.Namespace(
+        no_enhancement=False, profile='fast', latency_scale=0.0, error_rate=0.0,
+        seed=1, articles=args.articles, cpu_workers=0
+    ))
+    logging.disable(logging.CRITICAL)
+
+    payloads = asyncio.run(build_payloads(args.articles))
+    report = run(payloads)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
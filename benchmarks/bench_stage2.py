@@ -0,0 +1,192 @@
+# 階段2解析熱點的微基準測試
+#
+# 用法:
+#   python -m benchmarks.bench_stage2 run [--save benchmarks/baselines/stage2.json]
+#   python -m benchmarks.bench_stage2 compare benchmarks/baselines/stage2.json current.json [--threshold 0.15]
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, List
+
+from benchmarks.synthetic_pages import SCENARIOS, generate_stocktitan_page
+
+TICKER = 'AAPL'
+COMPANY = 'Apple Inc.'
+INDUSTRY = 'Technology Hardware'
+
+
+def _create_gatherer():
+    """建立不連線的資訊收集器 (虛擬API Key、暫存狀態目錄)"""
+    os.environ.setdefault('FIRECRAWL_API_KEY', 'benchmark')
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ['YOURPODS_CACHE_DIR'] = tempfile.mkdtemp(prefix='yourpods_bench_')
+
+    from script_2_improved import ImprovedInformationGatherer
+
+    # 熱點中的 logger.info 不應計入解析時間
+    logging.disable(logging.CRITICAL)
+    return ImprovedInformationGatherer()
+
+
+def _measure(func: Callable[[], Any], min_time: float = 0.2, rounds: int = 7) -> Dict[str, float]:
+    """自動決定每輪迭代次數，回傳每次呼叫的微秒數 (中位數與最小值)"""
+
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / rounds or iterations >= 1 << 20:
+            break
+        iterations *= 2
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - start) / iterations * 1e6)
+
+    return {
+        "median_us": round(statistics.median(samples), 2),
+        "min_us": round(min(samples), 2),
+        "iterations": iterations,
+        "rounds": rounds
+    }
+
+
+def _build_sources(gatherer, pages: List[str]) -> List[Dict[str, Any]]:
+    """以實際的抽取函數建立來源列表 (不計時)"""
+    sources = []
+    for i, page in enumerate(pages):
+        relevant = gatherer._extract_intelligent_content(page, TICKER, COMPANY, INDUSTRY)
+        rhea = gatherer._extract_rhea_ai_analysis(page)
+        sources.append({
+            'url': f"https://www.stocktitan.net/news/source-{i}",
+            'source': 'StockTitan_Professional',
+            'raw_content': page,
+            'relevant_content': relevant,
+            'rhea_ai_analysis': rhea,
+            'timestamp': datetime.now().isoformat(),
+            'success': True,
+            'quality_score': gatherer._calculate_content_quality(relevant, rhea)
+        })
+    return sources
+
+
+def run_benchmarks(scenarios: List[str], min_time: float) -> Dict[str, Any]:
+    """執行所有熱點 × 情境的基準測試"""
+
+    gatherer = _create_gatherer()
+    gemini_analysis = {"success": True, "professional_analysis": "benchmark"}
+    results = {}
+
+    for name in scenarios:
+        page = generate_stocktitan_page(TICKER, **SCENARIOS[name])
+        # 同一請求的多個來源 (個股頁、今日頁、即時頁) 常有重疊內容
+        pages = [page,
+                 generate_stocktitan_page(TICKER, seed=7, **SCENARIOS[name]),
+                 page[: len(page) // 2]]
+        sources = _build_sources(gatherer, pages)
+        relevant = sources[0]['relevant_content']
+        rhea = sources[0]['rhea_ai_analysis']
+
+        cases = {
+            "extract_intelligent_content": lambda: gatherer._extract_intelligent_content(
+                page, TICKER, COMPANY, INDUSTRY),
+            "extract_rhea_ai_analysis": lambda: gatherer._extract_rhea_ai_analysis(page),
+            "calculate_content_quality": lambda: gatherer._calculate_content_quality(relevant, rhea),
+            "combine_professional_content": lambda: gatherer._combine_professional_content(sources),
+            "format_compatible_result": lambda: gatherer._format_compatible_result(
+                TICKER, sources, gemini_analysis),
+        }
+
+        for case, func in cases.items():
+            key = f"{case}/{name}"
+            results[key] = _measure(func, min_time=min_time)
+            results[key]["page_bytes"] = len(page)
+            print(f"{key:<55} {results[key]['median_us']:>12.1f} µs")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "min_time": min_time
+        },
+        "results": results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """比較兩份結果，回傳超過門檻的退化項目"""
+
+    regressions = []
+    print(f"{'benchmark':<55} {'baseline':>12} {'current':>12} {'change':>9}")
+    for key, base in sorted(baseline["results"].items()):
+        if key not in current["results"]:
+            continue
+        before = base["median_us"]
+        after = current["results"][key]["median_us"]
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  ❌ REGRESSION'
+            regressions.append(key)
+        elif change < -threshold:
+            flag = '  ✅ faster'
+        print(f"{key:<55} {before:>12.1f} {after:>12.1f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="YourPods 階段2解析熱點微基準測試")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="執行基準測試")
+    run_parser.add_argument("--save", help="將結果寫入JSON (作為基準或供比較)")
+    run_parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                            help="只執行指定情境 (可重複)")
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="每個項目的最短量測時間 (秒)")
+
+    compare_parser = sub.add_parser("compare", help="比較兩份結果並標示退化")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="中位數變慢超過此比例視為退化 (預設 0.15)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run_benchmarks(args.scenario or list(SCENARIOS), args.min_time)
+        if args.save:
+            os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+            with open(args.save, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n💾 結果已儲存: {args.save}")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} 項退化超過 {args.threshold:.0%}")
+        return 1
+    print("\n✅ 沒有超過門檻的退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# 本地假服務商 - 供負載測試替換 Firecrawl、Gemini 與階段1的 yfinance 驗證
+# 延遲以對數常態分布取樣，可設定錯誤率；呼叫方式與真實 SDK 相同 (同步阻塞)
+
+import json
+import math
+import random
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+from benchmarks.synthetic_pages import generate_stocktitan_page
+
+PLACEHOLDER_TICKER = 'ZZZQ'
+
+
+@dataclass
+class LatencyProfile:
+    """單一服務商的延遲/錯誤設定"""
+    median_seconds: float
+    sigma: float = 0.5          # 對數常態分布的離散程度 (越大尾端越長)
+    error_rate: float = 0.0
+
+    def sample(self, rng: random.Random, scale: float = 1.0) -> float:
+        return self.median_seconds * math.exp(rng.gauss(0, self.sigma)) * scale
+
+
+# 預設情境：名稱 -> 各服務商設定
+PROVIDER_PROFILES: Dict[str, Dict[str, LatencyProfile]] = {
+    "fast": {
+        "stage1": LatencyProfile(0.005, 0.3),
+        "firecrawl": LatencyProfile(0.05, 0.3),
+        "gemini": LatencyProfile(0.1, 0.3),
+    },
+    "realistic": {
+        "stage1": LatencyProfile(0.3, 0.5, 0.005),
+        "firecrawl": LatencyProfile(2.5, 0.6, 0.02),
+        "gemini": LatencyProfile(4.0, 0.5, 0.01),
+    },
+    "degraded": {
+        "stage1": LatencyProfile(0.8, 0.8, 0.02),
+        "firecrawl": LatencyProfile(6.0, 0.9, 0.10),
+        "gemini": LatencyProfile(8.0, 0.8, 0.05),
+    },
+}
+
+
+class FakeProviderError(Exception):
+    """假服務商注入的錯誤"""
+
+
+class _Sampler:
+    """執行緒安全的延遲/錯誤取樣"""
+
+    def __init__(self, profile: LatencyProfile, scale: float, seed: int):
+        self.profile = profile
+        self.scale = scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def wait(self, name: str):
+        with self._lock:
+            self.calls += 1
+            delay = self.profile.sample(self._rng, self.scale)
+            failed = self._rng.random() < self.profile.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        if failed:
+            raise FakeProviderError(f"{name} injected failure")
+
+
+class FakeFirecrawl:
+    """模擬 FirecrawlApp.scrape_url，回傳合成的 StockTitan 頁面"""
+
+    def __init__(self, profile: LatencyProfile, scale: float = 1.0, seed: int = 1,
+                 page_params: Optional[Dict[str, Any]] = None):
+        self.sampler = _Sampler(profile, scale, seed)
+        # 頁面只產生一次，之後以代碼替換，避免產生器本身成為負載
+        self._template = generate_stocktitan_page(PLACEHOLDER_TICKER, **(page_params or {}))
+
+    def scrape_url(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.sampler.wait('firecrawl')
+        ticker = url.rstrip('/').split('/')[-1].upper()
+        return {'success': True, 'markdown': self._template.replace(PLACEHOLDER_TICKER, ticker)}
+
+
+# 結構化輸出 (response_schema) 時回傳的JSON
+FAKE_STRUCTURED_ANALYSIS = {
+    "catalyst": {"event": "公司公布季度財報，營收與獲利優於市場預期", "significance": "高"},
+    "metrics": {"price_change": "+3.5%", "volume": "成交量為平均的兩倍",
+                "financial_highlights": "營收年增15%，毛利率45%", "peer_comparison": "成長速度高於主要競爭對手"},
+    "sentiment": {"overall": "positive", "market_reaction": "股價上漲，投資者情緒正面",
+                  "bull_points": ["新產品週期帶動營收成長"]},
+    "consensus": {"summary": "分析師普遍上調目標價，維持買入評級", "rating_changes": []},
+    "risks": ["估值偏高", "總體經濟不確定性"],
+    "outlook": {"short_term": "關注下一季指引", "medium_term": "新產品週期支撐成長"}
+}
+
+FAKE_INVESTMENT_VIEW = {
+    "recommendation": "持有",
+    "watch_points": ["下一季營收指引", "毛利率變化"],
+    "risk_reward": "上檔空間有限，下檔風險中等",
+    "investor_fit": "適合中長期成長型投資者"
+}
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """模擬 GenerativeModel.generate_content"""
+
+    def __init__(self, profile: LatencyProfile, scale: float = 1.0, seed: int = 2):
+        self.sampler = _Sampler(profile, scale, seed)
+
+    def generate_content(self, prompt: str, generation_config: Any = None, **kwargs) -> _FakeResponse:
+        self.sampler.wait('gemini')
+        config = generation_config if isinstance(generation_config, dict) else vars(generation_config or object())
+        if config.get('response_mime_type') == 'application/json':
+            payload = dict(FAKE_STRUCTURED_ANALYSIS)
+            if 'investment_view' in (config.get('response_schema') or {}).get('properties', {}):
+                payload['investment_view'] = FAKE_INVESTMENT_VIEW
+            return _FakeResponse(json.dumps(payload, ensure_ascii=False))
+        return _FakeResponse(
+            "## 1. 核心催化劑\n核心事件：公司公布季度財報，營收優於預期。\n"
+            "## 2. 市場情緒分析\n市場反應：股價上漲，成交量放大，投資者情緒正面。\n"
+            "## 4. 分析師觀點匯總\n分析師普遍上調目標價，維持買入評級。\n"
+            f"## 5. 風險評估\n主要風險為估值偏高與總體經濟不確定性。 (prompt {len(prompt)} chars)"
+        )
+
+
+def make_fake_input_processor(profile: LatencyProfile, scale: float = 1.0, seed: int = 3):
+    """建立取代階段1 InputProcessor 的類別 (以執行緒模擬 yfinance 的阻塞呼叫)"""
+
+    import asyncio
+
+    sampler = _Sampler(profile, scale, seed)
+
+    class FakeInputProcessor:
+        async def process(self, user_input: str) -> Dict[str, Any]:
+            ticker = user_input.strip().upper()
+            loop = asyncio.get_event_loop()
+            try:
+                await loop.run_in_executor(None, sampler.wait, 'stage1')
+            except FakeProviderError as e:
+                return {"status": "invalid", "standardized_ticker": ticker, "error_message": str(e)}
+            return {
+                "status": "valid",
+                "standardized_ticker": ticker,
+                "company_name": f"{ticker} Holdings Inc.",
+                "exchange": "NASDAQ",
+                "industry": "Technology Hardware",
+                "market_status": "closed",
+                "current_price": 100.0,
+                "currency": "USD"
+            }
+
+    FakeInputProcessor.sampler = sampler
+    return FakeInputProcessor
+
+
+def install_fake_stage1(fake_processor_class) -> None:
+    """在匯入 main.py 之前以假的 input_processor 模組取代真實的階段1 (代碼主檔與即時股價)"""
+    module = types.ModuleType('input_processor')
+    module.InputProcessor = fake_processor_class
+    sys.modules['input_processor'] = module
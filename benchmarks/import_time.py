@@ -0,0 +1,116 @@
+# 啟動匯入時間預算 - 以 python -X importtime 量測 main.py --help 的模組匯入耗時
+#
+# 用法:
+#   python -m benchmarks.import_time [--budget-ms 300] [--runs 3] [--output import_time.json]
+#   python -m benchmarks.import_time --script service.py --allow aiohttp
+#
+# 取多次執行的中位數；總匯入時間超過預算，或匯入了應延遲載入的服務商 SDK 時回傳非零結束碼
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只應在第一次呼叫服務商時載入的套件 (--help、狀態查詢、CPU 行程池工作行程都不需要)
+DEFERRED_MODULES = ('google.generativeai', 'firecrawl', 'aiohttp', 'yfinance', 'pandas', 'grpc')
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    解析 -X importtime 輸出
+
+    Returns:
+        [{"module", "depth", "self_us", "cumulative_us"}]，依匯入完成順序
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # 模組名稱前有一個空格，之後每層巢狀匯入多兩個空格
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append({
+            "module": name.strip(),
+            "depth": depth,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us)
+        })
+    return rows
+
+
+def measure(python: str, script: str, script_args: List[str]) -> Dict[str, Any]:
+    """執行一次並回傳匯入明細與實際耗時"""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [python, '-X', 'importtime', script] + script_args,
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1e3
+    rows = parse_importtime(completed.stderr)
+    return {
+        "returncode": completed.returncode,
+        "wall_ms": wall_ms,
+        "import_ms": sum(row["self_us"] for row in rows) / 1e3,
+        "rows": rows,
+        "stderr_tail": completed.stderr.splitlines()[-5:] if completed.returncode else []
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='啟動匯入時間預算')
+    parser.add_argument('--script', default='main.py', help='要量測的入口腳本 (相對於專案根目錄)')
+    parser.add_argument('--args', nargs='*', default=['--help'], help='傳給入口腳本的參數')
+    parser.add_argument('--python', default=sys.executable, help='使用的直譯器')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--budget-ms', type=float, default=300.0, help='匯入時間預算 (中位數)')
+    parser.add_argument('--allow', nargs='*', default=[], help='允許在啟動時匯入的延遲套件')
+    parser.add_argument('--top', type=int, default=15, help='列出累計耗時最高的模組數')
+    parser.add_argument('--output', help='將結果寫入JSON檔案')
+    args = parser.parse_args()
+
+    runs = [measure(args.python, args.script, args.args) for _ in range(args.runs)]
+    failed = [run for run in runs if run["returncode"] != 0]
+    if failed:
+        print(f"❌ {args.script} {' '.join(args.args)} 結束碼 {failed[0]['returncode']}")
+        print('\n'.join(failed[0]["stderr_tail"]))
+        sys.exit(2)
+
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    wall_ms = statistics.median(run["wall_ms"] for run in runs)
+    rows = runs[-1]["rows"]
+    loaded = {row["module"] for row in rows}
+    deferred = [name for name in DEFERRED_MODULES
+                if name not in args.allow and any(m == name or m.startswith(name + '.') for m in loaded)]
+
+    print(f"{args.script} {' '.join(args.args)}: 匯入 {import_ms:.1f}ms (預算 {args.budget_ms:.0f}ms)，"
+          f"整體 {wall_ms:.1f}ms，{len(rows)} 個模組")
+    print(f"{'累計 ms':>10}{'自身 ms':>10}  模組")
+    for row in sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:args.top]:
+        print(f"{row['cumulative_us'] / 1e3:>10.1f}{row['self_us'] / 1e3:>10.1f}  {'  ' * row['depth']}{row['module']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"script": args.script, "args": args.args, "import_ms": import_ms, "wall_ms": wall_ms,
+                       "budget_ms": args.budget_ms, "deferred_loaded": deferred, "modules": rows},
+                      f, ensure_ascii=False, indent=2)
+
+    ok = True
+    if deferred:
+        print(f"❌ 啟動時匯入了應延遲載入的套件: {', '.join(deferred)}")
+        ok = False
+    if import_ms > args.budget_ms:
+        print(f"❌ 匯入時間 {import_ms:.1f}ms 超過預算 {args.budget_ms:.0f}ms")
+        ok = False
+    if ok:
+        print("✅ 符合啟動預算")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+# 吞吐量與尾端延遲負載測試 - 以本地假服務商驅動 batch_analyze_stocks / process_stock_request
+#
+# 用法:
+#   python -m benchmarks.load_test --tickers 200 --concurrency 3 10 30 --profile fast
+#   python -m benchmarks.load_test --tickers 1000 --mode single --profile realistic --latency-scale 0.1
+#   python -m benchmarks.load_test --tickers 500 --concurrency 20 --output load_report.json
+#   python -m benchmarks.load_test --tickers 1000 --concurrency 30 --articles 40 --cpu-workers 4
+#   python -m benchmarks.load_test --tickers 1000 --mode pipeline --stage-workers scrape=12 llm=4 --profile realistic
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from benchmarks.fake_providers import (
+    PROVIDER_PROFILES, FakeFirecrawl, FakeGeminiModel,
+    make_fake_input_processor, install_fake_stage1
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def synthetic_tickers(count: int) -> List[str]:
+    """產生不重複的四字母代碼 (AAAA, AAAB, ...)"""
+    letters = itertools.product(string.ascii_uppercase, repeat=4)
+    return [''.join(chars) for chars in itertools.islice(letters, count)]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """程序的最高常駐記憶體 (MB)；Linux 以KB回報，macOS 以位元組回報"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+class EventLoopLagMonitor:
+    """定期排程短暫休眠，記錄實際喚醒時間比預期晚多少 (事件迴圈被阻塞的程度)"""
+
+    def __init__(self, interval: float = 0.05):
+        from metrics import LatencyHistogram
+
+        self.interval = interval
+        self.histogram = LatencyHistogram()
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.histogram.observe(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        return self.histogram.summary()
+
+
+def prepare_environment(args) -> Dict[str, Any]:
+    """
+    設定環境變數並將假服務商接到真實的階段2/3實例上
+
+    關閉結果快取、LLM快取、增量擷取與自適應等待，讓每個代碼都走完整流程；
+    API用量上限放寬，避免負載測試被限流邏輯截斷
+    """
+    os.environ.setdefault('FIRECRAWL_API_KEY', 'load-test')
+    os.environ.setdefault('GEMINI_API_KEY', 'load-test')
+    os.environ['YOURPODS_CACHE_DIR'] = tempfile.mkdtemp(prefix='yourpods_load_')
+    os.environ['CACHE_DURATION_HOURS'] = '0'
+    os.environ['LLM_CACHE_ENABLED'] = 'false'
+    os.environ['INCREMENTAL_INGESTION'] = 'false'
+    os.environ['ADAPTIVE_WAIT_ENABLED'] = 'false'
+    os.environ['DAILY_API_LIMIT'] = str(10 ** 9)
+    os.environ['HOURLY_API_LIMIT'] = str(10 ** 9)
+    os.environ['USE_GEMINI_ENHANCEMENT'] = 'false' if args.no_enhancement else 'true'
+    os.environ['CPU_POOL_WORKERS'] = str(args.cpu_workers)
+    # 工作行程以 spawn 啟動，不繼承 logging.disable，改以環境變數壓低日誌等級
+    os.environ['LOG_LEVEL'] = 'CRITICAL'
+
+    profile = PROVIDER_PROFILES[args.profile]
+    scale = args.latency_scale
+    if args.error_rate is not None:
+        for provider in profile.values():
+            provider.error_rate = args.error_rate
+
+    install_fake_stage1(make_fake_input_processor(profile['stage1'], scale, seed=args.seed))
+
+    import script_2_improved
+    import script_3_improved
+
+    firecrawl = FakeFirecrawl(profile['firecrawl'], scale, seed=args.seed + 1,
+                              page_params={'articles': args.articles})
+    gemini_stage2 = FakeGeminiModel(profile['gemini'], scale, seed=args.seed + 2)
+    gemini_stage3 = FakeGeminiModel(profile['gemini'], scale, seed=args.seed + 3)
+
+    gatherer = script_2_improved.ImprovedInformationGatherer()
+    gatherer.firecrawl = firecrawl
+    gatherer.gemini_model = gemini_stage2
+    script_2_improved._gatherer_instance = gatherer
+
+    analyzer = script_3_improved.ImprovedContentAnalyzer()
+    if analyzer.config.gemini_enabled:
+        analyzer.config.gemini_model = gemini_stage3
+    script_3_improved._analyzer_instance = analyzer
+
+    return {"firecrawl": firecrawl, "gemini_stage2": gemini_stage2, "gemini_stage3": gemini_stage3}
+
+
+async def run_level(tickers: List[str], concurrency: Optional[int], mode: str,
+                    single_shot: bool = False,
+                    stage_workers: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """以指定並行度 (流水線模式為各段工作池) 跑完一輪並收集指標"""
+
+    import main
+    from metrics import REGISTRY
+    from pipeline_engine import PipelineConfig
+
+    REGISTRY.reset()
+    monitor = EventLoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+
+    if mode == 'batch':
+        results = await main.batch_analyze_stocks(tickers, max_concurrent=concurrency, single_shot=single_shot,
+                                                  pipeline=False)
+    elif mode == 'pipeline':
+        results = await main.batch_analyze_stocks(tickers, single_shot=single_shot, pipeline=True,
+                                                  stage_workers=stage_workers)
+    else:
+        # 單一協調器 + 自行控制並行度，與服務端長駐實例的用法相同
+        orchestrator = main.YourPodsOrchestrator(single_shot)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(ticker: str) -> Dict[str, Any]:
+            queued_at = time.perf_counter()
+            async with semaphore:
+                REGISTRY.observe('queue_wait_seconds', time.perf_counter() - queued_at, queue='load_test')
+                return await orchestrator.process_stock_request(ticker, True)
+
+        results = await asyncio.gather(*(one(t) for t in tickers))
+
+    elapsed = time.perf_counter() - start
+    lag = await monitor.stop()
+    summary = REGISTRY.summary()
+
+    statuses: Dict[str, int] = {}
+    for result in results:
+        status = result.get('status', 'unknown')
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        "concurrency": concurrency if mode != 'pipeline' else PipelineConfig(stage_workers).stage_workers,
+        "tickers": len(tickers),
+        "elapsed_seconds": round(elapsed, 2),
+        "tickers_per_minute": round(len(tickers) / elapsed * 60, 1) if elapsed else 0.0,
+        "statuses": statuses,
+        "request": summary.get('request_seconds', {}),
+        "stages": summary.get('stage_seconds', {}),
+        "providers": summary.get('provider_seconds', {}),
+        "queue_wait": summary.get('queue_wait_seconds', {}),
+        "cpu_pool": summary.get('cpu_pool_seconds', {}),
+        "event_loop_lag": lag,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def print_level(report: Dict[str, Any]):
+    print(f"\n=== 並行度 {report['concurrency']}: {report['tickers']} 支 / "
+          f"{report['elapsed_seconds']}s → {report['tickers_per_minute']} 支/分鐘 ===")
+    print(f"結果: {report['statuses']}  峰值RSS: {report['peak_rss_mb']} MB")
+
+    print(f"{'項目':<56}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    rows = [("request", report['request'])]
+    for group in ('stages', 'providers', 'queue_wait', 'cpu_pool'):
+        rows.extend((f"{group}:{label}", series) for label, series in sorted(report[group].items()))
+    for name, series in rows:
+        for label, stats in (series.items() if name == 'request' else [(None, series)]):
+            title = name if label in (None, 'all') else f"{name}:{label}"
+            print(f"{title:<56}{stats['count']:>7}{stats['p50']:>9.3f}{stats['p95']:>9.3f}"
+                  f"{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+
+    lag = report['event_loop_lag']
+    print(f"{'event_loop_lag':<56}{lag['count']:>7}{lag['p50']:>9.3f}{lag['p95']:>9.3f}"
+          f"{lag['p99']:>9.3f}{lag['max']:>9.3f}")
+
+
+async def run(args) -> Dict[str, Any]:
+    providers = prepare_environment(args)
+    tickers = synthetic_tickers(args.tickers)
+
+    from cpu_pool import get_cpu_pool
+
+    levels = []
+    try:
+        # 流水線模式的並行度由各段工作池決定，只跑一輪
+        for concurrency in (args.concurrency if args.mode != 'pipeline' else [None]):
+            report = await run_level(tickers, concurrency, args.mode, args.single_shot, args.stage_workers)
+            print_level(report)
+            levels.append(report)
+    finally:
+        get_cpu_pool().shutdown()
+
+    return {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": args.mode,
+        "profile": args.profile,
+        "latency_scale": args.latency_scale,
+        "single_shot": args.single_shot,
+        "cpu_workers": args.cpu_workers,
+        "provider_calls": {
+            name: {"calls": fake.sampler.calls, "errors": fake.sampler.errors}
+            for name, fake in providers.items()
+        },
+        "levels": levels
+    }
+
+
+def parse_stage_workers(value: str) -> Dict[str, int]:
+    """解析 scrape=12,llm=4 形式的工作池設定"""
+    workers = {}
+    for spec in value.split(','):
+        stage, _, count = spec.partition('=')
+        if not count.isdigit():
+            raise argparse.ArgumentTypeError(f'格式應為 STAGE=N: {spec}')
+        workers[stage.strip()] = int(count)
+    return workers
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='YourPods 吞吐量/尾端延遲負載測試 (本地假服務商)')
+    parser.add_argument('--tickers', type=int, default=100, help='代碼數量 (10-5000)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[3], help='要測試的並行度 (可多個)')
+    parser.add_argument('--mode', choices=['batch', 'pipeline', 'single'], default='batch',
+                        help='batch: 共用並行名額的 batch_analyze_stocks；pipeline: 流水線批次引擎；'
+                             'single: 單一協調器的 process_stock_request')
+    parser.add_argument('--stage-workers', type=parse_stage_workers, default=None, metavar='STAGE=N,...',
+                        help='流水線模式各段工作池大小，例如 scrape=12,llm=4')
+    parser.add_argument('--profile', choices=sorted(PROVIDER_PROFILES), default='fast', help='服務商延遲/錯誤情境')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='延遲縮放倍數 (例如0.1加速 realistic 情境)')
+    parser.add_argument('--error-rate', type=float, help='覆寫所有服務商的錯誤率')
+    parser.add_argument('--articles', type=int, default=10, help='每個假頁面的文章數')
+    parser.add_argument('--no-enhancement', action='store_true', help='停用階段3的Gemini增強')
+    parser.add_argument('--single-shot', action='store_true', help='單次LLM呼叫模式 (階段2一併產生投資觀點)')
+    parser.add_argument('--cpu-workers', type=int, default=0, help='CPU行程池工作行程數 (0 為在事件迴圈中直接抽取)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='將完整報告寫入JSON檔案')
+    args = parser.parse_args()
+
+    if not 10 <= args.tickers <= 5000:
+        parser.error('--tickers 必須介於 10 與 5000 之間')
+
+    # 每個請求的日誌 (含注入錯誤) 在大量代碼下會主導輸出與CPU，錯誤數量見 statuses 與 provider_calls
+    logging.disable(logging.CRITICAL)
+
+    report = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n報告已寫入 {args.output}")
+
+
+if __name__ == '__main__':
+    main_cli()
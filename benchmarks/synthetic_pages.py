@@ -0,0 +1,87 @@
+# 合成 StockTitan 頁面產生器 - 供基準測試使用
+# 可調整頁面大小 (文章數、段落長度)、Rhea-AI 區塊密度與目標代碼提及率
+
+import random
+from typing import Dict, Any, Optional
+
+FILLER_WORDS = [
+    'market', 'shares', 'investors', 'quarter', 'growth', 'company', 'sector', 'demand',
+    'outlook', 'results', 'revenue', 'earnings', 'guidance', 'analyst', 'rating', 'target',
+    'price', 'volume', 'trading', 'deal', 'product', 'launch', 'margin', 'cash', 'debt',
+    'strong', 'weak', 'beat', 'miss', 'expectations', 'consumer', 'cloud', 'supply', 'chain'
+]
+
+OTHER_TICKERS = ['MSFT', 'TSLA', 'NVDA', 'AMZN', 'META', 'GOOGL', 'JPM', 'XOM', 'PFE', 'KO']
+
+SENTIMENTS = ['Positive', 'Negative', 'Neutral']
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = ' '.join(rng.choice(FILLER_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _paragraph(rng: random.Random, chars: int, mention: Optional[str] = None) -> str:
+    sentences = []
+    length = 0
+    while length < chars:
+        sentence = _sentence(rng, rng.randint(8, 18))
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    if mention:
+        position = rng.randrange(len(sentences))
+        sentences[position] = f"{mention} (NASDAQ: {mention}) " + sentences[position]
+    return ' '.join(sentences)
+
+
+def generate_stocktitan_page(ticker: str = 'AAPL', articles: int = 50,
+                             paragraphs_per_article: int = 3, paragraph_chars: int = 400,
+                             rhea_density: float = 0.3, mention_rate: float = 0.2,
+                             seed: int = 42) -> str:
+    """
+    產生模擬 StockTitan 新聞列表頁的 Markdown
+
+    Args:
+        ticker: 目標股票代碼
+        articles: 文章數量
+        paragraphs_per_article: 每篇文章的段落數
+        paragraph_chars: 每段約略字元數
+        rhea_density: 帶有 Rhea-AI 區塊的文章比例
+        mention_rate: 關於目標代碼的文章比例 (其餘為其他代碼)
+        seed: 亂數種子 (相同參數產生相同頁面)
+    """
+    rng = random.Random(seed)
+    blocks = ["# Stock News\n\nLatest press releases and market news | Login | Markets | Live"]
+
+    for i in range(articles):
+        subject = ticker if rng.random() < mention_rate else rng.choice(OTHER_TICKERS)
+        title = _sentence(rng, 7)[:-1]
+        slug = f"{title.lower().replace(' ', '-')[:60]}-{i}"
+        blocks.append(f"[{subject}: {title}](https://www.stocktitan.net/news/{subject}/{slug}.html)")
+
+        for p in range(paragraphs_per_article):
+            blocks.append(_paragraph(rng, paragraph_chars, subject if p == 0 else None))
+
+        if rng.random() < rhea_density:
+            blocks.append(f"Rhea-AI Summary: {_paragraph(rng, 200)}")
+            blocks.append(f"Rhea-AI Sentiment: {rng.choice(SENTIMENTS)}")
+            blocks.append(f"Rhea-AI Impact: {rng.choice(['Low', 'Medium', 'High'])} impact expected")
+            blocks.append("Tags: " + ' '.join(rng.sample(FILLER_WORDS, 4)))
+
+    return '\n\n'.join(blocks)
+
+
+# 基準情境：名稱 -> 產生器參數
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "small_sparse": {"articles": 10, "rhea_density": 0.1, "mention_rate": 0.1},
+    "medium_mixed": {"articles": 60, "rhea_density": 0.3, "mention_rate": 0.3},
+    "large_dense": {"articles": 200, "rhea_density": 0.8, "mention_rate": 0.5},
+    "large_rare_mentions": {"articles": 200, "rhea_density": 0.2, "mention_rate": 0.02},
+    "long_paragraphs": {"articles": 40, "paragraph_chars": 2500, "rhea_density": 0.3, "mention_rate": 0.3},
+}
+
+
+def scenario_pages(ticker: str = 'AAPL') -> Dict[str, str]:
+    """產生所有基準情境的頁面"""
+    return {name: generate_stocktitan_page(ticker, **params) for name, params in SCENARIOS.items()}
+
@@ -0,0 +1,63 @@
+# 行程啟動設定 - .env 載入與日誌設定在每個行程只執行一次；
+# 服務商 SDK (Gemini、Firecrawl) 延遲到第一次呼叫時才匯入，CLI --help、狀態查詢與 CPU 行程池的工作行程不必載入
+
+import importlib
+import logging
+import os
+import threading
+import time
+from types import ModuleType
+from typing import Any
+
+logger = logging.getLogger('YourPods_Bootstrap')
+
+_lock = threading.Lock()
+_environment_loaded = False
+_logging_configured = False
+
+
+def load_environment():
+    """載入 .env (每個行程一次)"""
+    global _environment_loaded
+
+    with _lock:
+        if _environment_loaded:
+            return
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _environment_loaded = True
+
+
+def configure_logging():
+    """設定日誌格式與等級 (環境變數 LOG_LEVEL，每個行程一次)"""
+    global _logging_configured
+
+    with _lock:
+        if _logging_configured:
+            return
+        logging.basicConfig(
+            level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        _logging_configured = True
+
+
+def import_sdk(name: str) -> ModuleType:
+    """匯入服務商 SDK (已載入時直接回傳)，第一次載入時記錄耗時"""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    if elapsed > 0.05:
+        logger.info(f"📦 載入 {name} ({elapsed * 1000:.0f}ms)")
+    return module
+
+
+def genai() -> ModuleType:
+    """google.generativeai 模組"""
+    return import_sdk('google.generativeai')
+
+
+def firecrawl_app(api_key: str) -> Any:
+    """建立 Firecrawl 客戶端"""
+    return import_sdk('firecrawl').FirecrawlApp(api_key=api_key)
@@ -0,0 +1,97 @@
+# CPU 密集工作的行程池 - 大批次時把段落排序、正則擷取、三層分析等純Python工作分散到多核心
+# 工作函數必須是模組層級函數；參數與回傳值只帶必要欄位 (字串、小型dict)，降低跨行程序列化成本
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+from metrics import REGISTRY
+
+logger = logging.getLogger('YourPods_CPUPool')
+
+REGISTRY.describe('cpu_pool_seconds', 'Wall time of work offloaded to the CPU process pool in seconds.')
+
+
+class CPUPool:
+    """可選的行程池：停用時直接在呼叫端執行，行為與原本相同"""
+
+    def __init__(self, workers: int = 0):
+        """
+        Args:
+            workers: 工作行程數 (0 為停用，在事件迴圈中直接執行)
+        """
+        self.workers = max(0, workers)
+        self._executor: Optional['ProcessPoolExecutor'] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    async def run(self, func: Callable[..., Any], *args: Any, step: str = '') -> Any:
+        """
+        執行 func(*args)：啟用時送到工作行程並等待結果，事件迴圈在等待期間可處理其他請求
+
+        Args:
+            func: 模組層級函數 (需可被 pickle)
+            step: 指標標籤
+        """
+        if not self.enabled:
+            return func(*args)
+
+        loop = asyncio.get_event_loop()
+        with REGISTRY.timer('cpu_pool_seconds', step=step or func.__name__):
+            return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args))
+
+    def shutdown(self):
+        """關閉工作行程 (等待進行中的工作完成)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+            logger.info("🧵 CPU行程池已關閉")
+
+    def _get_executor(self) -> 'ProcessPoolExecutor':
+        with self._lock:
+            if self._executor is None:
+                # 停用時 (預設) 不必載入 multiprocessing
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # 使用 spawn：主行程有背景執行緒 (指標端點、執行緒池)，fork 可能複製到被持有的鎖
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"🧵 CPU行程池啟動: {self.workers} 個工作行程")
+            return self._executor
+
+
+# 全局實例 (資訊收集與內容分析階段共用)
+_pool_instance = None
+
+
+def get_cpu_pool() -> CPUPool:
+    """取得共用的CPU行程池 (工作行程數預設讀取環境變數 CPU_POOL_WORKERS)"""
+    global _pool_instance
+
+    if _pool_instance is None:
+        _pool_instance = CPUPool(int(os.getenv('CPU_POOL_WORKERS', '0')))
+
+    return _pool_instance
+
+
+def configure_cpu_pool(workers: int) -> CPUPool:
+    """以指定的工作行程數重新建立共用行程池 (CLI 參數使用)"""
+    global _pool_instance
+
+    if _pool_instance is not None:
+        _pool_instance.shutdown()
+    _pool_instance = CPUPool(workers)
+    return _pool_instance
@@ -0,0 +1,140 @@
+# 內容分析的擷取規則登錄表 - 匯入時編譯一次
+# 所有規則在輸入長度上皆為線性時間 (不依賴回溯)，並附有與舊版正則等價的說明
+
+import re
+from typing import Dict, Any, List, Optional, Pattern, Tuple
+
+STOP_CHAR = '。'
+
+
+class TailMatch:
+    """KeywordTailPattern 的匹配結果 (與 re.Match 相同的 group/start/end 介面)"""
+
+    def __init__(self, text: str, groups: List[Tuple[int, int]]):
+        self._text = text
+        self._groups = groups
+
+    def group(self, index: int = 0) -> str:
+        start, end = self._groups[index]
+        return self._text[start:end]
+
+    def start(self, index: int = 0) -> int:
+        return self._groups[index][0]
+
+    def end(self, index: int = 0) -> int:
+        return self._groups[index][1]
+
+
+class KeywordTailPattern:
+    """
+    等價於舊版的 r'(K1|K2|...)[^。]*([^。]{min_tail,max_tail})'
+
+    舊版正則中貪婪的 [^。]* 會吃到下一個「。」(或文末) 再逐字回吐，直到剩下 min_tail 個字元，
+    因此第2組永遠是「。」前的最後 min_tail 個字元。此處直接計算該結果：
+    找到關鍵字後以 str.find 定位句尾 (同一句段只找一次)，整體為線性時間
+    """
+
+    def __init__(self, keywords: List[str], min_tail: int, max_tail: int, stop: str = STOP_CHAR):
+        self.keywords = list(keywords)
+        self.min_tail = min_tail
+        self.max_tail = max_tail
+        self.stop = stop
+        self._start = re.compile('|'.join(re.escape(k) for k in self.keywords))
+        self.legacy = '(' + '|'.join(re.escape(k) for k in self.keywords) + ')' + \
+            f'[^{stop}]*([^{stop}]{{{min_tail},{max_tail}}})'
+
+    def search(self, text: str, pos: int = 0) -> Optional[TailMatch]:
+        run_end = -1
+        while True:
+            found = self._start.search(text, pos)
+            if found is None:
+                return None
+
+            p = found.start()
+            if p > run_end:
+                # 同一句段內的後續關鍵字沿用已找到的句尾，避免重複掃描
+                run_end = text.find(self.stop, p)
+                if run_end < 0:
+                    run_end = len(text)
+
+            # 依正則交替的順序嘗試在同一位置開始的關鍵字
+            for keyword in self.keywords:
+                if text.startswith(keyword, p) and run_end - (p + len(keyword)) >= self.min_tail:
+                    return TailMatch(text, [
+                        (p, run_end),
+                        (p, p + len(keyword)),
+                        (run_end - self.min_tail, run_end)
+                    ])
+
+            pos = p + 1
+
+
+# === Gemini分析的段落擷取 (名稱 -> (開頭關鍵字, 規則)) ===
+# 規則必須以其中一個關鍵字開頭，AnalysisDocument.search 才能從第一個命中位置開始搜尋
+
+GEMINI_PATTERNS: Dict[str, Tuple[List[str], Any]] = {
+    # [^。\n]{m,n} 前只有 \s*，回溯量受空白長度限制
+    "catalyst": (["核心事件"], re.compile(r'核心事件[：:]\s*([^。\n]{20,100})')),
+    "key_data": (["關鍵數據"], re.compile(r'關鍵數據[：:]\s*([^。\n]{20,150})')),
+    "reaction": (["市場反應"], re.compile(r'市場反應[：:]\s*([^。\n]{30,200})')),
+    # 以下第1組為關鍵字，第2組為句尾前的片段 (analyst 只有一組)
+    "comparison": (["同業", "競爭", "比較"], KeywordTailPattern(["同業", "競爭", "比較"], 50, 200)),
+    "bull": (["看多", "正面", "優勢", "機會"], KeywordTailPattern(["看多", "正面", "優勢", "機會"], 50, 200)),
+    "bear": (["風險", "挑戰", "擔憂", "負面"], KeywordTailPattern(["風險", "挑戰", "擔憂", "負面"], 50, 200)),
+    "outlook": (["展望", "未來", "趨勢", "預期"], KeywordTailPattern(["展望", "未來", "趨勢", "預期"], 50, 200)),
+}
+
+
+class _SingleGroupTail(KeywordTailPattern):
+    """等價於 r'K[^。]*([^。]{m,n})' (關鍵字不成組，句尾片段為第1組)"""
+
+    def search(self, text: str, pos: int = 0) -> Optional[TailMatch]:
+        match = super().search(text, pos)
+        if match is None:
+            return None
+        return TailMatch(text, [(match.start(0), match.end(0)), (match.start(2), match.end(2))])
+
+
+GEMINI_PATTERNS["analyst"] = (["分析師"], _SingleGroupTail(["分析師"], 30, 150))
+
+# 價格變動百分比 - 等價於舊版 r'(\d+\.?\d*%|\+\d+\.?\d*%|-\d+\.?\d*%)'
+# 舊版在長串數字沒有接「%」時，每個起點都要回溯整串 (立方時間)；
+# 數字串中間的起點與串首的結果相同，因此以 (?<!\d) 只從串首嘗試，並把 \.?\d* 改寫為 (?:\.\d*)?
+PERCENT_CHANGE: Pattern = re.compile(r'([+-]\d+(?:\.\d*)?%|(?<!\d)\d+(?:\.\d*)?%)')
+
+# === 分析模板 (催化劑、情緒、風險的資料來源) ===
+
+ANALYSIS_TEMPLATES: Dict[str, Any] = {
+    # 依序比對整合內容，第一個命中的類型即為催化劑
+    "catalyst_patterns": {
+        "財報發布": ["earnings", "quarterly", "revenue", "profit", "guidance", "財報", "季報"],
+        "併購消息": ["merger", "acquisition", "deal", "takeover", "併購", "收購"],
+        "產品發布": ["product", "launch", "release", "innovation", "產品", "發布"],
+        "監管變化": ["fda", "approval", "regulation", "policy", "監管", "批准"],
+        "管理層變動": ["ceo", "executive", "management", "leadership", "管理層", "高管"]
+    },
+    # 各欄位的情緒判斷詞 (皆為小寫子字串比對)
+    "sentiment_indicators": {
+        "positive": {
+            "sentiment": ["positive", "bullish"],
+            "impact": ["strong"],
+            "fundamentals": ["growth", "profit", "revenue", "strong"],
+            "analyst": ["upgrade", "buy", "買入"]
+        },
+        "negative": {
+            "sentiment": ["negative", "bearish"],
+            "impact": ["weak"],
+            "analyst": ["downgrade", "sell", "賣出"]
+        }
+    },
+    "risk_keywords": {
+        "公司特定風險": ["lawsuit", "debt", "management", "competition"],
+        "行業風險": ["regulation", "technology", "disruption", "cycle"]
+    }
+}
+
+
+def has_indicator(text: str, polarity: str, field: str) -> bool:
+    """text (已轉小寫) 是否包含指定情緒方向與欄位的判斷詞"""
+    indicators = ANALYSIS_TEMPLATES["sentiment_indicators"][polarity].get(field, [])
+    return any(word in text for word in indicators)
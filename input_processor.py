@@ -0,0 +1,247 @@
+# 階段1: 輸入處理與驗證 - 以本地代碼主檔與公司名稱索引驗證股票代碼並取得公司資訊，
+# 只有即時股價 (STAGE1_FETCH_PRICES) 或主檔尚未建立時才使用網路；script_1.py 為本階段的指令設計
+
+import asyncio
+import datetime
+import logging
+import os
+from typing import Dict, Any, Optional
+
+import pytz
+
+from name_index import AMBIGUOUS, get_name_index
+from symbol_master import get_symbol_master
+
+logger = logging.getLogger('YourPods_InputProcessor')
+
+
+class InputProcessor:
+    """輸入處理與驗證階段的處理器"""
+    
+    def __init__(self, cache_duration: int = 86400, fetch_prices: Optional[bool] = None):
+        """初始化處理器
+        
+        Args:
+            cache_duration: 快取有效期（秒），預設24小時
+            fetch_prices: 是否以網路取得即時股價 (預設讀取環境變數 STAGE1_FETCH_PRICES)
+        """
+        self.cache = {}  # 快取已驗證的股票
+        self.cache_duration = cache_duration
+        # 代碼驗證與公司資訊查詢本地主檔 (O(1)、不使用網路)
+        self.symbol_master = get_symbol_master()
+        if fetch_prices is None:
+            fetch_prices = os.getenv('STAGE1_FETCH_PRICES', 'false').lower() == 'true'
+        self.fetch_prices = fetch_prices
+        logger.info("InputProcessor initialized")
+    
+    async def process(self, user_input: str) -> Dict[str, Any]:
+        """處理用戶輸入的股票代碼
+        
+        Args:
+            user_input: 用戶輸入的原始股票代碼或公司名稱
+        
+        Returns:
+            包含驗證結果和股票資訊的字典
+        """
+        logger.info(f"Processing user input: {user_input}")
+        
+        # 1. 清理和標準化輸入 (公司名稱、錯字在本地解析為代碼)
+        resolution = self._standardize_input(user_input)
+        if resolution["status"] == AMBIGUOUS:
+            # 多個候選分數接近時請用戶指定，而不是猜一個再花費抓取與LLM成本
+            choices = "、".join(f"{c['symbol']} ({c['name']})" for c in resolution["candidates"])
+            return {
+                "status": "ambiguous",
+                "standardized_ticker": user_input.strip().upper(),
+                "candidates": resolution["candidates"],
+                "error_message": f"「{user_input.strip()}」對應到多支股票，請指定代碼: {choices}"
+            }
+        ticker = resolution["ticker"] or user_input.strip().upper()
+        
+        # 2. 檢查快取
+        cached_result = self._check_cache(ticker)
+        if cached_result:
+            logger.info(f"Cache hit for ticker: {ticker}")
+            return cached_result
+        
+        # 3. 驗證股票代碼
+        try:
+            result = await self._validate_ticker(ticker)
+            
+            # 4. 更新快取
+            if result["status"] == "valid":
+                self._update_cache(ticker, result)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing ticker {ticker}: {str(e)}")
+            return {
+                "status": "invalid",
+                "standardized_ticker": ticker,
+                "error_message": f"處理過程中發生錯誤: {str(e)}"
+            }
+    
+    def _standardize_input(self, user_input: str) -> Dict[str, Any]:
+        """標準化用戶輸入
+        
+        依序比對代碼主檔、常用別名、公司名稱，最後以三字元組/前綴做模糊比對
+        
+        Args:
+            user_input: 原始輸入
+            
+        Returns:
+            解析結果 {"status", "ticker", "candidates"}；status 為 ambiguous 時 ticker 為 None，
+            找不到時 (not_found) 由後續驗證處理原始輸入
+        """
+        return get_name_index().resolve(user_input)
+    
+    def _check_cache(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """檢查股票是否在快取中且未過期
+        
+        Args:
+            ticker: 股票代碼
+            
+        Returns:
+            快取的結果或None
+        """
+        if ticker in self.cache:
+            cached_time, cached_data = self.cache[ticker]
+            now = datetime.datetime.now().timestamp()
+            
+            if now - cached_time < self.cache_duration:
+                return cached_data
+                
+        return None
+    
+    def _update_cache(self, ticker: str, data: Dict[str, Any]) -> None:
+        """更新股票資訊快取
+        
+        Args:
+            ticker: 股票代碼
+            data: 要快取的資料
+        """
+        self.cache[ticker] = (datetime.datetime.now().timestamp(), data)
+    
+    async def _validate_ticker(self, ticker: str) -> Dict[str, Any]:
+        """驗證股票代碼並獲取基本資訊
+        
+        代碼是否存在、公司名稱、交易所與行業都查詢本地主檔；
+        只有股價欄位 (或主檔尚未建立時) 才使用網路
+        
+        Args:
+            ticker: 股票代碼
+            
+        Returns:
+            包含驗證結果和股票資訊的字典
+        """
+        if not self.symbol_master.available:
+            return await self._validate_ticker_online(ticker)
+        
+        record = self.symbol_master.lookup(ticker)
+        if record is None:
+            return {
+                "status": "invalid",
+                "standardized_ticker": ticker,
+                "error_message": "代碼主檔中找不到此股票代碼"
+            }
+        
+        result = {
+            "status": "valid",
+            "standardized_ticker": record.symbol,
+            "company_name": record.name or '未知',
+            "exchange": record.exchange or '未知',
+            "industry": record.industry or '未知',
+            "market_status": self._check_market_status(),
+            "current_price": None,
+            "currency": "USD"
+        }
+        
+        if self.fetch_prices:
+            try:
+                stock_info = await self._fetch_stock_info(record.symbol)
+                result["current_price"] = stock_info.get('regularMarketPrice')
+                result["currency"] = stock_info.get('currency', 'USD')
+                # 主檔缺少行業時順便補上，之後的查詢不必再連網
+                if not record.industry and stock_info.get('industry'):
+                    # enrich 可能寫回整份主檔，放到執行緒池
+                    loop = asyncio.get_event_loop()
+                    await loop.run_in_executor(None, self.symbol_master.enrich,
+                                               record.symbol, stock_info['industry'])
+                    result["industry"] = stock_info['industry']
+            except Exception as e:
+                # 股價只是附加資訊，取得失敗不影響驗證結果
+                logger.warning(f"Price lookup failed for {record.symbol}: {str(e)}")
+        
+        return result
+    
+    async def _fetch_stock_info(self, ticker: str) -> Dict[str, Any]:
+        """以 yfinance 取得行情資料 (阻塞呼叫，放到執行緒池)"""
+        import yfinance as yf
+        
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: yf.Ticker(ticker).info)
+    
+    async def _validate_ticker_online(self, ticker: str) -> Dict[str, Any]:
+        """沒有代碼主檔時以網路驗證 (原本的做法)
+        
+        Args:
+            ticker: 股票代碼
+            
+        Returns:
+            包含驗證結果和股票資訊的字典
+        """
+        try:
+            # 使用yfinance獲取股票資訊
+            stock_info = await self._fetch_stock_info(ticker)
+            
+            # 檢查是否找到有效股票
+            if 'regularMarketPrice' not in stock_info or stock_info['regularMarketPrice'] is None:
+                return {
+                    "status": "invalid",
+                    "standardized_ticker": ticker,
+                    "error_message": "找不到此股票代碼的市場資訊"
+                }
+            
+            # 檢查市場狀態
+            market_status = self._check_market_status()
+            
+            return {
+                "status": "valid",
+                "standardized_ticker": ticker,
+                "company_name": stock_info.get('longName', '未知'),
+                "exchange": stock_info.get('exchange', '未知'),
+                "industry": stock_info.get('industry', '未知'),
+                "market_status": market_status,
+                "current_price": stock_info.get('regularMarketPrice', 0),
+                "currency": stock_info.get('currency', 'USD')
+            }
+            
+        except Exception as e:
+            logger.error(f"Error validating ticker {ticker}: {str(e)}")
+            return {
+                "status": "invalid",
+                "standardized_ticker": ticker,
+                "error_message": f"無法驗證股票代碼: {str(e)}"
+            }
+    
+    def _check_market_status(self) -> str:
+        """檢查美國市場是否開市
+        
+        Returns:
+            'open' 或 'closed'
+        """
+        now = datetime.datetime.now(pytz.timezone('US/Eastern'))
+        
+        # 判斷是否為交易日 (週一到週五)
+        if now.weekday() >= 5:  # 0=週一, 5=週六, 6=週日
+            return "closed"
+        
+        # 判斷是否在交易時間 (9:30 - 16:00 東部時間)
+        market_open = now.replace(hour=9, minute=30, second=0)
+        market_close = now.replace(hour=16, minute=0, second=0)
+        
+        if market_open <= now <= market_close:
+            return "open"
+        else:
+            return "closed"
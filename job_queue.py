@@ -0,0 +1,299 @@
+# 持久化工作佇列 - 以 SQLite 儲存批次工作、每支股票每個階段的檢查點與最終結果
+# 批次中途崩潰後可續跑：已完成的股票不再處理，已有階段2檢查點的股票不再重新抓取
+# 工作依優先度取出，互動請求可插隊到夜間大量批次之前
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+from serialization import pack, unpack
+
+logger = logging.getLogger('YourPods_JobQueue')
+
+# 優先度：數字越大越先處理
+PRIORITY_BULK = 0
+PRIORITY_INTERACTIVE = 100
+
+# 本行程的代號 (寫入工作持有者)
+PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    options TEXT,
+    result TEXT,
+    error TEXT,
+    UNIQUE (batch_id, ticker)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, id);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (job_id, stage)
+);
+"""
+
+
+class QueuedJob:
+    """從佇列取出的一筆工作"""
+
+    def __init__(self, row: sqlite3.Row, checkpoints: Dict[str, Any]):
+        self.id = row['id']
+        self.batch_id = row['batch_id']
+        self.position = row['position']
+        self.ticker = row['ticker']
+        self.priority = row['priority']
+        self.attempts = row['attempts']
+        self.checkpoints = checkpoints
+        # 提交時指定的處理選項 (例如 include_analysis、profile)
+        self.options = unpack(row['options']) if row['options'] else {}
+
+
+class JobQueue:
+    """SQLite 工作佇列 (單一連線 + 鎖；WAL 模式讓狀態查詢不阻塞寫入)"""
+
+    def __init__(self, path: str, lease_seconds: float = 900.0):
+        """
+        Args:
+            path: SQLite 資料庫檔案
+            lease_seconds: 工作租約時間；執行中的工作在寫入檢查點時續約，
+                           租約過期或持有行程已不存在時視為中斷，可重新取出
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # 持有者 = 主機:PID:行程代號；容器重啟後 PID 可能相同 (例如 PID 1)，以行程代號區分前後兩個行程
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{PROCESS_TOKEN}"
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    # === 提交與查詢 ===
+
+    def submit(self, tickers: List[str], priority: int = PRIORITY_BULK,
+               batch_id: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> str:
+        """
+        提交一批股票 (同一批次中已存在的股票略過，重複提交即為續跑)
+
+        Args:
+            options: 這批工作的處理選項 (include_analysis、profile)，執行與寫入結果時套用
+
+        Returns:
+            批次ID
+
+        Raises:
+            ValueError: 列表中有重複的股票 (同一批次每支股票只有一筆工作，重複的會被略過而少一筆結果)
+        """
+        seen = set()
+        duplicates = sorted({ticker for ticker in tickers if ticker in seen or seen.add(ticker)})
+        if duplicates:
+            raise ValueError(f"股票列表中有重複的股票: {', '.join(duplicates)}")
+
+        batch_id = batch_id or f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        now = time.time()
+        packed_options = pack(options) if options else None
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            offset = self._conn.execute(
+                'SELECT COALESCE(MAX(position) + 1, 0) FROM jobs WHERE batch_id = ?', (batch_id,)
+            ).fetchone()[0]
+            added = 0
+            for ticker in tickers:
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO jobs (batch_id, position, ticker, priority, options, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (batch_id, offset + added, ticker, priority, packed_options, now, now)
+                )
+                added += cursor.rowcount
+
+        logger.info(f"🗂️ 批次 {batch_id}: 新增 {added} 筆工作 (共 {len(tickers)} 支，優先度 {priority})")
+        return batch_id
+
+    def batch_status(self, batch_id: str) -> Dict[str, int]:
+        """批次內各狀態的工作數"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY status', (batch_id,)
+            ).fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "error": 0}
+        counts.update({status: count for status, count in rows})
+        counts["total"] = sum(count for _, count in rows)
+        return counts
+
+    def pending_count(self) -> int:
+        """所有批次中待處理與執行中的工作數 (服務端背壓判斷)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()[0]
+
+    def has_pending(self, batch_id: Optional[str] = None) -> bool:
+        """是否有可取出的待處理工作 (佇列閒置時不必啟動流水線)"""
+        query = "SELECT 1 FROM jobs WHERE status = 'pending'"
+        params: List[Any] = []
+        if batch_id:
+            query += ' AND batch_id = ?'
+            params.append(batch_id)
+        with self._lock:
+            return self._conn.execute(query + ' LIMIT 1', params).fetchone() is not None
+
+    def batch_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """批次的已完成結果 (依提交順序，未完成的股票以狀態佔位)"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT ticker, status, result, error FROM jobs WHERE batch_id = ? ORDER BY position',
+                (batch_id,)
+            ).fetchall()
+        return [
+            unpack(row['result']) if row['result']
+            else {"status": row['status'], "ticker": row['ticker'], "error": row['error']}
+            for row in rows
+        ]
+
+    # === 執行 ===
+
+    def claim(self, batch_id: Optional[str] = None) -> Optional[QueuedJob]:
+        """
+        取出優先度最高 (同優先度依提交順序) 的待處理工作並標記為執行中
+
+        Args:
+            batch_id: 只取此批次的工作 (None 為所有批次)
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            query = 'SELECT * FROM jobs WHERE status = ?'
+            params: List[Any] = ['pending']
+            if batch_id:
+                query += ' AND batch_id = ?'
+                params.append(batch_id)
+            row = self._conn.execute(query + ' ORDER BY priority DESC, id LIMIT 1', params).fetchone()
+            if row is None:
+                return None
+
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1, updated = ? '
+                'WHERE id = ?',
+                ('running', self.owner, now + self.lease_seconds, now, row['id'])
+            )
+            checkpoints = {
+                stage: unpack(payload) for stage, payload in self._conn.execute(
+                    'SELECT stage, payload FROM checkpoints WHERE job_id = ?', (row['id'],)
+                ).fetchall()
+            }
+
+        return QueuedJob(row, checkpoints)
+
+    def checkpoint(self, job_id: int, stage: str, payload: Dict[str, Any]):
+        """儲存某階段的輸出並續約"""
+        now = time.time()
+        data = pack(payload)
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute(
+                'INSERT OR REPLACE INTO checkpoints (job_id, stage, payload, created) VALUES (?, ?, ?, ?)',
+                (job_id, stage, data, now)
+            )
+            self._conn.execute(
+                'UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ?',
+                (now + self.lease_seconds, now, job_id)
+            )
+
+    def complete(self, job_id: int, result: Dict[str, Any]):
+        """寫入最終結果 (結果狀態為 error 時記為失敗)；最終結果已包含各階段輸出，刪除檢查點"""
+        status = 'done' if result.get('status') == 'success' else 'error'
+        error = None if status == 'done' else result.get('error_message') or result.get('error')
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, owner = NULL, lease_until = NULL, updated = ? '
+                'WHERE id = ?',
+                (status, pack(result), error, time.time(), job_id)
+            )
+            self._conn.execute('DELETE FROM checkpoints WHERE job_id = ?', (job_id,))
+
+    def requeue_stale(self) -> int:
+        """
+        將中斷的執行中工作改回待處理 (保留檢查點)
+
+        中斷的判定：租約過期，或持有者是本機上的其他行程且已不存在 (或是已重啟的同一PID)
+        """
+        now = time.time()
+        hostname = socket.gethostname()
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            rows = self._conn.execute(
+                "SELECT id, owner, lease_until FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            stale = [row['id'] for row in rows
+                     if (row['lease_until'] or 0) < now or _owner_is_dead(row['owner'], hostname)]
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'pending', owner = NULL, lease_until = NULL WHERE id = ?",
+                [(job_id,) for job_id in stale]
+            )
+
+        if stale:
+            logger.info(f"♻️ {len(stale)} 筆中斷的工作已重新排入佇列")
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _owner_is_dead(owner: Optional[str], hostname: str) -> bool:
+    """持有者 (主機:PID:行程代號) 是否為本機上已結束的行程 (其他主機的工作只依租約判斷)"""
+    if not owner:
+        return True
+    host, pid, token = (owner.rsplit(':', 2) + ['', ''])[:3]
+    if host != hostname or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        # 同一PID但行程代號不同：是重啟前的行程
+        return token != PROCESS_TOKEN
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+# 全局實例
+_queue_instance = None
+
+
+def get_job_queue() -> JobQueue:
+    """取得共用的工作佇列 (路徑預設讀取環境變數 JOB_QUEUE_PATH)"""
+    global _queue_instance
+
+    if _queue_instance is None:
+        cache_dir = os.getenv('YOURPODS_CACHE_DIR', '.yourpods_cache')
+        _queue_instance = JobQueue(
+            os.getenv('JOB_QUEUE_PATH') or os.path.join(cache_dir, 'jobs.sqlite3'),
+            lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '900'))
+        )
+
+    return _queue_instance
@@ -0,0 +1,218 @@
+# LLM 回應快取 - 以 (模型, 生成參數, 提示雜湊) 為鍵的內容定址快取
+# 磁碟儲存，支援有效期 (TTL) 與容量上限 (依最近使用時間淘汰)
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from serialization import pack, unpack
+
+logger = logging.getLogger('YourPods_LLMCache')
+
+
+class LLMResponseCache:
+    """Gemini 回應的磁碟快取，供資訊收集與內容分析階段共用"""
+
+    def __init__(self, directory: str, ttl_hours: float = 24.0,
+                 max_size_mb: float = 200.0, enabled: bool = True):
+        """
+        Args:
+            directory: 快取目錄
+            ttl_hours: 回應有效期 (小時)
+            max_size_mb: 快取容量上限，超過時淘汰最久未使用的項目
+            enabled: 停用時所有查詢都視為未命中且不寫入
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        # 記憶體索引: key -> [檔案大小, 最近使用時間]
+        self._index: Dict[str, list] = {}
+        self._total_bytes = 0
+        if self.enabled:
+            self._scan_directory()
+
+    @staticmethod
+    def make_key(model: str, generation_config: Dict[str, Any], prompt: str) -> str:
+        """計算快取鍵"""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        # 鍵的材料固定以標準函式庫編碼，換序列化後端時既有快取仍可命中
+        material = json.dumps(
+            {"model": model, "generation_config": generation_config, "prompt": prompt_hash},
+            sort_keys=True
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """讀取快取的回應文字，未命中或已過期回傳 None"""
+
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = unpack(f.read())
+        except (OSError, ValueError):
+            self._record(hit=False)
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            self._remove(key)
+            self._record(hit=False)
+            return None
+
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._index:
+                self._index[key][1] = now
+
+        self._record(hit=True)
+        return entry.get("text")
+
+    def put(self, key: str, text: str, model: str = ''):
+        """寫入回應文字"""
+
+        if not self.enabled or not text:
+            return
+
+        path = self._path(key)
+        payload = pack({"created": time.time(), "model": model, "text": text})
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ LLM快取寫入失敗: {str(e)}")
+            return
+
+        size = os.path.getsize(path)
+        with self._lock:
+            previous = self._index.get(key)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._index[key] = [size, time.time()]
+            self._total_bytes += size
+            self.stats["writes"] += 1
+
+        self._evict_if_needed()
+
+    def get_or_generate(self, model: str, generation_config: Dict[str, Any], prompt: str,
+                        generate: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        命中時直接回傳快取，否則呼叫 generate() 並寫入快取
+
+        Returns:
+            (回應文字, 是否命中快取)
+        """
+        key = self.make_key(model, generation_config, prompt)
+        cached = self.get(key)
+        if cached is not None:
+            logger.info(f"📋 LLM快取命中: {model} ({key[:12]})")
+            return cached, True
+
+        text = generate()
+        self.put(key, text, model)
+        return text, False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """快取統計 (含命中率)"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._index),
+                "size_bytes": self._total_bytes,
+                "enabled": self.enabled
+            }
+
+    # === 內部函數 ===
+
+    def _path(self, key: str) -> str:
+        # 沿用 .json 副檔名，既有快取檔照常讀取 (內容依標頭辨識 msgpack 或 JSON)
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _record(self, hit: bool):
+        with self._lock:
+            self.stats["hits" if hit else "misses"] += 1
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry:
+                self._total_bytes -= entry[0]
+
+    def _evict_if_needed(self):
+        with self._lock:
+            if self._total_bytes <= self.max_size_bytes:
+                return
+            # 淘汰到容量上限的90%，避免每次寫入都觸發淘汰
+            target = int(self.max_size_bytes * 0.9)
+            victims = []
+            for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+                if self._total_bytes <= target:
+                    break
+                victims.append(key)
+                self._total_bytes -= size
+                del self._index[key]
+            self.stats["evictions"] += len(victims)
+
+        for key in victims:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _scan_directory(self):
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                self._index[name[:-5]] = [stat.st_size, stat.st_mtime]
+                self._total_bytes += stat.st_size
+
+
+# 全局實例 (兩個階段共用同一份快取與統計)
+_cache_instance = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """取得共用的LLM回應快取 (依環境變數延遲建立)"""
+    global _cache_instance
+
+    if _cache_instance is None:
+        cache_dir = os.getenv('YOURPODS_CACHE_DIR', '.yourpods_cache')
+        _cache_instance = LLMResponseCache(
+            directory=os.path.join(cache_dir, 'llm_responses'),
+            ttl_hours=float(os.getenv('LLM_CACHE_TTL_HOURS', '24')),
+            max_size_mb=float(os.getenv('LLM_CACHE_MAX_MB', '200')),
+            enabled=os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+        )
+
+    return _cache_instance
@@ -2,35 +2,73 @@
 # 將所有階段整合為端到端的股票音訊生成流程
 
 import asyncio
-import json
 import logging
+import os
 import sys
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, IO, List, Optional
 from datetime import datetime
 
 # 導入所有改良版階段
 try:
-    from script_1 import InputProcessor  # 原有的階段1
+    import bootstrap
+    # .env 必須在匯入其他專案模組之前載入 (serialization、tracing 在匯入時讀取環境變數)
+    bootstrap.load_environment()
     from script_2_improved import process as improved_info_gathering  # 改良版階段2
     from script_3_improved import process as improved_content_analysis  # 改良版階段3
+    from cpu_pool import configure_cpu_pool, get_cpu_pool
+    from job_queue import PRIORITY_BULK, get_job_queue
+    from llm_cache import get_llm_cache
+    from metrics import REGISTRY
+    from pipeline_engine import BatchPipeline, PipelineConfig
+    from serialization import describe as describe_serialization, dumps
+    from symbol_master import flush_symbol_master
+    from tracing import TRACER
 except ImportError as e:
     print(f"❌ 導入錯誤: {e}")
     print("請確保所有必要的檔案都在同一目錄中")
     sys.exit(1)
 
-# 配置日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 配置日誌 (與各階段共用同一次設定，等級讀取環境變數 LOG_LEVEL)
+bootstrap.configure_logging()
 logger = logging.getLogger('YourPods_Integration')
 
+def _collect_llm_cache_metrics():
+    """匯出LLM回應快取的命中統計"""
+    stats = get_llm_cache().get_stats()
+    return [
+        ("cache_requests", "counter", {"cache": "llm_response", "result": "hit"}, stats["hits"]),
+        ("cache_requests", "counter", {"cache": "llm_response", "result": "miss"}, stats["misses"]),
+        ("cache_hit_ratio", "gauge", {"cache": "llm_response"}, stats["hit_rate"])
+    ]
+
+REGISTRY.add_collector(_collect_llm_cache_metrics)
+
+# 結果輸出模式：summary 只含股票資訊與摘要 (約1-2KB)，standard 另含分析結論與來源清單 (不含原始頁面)，
+# full 為除錯用的完整各階段輸出 (含每個來源的原始內容，可達數百KB)
+RESULT_PROFILES = ('summary', 'standard', 'full')
+
+def _validate_profile(profile: str) -> str:
+    if profile not in RESULT_PROFILES:
+        raise ValueError(f"未知的結果輸出模式: {profile} (可用: {', '.join(RESULT_PROFILES)})")
+    return profile
+
 class YourPodsOrchestrator:
     """YourPods 系統協調器 - 整合所有處理階段"""
     
-    def __init__(self):
-        """初始化YourPods系統"""
+    def __init__(self, single_shot: Optional[bool] = None, result_profile: Optional[str] = None):
+        """
+        初始化YourPods系統
+        
+        Args:
+            single_shot: 單次LLM呼叫模式 - 階段2的Gemini呼叫一併產生投資觀點，
+                         省去階段3的增強呼叫 (預設讀取環境變數 SINGLE_SHOT_LLM)
+            result_profile: 預設的結果輸出模式 summary/standard/full (預設讀取環境變數 RESULT_PROFILE)
+        """
+        if single_shot is None:
+            single_shot = os.getenv('SINGLE_SHOT_LLM', 'false').lower() == 'true'
+        self.single_shot = single_shot
+        self.result_profile = _validate_profile(result_profile or os.getenv('RESULT_PROFILE', 'full'))
         self.input_processor = None  # 延遲初始化
         self.processing_stats = {
             "total_processed": 0,
@@ -43,17 +81,31 @@ class YourPodsOrchestrator:
         logger.info("🎙️ YourPods 系統協調器初始化完成")
     
     async def process_stock_request(self, stock_input: str, 
-                                  include_analysis: bool = True) -> Dict[str, Any]:
+                                  include_analysis: bool = True,
+                                  profile: Optional[str] = None) -> Dict[str, Any]:
         """
         處理完整的股票請求 - 從輸入到分析
         
         Args:
             stock_input: 用戶輸入的股票代碼或公司名稱
             include_analysis: 是否包含第三階段的深度分析
+            profile: 結果輸出模式 (None 使用協調器預設值)
             
         Returns:
-            完整的處理結果
+            處理結果 (欄位依輸出模式而定)
         """
+        profile = _validate_profile(profile or self.result_profile)
+        with TRACER.trace('process_stock_request', stock_input=stock_input,
+                          include_analysis=include_analysis) as trace:
+            result = await self._process_stock_request(stock_input, include_analysis, profile)
+            trace.root.set_attribute('status', result.get('status', 'unknown'))
+        
+        self._attach_trace(result, trace)
+        return result
+    
+    async def _process_stock_request(self, stock_input: str, include_analysis: bool,
+                                     profile: str) -> Dict[str, Any]:
+        """處理流程本體 (在 trace 之內執行)"""
         start_time = time.time()
         processing_id = f"yourpods_{int(start_time)}"
         
@@ -62,7 +114,8 @@ class YourPodsOrchestrator:
         try:
             # === 階段1: 輸入處理與驗證 ===
             logger.info("📊 階段1: 輸入處理與驗證")
-            stage1_result = await self._execute_stage1(stock_input)
+            with REGISTRY.timer('stage_seconds', stage='stage1'), TRACER.span('stage1'):
+                stage1_result = await self._execute_stage1(stock_input)
             
             if stage1_result["status"] != "valid":
                 return self._create_error_response(
@@ -73,7 +126,14 @@ class YourPodsOrchestrator:
             
             # === 階段2: 改良版資訊收集 ===
             logger.info("🔍 階段2: StockTitan + Gemini 資訊收集")
-            stage2_result = await improved_info_gathering(stage1_result)
+            with REGISTRY.timer('stage_seconds', stage='stage2'), TRACER.span('stage2') as span:
+                stage2_result = await improved_info_gathering(
+                    stage1_result, include_investment_view=self.single_shot and include_analysis
+                )
+                span.set_attributes(
+                    data_sources=stage2_result.get('collection_metadata', {}).get('data_sources', 0),
+                    content_bytes=stage2_result.get('collection_metadata', {}).get('total_content_length', 0)
+                )
             
             if stage2_result["status"] != "success":
                 return self._create_error_response(
@@ -86,7 +146,8 @@ class YourPodsOrchestrator:
             stage3_result = None
             if include_analysis:
                 logger.info("🧠 階段3: 三層金字塔內容分析")
-                stage3_result = await improved_content_analysis(stage2_result)
+                with REGISTRY.timer('stage_seconds', stage='stage3'), TRACER.span('stage3'):
+                    stage3_result = await improved_content_analysis(stage2_result, self.single_shot)
                 
                 if stage3_result["status"] != "success":
                     logger.warning("⚠️ 階段3分析失敗，但繼續處理")
@@ -95,7 +156,7 @@ class YourPodsOrchestrator:
             processing_time = time.time() - start_time
             final_result = self._create_success_response(
                 processing_id, stock_input, stage1_result, 
-                stage2_result, stage3_result, processing_time
+                stage2_result, stage3_result, processing_time, profile
             )
             
             # 更新統計
@@ -118,8 +179,9 @@ class YourPodsOrchestrator:
     async def _execute_stage1(self, stock_input: str) -> Dict[str, Any]:
         """執行階段1: 輸入處理"""
         
-        # 延遲初始化InputProcessor
+        # 延遲初始化InputProcessor (階段1；第一次請求時才匯入，--help 與狀態查詢不必載入)
         if self.input_processor is None:
+            from input_processor import InputProcessor
             self.input_processor = InputProcessor()
         
         try:
@@ -144,15 +206,23 @@ class YourPodsOrchestrator:
                                stage1_result: Dict[str, Any],
                                stage2_result: Dict[str, Any],
                                stage3_result: Optional[Dict[str, Any]],
-                               processing_time: float) -> Dict[str, Any]:
-        """創建成功響應"""
+                               processing_time: float,
+                               profile: Optional[str] = None) -> Dict[str, Any]:
+        """
+        創建成功響應 (只組裝輸出模式需要的欄位)
+        
+        Args:
+            profile: summary / standard / full (None 使用協調器預設值)
+        """
         
+        profile = profile or self.result_profile
         ticker = stage1_result.get('standardized_ticker', stock_input.upper())
+        collection_metadata = stage2_result.get('collection_metadata', {})
         
         # 提取關鍵資訊摘要
         summary = self._extract_key_summary(stage2_result, stage3_result)
         
-        return {
+        response = {
             "processing_id": processing_id,
             "status": "success",
             "timestamp": datetime.now().isoformat(),
@@ -168,27 +238,91 @@ class YourPodsOrchestrator:
             },
             
             # 核心摘要 (為未來的音訊生成準備)
-            "executive_summary": summary,
-            
+            "executive_summary": summary
+        }
+        
+        if profile == 'standard':
+            # 分析結論與來源清單 (不含原始頁面與分類後的段落)
+            response["analysis"] = self._extract_analysis_view(stage2_result, stage3_result)
+        elif profile == 'full':
             # 詳細分析結果
-            "detailed_analysis": {
+            response["detailed_analysis"] = {
                 "stage1_validation": stage1_result,
                 "stage2_information": stage2_result,
                 "stage3_analysis": stage3_result
-            },
-            
-            # 元數據
-            "metadata": {
-                "method": "StockTitan_Gemini_Pyramid",
-                "stages_completed": 3 if stage3_result else 2,
-                "cost_estimate": stage2_result.get('collection_metadata', {}).get('cost_estimate', 0),
-                "data_sources": stage2_result.get('collection_metadata', {}).get('data_sources', 0),
-                "analysis_confidence": stage3_result.get('analysis_metadata', {}).get('confidence_level', 'medium') if stage3_result else 'n/a'
-            },
-            
+            }
+        
+        # 元數據
+        response["metadata"] = {
+            "method": "StockTitan_Gemini_Pyramid",
+            "result_profile": profile,
+            "llm_mode": self._llm_mode(stage3_result),
+            "stages_completed": 3 if stage3_result else 2,
+            "cost_estimate": collection_metadata.get('cost_estimate', 0),
+            "data_sources": collection_metadata.get('data_sources', 0),
+            "analysis_confidence": stage3_result.get('analysis_metadata', {}).get('confidence_level', 'medium') if stage3_result else 'n/a'
+        }
+        
+        if profile == 'full':
             # 系統統計
-            "system_stats": self.processing_stats.copy()
+            response["system_stats"] = self.processing_stats.copy()
+        
+        return response
+    
+    @staticmethod
+    def _llm_mode(stage3_result: Optional[Dict[str, Any]]) -> str:
+        """依實際產生增強分析的方式回報 LLM 模式 (而不是協調器的設定)"""
+        enhanced = (stage3_result or {}).get('enhanced_analysis') or {}
+        if enhanced.get('source') == 'single_shot':
+            return "single_shot"
+        if enhanced.get('success'):
+            return "two_call"
+        # 沒有階段3或未啟用增強：只有階段2的一次呼叫
+        return "stage2_only"
+
+    def _extract_analysis_view(self, stage2_result: Dict[str, Any],
+                               stage3_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """standard 模式的分析內容：專業分析、三層分析結論與來源清單"""
+        
+        gemini_analysis = stage2_result.get('gemini_professional_analysis', {})
+        view: Dict[str, Any] = {
+            "professional_analysis": gemini_analysis.get('professional_analysis', ''),
+            "structured_analysis": gemini_analysis.get('structured_analysis'),
+            "sources": [
+                {
+                    "url": source.get('url', ''),
+                    "quality_score": source.get('quality_score', 0),
+                    "timestamp": source.get('timestamp', ''),
+                    "ai_analysis": source.get('rhea_ai_analysis', {})
+                }
+                for source in stage2_result.get('raw_information', []) if source.get('success')
+            ]
         }
+        
+        if stage3_result and stage3_result.get('status') == 'success':
+            for key in ('layer_1_what', 'layer_2_why', 'layer_3_so_what', 'enhanced_analysis'):
+                view[key] = stage3_result.get(key)
+        
+        return view
+    
+    def _attach_trace(self, result: Dict[str, Any], trace) -> Dict[str, Any]:
+        """
+        附加 trace 摘要 - 關鍵路徑瀑布圖指出此請求最值得優化的步驟
+        
+        summary 模式只附 trace ID 與總耗時，standard 另附關鍵路徑，full 附完整瀑布圖
+        """
+        if result.get('status') != 'success':
+            return result
+        
+        profile = result['metadata'].get('result_profile', 'full')
+        if profile == 'full':
+            result['metadata']['trace'] = trace.summary()
+        else:
+            trace_info = {"trace_id": trace.trace_id, "total_ms": round(trace.root.duration_ms, 1)}
+            if profile == 'standard':
+                trace_info["critical_path"] = trace.critical_path()
+            result['metadata']['trace'] = trace_info
+        return result
     
     def _create_error_response(self, processing_id: str, stock_input: str, 
                              error_message: str, start_time: float) -> Dict[str, Any]:
@@ -248,6 +382,7 @@ class YourPodsOrchestrator:
         """更新處理統計"""
         
         self.processing_stats["total_processed"] += 1
+        REGISTRY.observe('request_seconds', processing_time, status='success' if success else 'error')
         
         if success:
             self.processing_stats["successful"] += 1
@@ -281,38 +416,63 @@ class YourPodsOrchestrator:
             "average_cost_per_request": (
                 self.processing_stats["total_cost"] / 
                 max(self.processing_stats["successful"], 1)
-            )
+            ),
+            "llm_cache": get_llm_cache().get_stats(),
+            "serialization": describe_serialization(),
+            "latency": REGISTRY.summary()
         }
 
 # === 便捷功能函數 ===
 
-async def analyze_stock(ticker: str, include_deep_analysis: bool = True) -> Dict[str, Any]:
+async def analyze_stock(ticker: str, include_deep_analysis: bool = True,
+                        single_shot: Optional[bool] = None,
+                        profile: Optional[str] = None) -> Dict[str, Any]:
     """
     便捷函數：分析單支股票
     
     Args:
         ticker: 股票代碼
         include_deep_analysis: 是否包含深度分析
+        single_shot: 單次LLM呼叫模式 (None 時依環境變數)
+        profile: 結果輸出模式 summary/standard/full (None 時依環境變數 RESULT_PROFILE)
         
     Returns:
-        完整的分析結果
+        分析結果
     """
-    orchestrator = YourPodsOrchestrator()
+    orchestrator = YourPodsOrchestrator(single_shot, profile)
     return await orchestrator.process_stock_request(ticker, include_deep_analysis)
 
 async def batch_analyze_stocks(tickers: List[str], 
-                             max_concurrent: int = 3) -> List[Dict[str, Any]]:
+                             max_concurrent: int = 3,
+                             single_shot: Optional[bool] = None,
+                             pipeline: Optional[bool] = None,
+                             stage_workers: Optional[Dict[str, int]] = None,
+                             profile: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     批量分析多支股票
     
     Args:
         tickers: 股票代碼列表
-        max_concurrent: 最大並行數量
+        max_concurrent: 最大並行數量 (僅用於非流水線模式)
+        single_shot: 單次LLM呼叫模式 (None 時依環境變數)
+        pipeline: 流水線批次引擎 - 階段1/抓取/Gemini/分析各有獨立工作池
+                  (None 時依環境變數 BATCH_PIPELINE，預設啟用)；停用時整條流程共用 max_concurrent 個名額
+        stage_workers: 覆寫流水線各段工作池大小，例如 {"scrape": 10, "llm": 4}
+        profile: 結果輸出模式 (None 時依環境變數 RESULT_PROFILE)
         
     Returns:
         分析結果列表
     """
-    orchestrator = YourPodsOrchestrator()
+    orchestrator = YourPodsOrchestrator(single_shot, profile)
+    
+    if pipeline is None:
+        pipeline = os.getenv('BATCH_PIPELINE', 'true').lower() == 'true'
+    
+    if pipeline:
+        results = await BatchPipeline(orchestrator, PipelineConfig(stage_workers)).run(tickers)
+        successful = sum(1 for r in results if r.get('status') == 'success')
+        logger.info(f"✅ 批量分析完成: {successful}/{len(tickers)} 成功")
+        return results
     
     async def analyze_single(ticker):
         try:
@@ -325,7 +485,9 @@ async def batch_analyze_stocks(tickers: List[str],
     semaphore = asyncio.Semaphore(max_concurrent)
     
     async def limited_analyze(ticker):
+        queued_at = time.perf_counter()
         async with semaphore:
+            REGISTRY.observe('queue_wait_seconds', time.perf_counter() - queued_at, queue='batch')
             return await analyze_single(ticker)
     
     logger.info(f"🔄 開始批量分析 {len(tickers)} 支股票 (並行度: {max_concurrent})")
@@ -339,6 +501,94 @@ async def batch_analyze_stocks(tickers: List[str],
     
     return results
 
+async def run_queued_batch(tickers: Optional[List[str]] = None, batch_id: Optional[str] = None,
+                           priority: int = PRIORITY_BULK, single_shot: Optional[bool] = None,
+                           stage_workers: Optional[Dict[str, int]] = None,
+                           profile: Optional[str] = None) -> Dict[str, Any]:
+    """
+    以持久化工作佇列執行批次 (可續跑)
+    
+    每支股票的階段輸出寫入檢查點、完成即寫入結果；中途崩潰後以相同的 batch_id 再執行，
+    已完成的股票直接取用結果，已有階段2檢查點的股票不再重新抓取
+    
+    Args:
+        tickers: 要提交的股票 (None 為只續跑既有批次)
+        batch_id: 批次ID (None 時自動產生)
+        priority: 優先度，數字越大越先處理 (互動請求使用 PRIORITY_INTERACTIVE)
+        single_shot: 單次LLM呼叫模式 (None 時依環境變數)
+        stage_workers: 覆寫流水線各段工作池大小
+        profile: 結果輸出模式 (寫入佇列的結果；None 時依環境變數 RESULT_PROFILE)
+        
+    Returns:
+        {"batch_id", "status": 各狀態數量, "results": 依提交順序的結果}
+    """
+    job_queue = get_job_queue()
+    if tickers:
+        batch_id = job_queue.submit(tickers, priority=priority, batch_id=batch_id)
+    elif not batch_id:
+        raise ValueError("需要提供股票列表或要續跑的 batch_id")
+    
+    logger.info(f"🗂️ 批次 {batch_id} 開始 (中斷後可用 --resume {batch_id} 續跑)")
+    orchestrator = YourPodsOrchestrator(single_shot, profile)
+    await BatchPipeline(orchestrator, PipelineConfig(stage_workers)).run_queue(job_queue, batch_id)
+    
+    status = job_queue.batch_status(batch_id)
+    logger.info(f"✅ 批次 {batch_id} 完成: {status['done']}/{status['total']} 成功")
+    return {"batch_id": batch_id, "status": status, "results": job_queue.batch_results(batch_id)}
+
+async def read_ticker_stream(source: IO[str], chunk_lines: int = 256) -> AsyncIterator[str]:
+    """
+    逐批讀取股票輸入 (每行一個或以逗號/空白分隔，# 開頭為註解)
+    
+    讀取在執行緒中進行，標準輸入等待資料時不阻塞事件迴圈
+    """
+    loop = asyncio.get_event_loop()
+    
+    def read_chunk() -> List[str]:
+        return [line for line in (source.readline() for _ in range(chunk_lines)) if line]
+    
+    while True:
+        lines = await loop.run_in_executor(None, read_chunk)
+        if not lines:
+            return
+        for line in lines:
+            line = line.split('#', 1)[0]
+            for ticker in line.replace(',', ' ').split():
+                yield ticker
+
+async def stream_batch(source: IO[str], output: IO[str], single_shot: Optional[bool] = None,
+                       stage_workers: Optional[Dict[str, int]] = None,
+                       profile: Optional[str] = None) -> Dict[str, int]:
+    """
+    串流批量分析：輸入邊讀邊處理，每支股票完成即輸出一行 NDJSON (完成順序)
+    
+    每行格式: {"index": 輸入序號, "input": 原始輸入, "ticker": 代碼, "status": 狀態, "result": 結果}
+    
+    Args:
+        profile: 結果輸出模式 (None 時依環境變數 RESULT_PROFILE)
+    
+    Returns:
+        {"total", "success", "error"}
+    """
+    orchestrator = YourPodsOrchestrator(single_shot, profile)
+    
+    def emit(index: int, stock_input: str, result: Dict[str, Any]):
+        line = {
+            "index": index,
+            "input": stock_input,
+            "ticker": result.get('stock_info', {}).get('ticker', stock_input.upper()),
+            "status": result.get('status', 'unknown'),
+            "result": result
+        }
+        output.write(dumps(line) + "\n")
+        output.flush()
+    
+    counts = await BatchPipeline(orchestrator, PipelineConfig(stage_workers)).run_stream(
+        read_ticker_stream(source), emit
+    )
+    logger.info(f"✅ 串流批量分析完成: {counts['success']}/{counts['total']} 成功")
+    return counts
+
 # === 命令列界面 ===
 
 async def interactive_mode():
@@ -365,6 +615,7 @@ async def interactive_mode():
                 print(f"成功率: {status['success_rate']:.1f}%")
                 print(f"平均處理時間: {status['statistics']['average_processing_time']:.1f}秒")
                 print(f"平均成本: ${status['average_cost_per_request']:.3f}")
+                print(f"LLM快取命中率: {status['llm_cache']['hit_rate'] * 100:.1f}%")
                 continue
             
             if not user_input:
@@ -439,21 +690,90 @@ if __name__ == "__main__":
     parser.add_argument("--batch", "-b", nargs="+", help="批量分析多支股票")
     parser.add_argument("--interactive", "-i", action="store_true", help="互動模式")
     parser.add_argument("--test", action="store_true", help="運行系統測試")
+    parser.add_argument("--metrics-port", type=int, help="在指定埠啟動 /metrics 端點 (OpenMetrics)")
+    parser.add_argument("--metrics-host",
+                        help="/metrics 端點的監聽位址 (預設依 METRICS_HOST，未設定時為 127.0.0.1)")
+    parser.add_argument("--metrics-file", help="結束時將指標寫入檔案 (OpenMetrics 文字格式)")
+    parser.add_argument("--trace-file", help="將每個請求的 trace 附加寫入 JSON Lines 檔案 (OTLP 形狀)")
+    parser.add_argument("--single-shot", action="store_true",
+                        help="單次LLM呼叫模式：一次Gemini呼叫同時產生專業分析與投資觀點")
+    parser.add_argument("--stage-workers", nargs="+", metavar="STAGE=N",
+                        help="流水線批次各段工作池大小 (stage1/scrape/llm/analysis)，例如 scrape=10 llm=4")
+    parser.add_argument("--no-pipeline", action="store_true",
+                        help="批量分析改用整條流程共用並行名額的舊模式 (不使用持久化佇列)")
+    parser.add_argument("--batch-file", metavar="PATH",
+                        help="串流批量分析：從檔案讀取股票 ('-' 為標準輸入)，每支完成即輸出一行 NDJSON")
+    parser.add_argument("--output", "-o", metavar="PATH", help="--batch-file 的 NDJSON 輸出檔 (預設為標準輸出)")
+    parser.add_argument("--batch-id", help="批量分析的批次ID (以相同ID重新執行即為續跑)")
+    parser.add_argument("--resume", metavar="BATCH_ID", help="續跑中斷的批次")
+    parser.add_argument("--batch-report", action="store_true",
+                        help="--batch/--resume 輸出 {batch_id, status, results} (預設只輸出結果列表)")
+    parser.add_argument("--priority", type=int, default=PRIORITY_BULK,
+                        help="批次優先度，數字越大越先處理 (共用同一佇列的工作者)")
+    parser.add_argument("--profile", choices=RESULT_PROFILES,
+                        help="結果輸出模式：summary 摘要 / standard 分析結論與來源 / full 完整除錯輸出 (預設依 RESULT_PROFILE)")
+    parser.add_argument("--cpu-workers", type=int,
+                        help="CPU行程池工作行程數，頁面抽取與三層分析分散到多核心 (0 為停用)")
     
     args = parser.parse_args()
     
+    if args.trace_file:
+        TRACER.export_path = args.trace_file
+    
+    if args.metrics_port:
+        REGISTRY.serve(args.metrics_port, args.metrics_host)
+    
+    if args.cpu_workers is not None:
+        configure_cpu_pool(args.cpu_workers)
+    
+    stage_workers = {}
+    for spec in args.stage_workers or []:
+        stage, _, workers = spec.partition('=')
+        if not workers.isdigit():
+            parser.error(f"--stage-workers 格式應為 STAGE=N: {spec}")
+        stage_workers[stage] = int(workers)
+    
     async def main():
         if args.test:
             await run_comprehensive_test()
         elif args.ticker:
-            result = await analyze_stock(args.ticker)
-            print(json.dumps(result, indent=2, ensure_ascii=False))
-        elif args.batch:
-            results = await batch_analyze_stocks(args.batch)
-            print(json.dumps(results, indent=2, ensure_ascii=False))
+            result = await analyze_stock(args.ticker, single_shot=args.single_shot or None,
+                                         profile=args.profile)
+            print(dumps(result, indent=True))
+        elif args.batch_file:
+            source = sys.stdin if args.batch_file == '-' else open(args.batch_file, 'r', encoding='utf-8')
+            output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+            try:
+                await stream_batch(source, output, single_shot=args.single_shot or None,
+                                   stage_workers=stage_workers, profile=args.profile)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+                if output is not sys.stdout:
+                    output.close()
+        elif args.batch and (args.no_pipeline or os.getenv('BATCH_PIPELINE', 'true').lower() != 'true'):
+            results = await batch_analyze_stocks(args.batch, single_shot=args.single_shot or None,
+                                                 pipeline=False, profile=args.profile)
+            print(dumps(results, indent=True))
+        elif args.batch or args.resume:
+            # 批量分析經由持久化佇列：每支股票完成即保存，崩潰後可續跑
+            try:
+                batch = await run_queued_batch(args.batch, args.resume or args.batch_id, args.priority,
+                                               single_shot=args.single_shot or None, stage_workers=stage_workers,
+                                               profile=args.profile)
+            except ValueError as e:
+                # 重複的股票、未知的輸出模式等輸入錯誤
+                parser.error(str(e))
+            print(dumps(batch if args.batch_report else batch["results"], indent=True))
         elif args.interactive:
             await interactive_mode()
         else:
             print("請選擇一個操作模式，使用 --help 查看說明")
     
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        get_cpu_pool().shutdown()
+        flush_symbol_master()
+        if args.metrics_file:
+            REGISTRY.dump(args.metrics_file)
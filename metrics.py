@@ -0,0 +1,272 @@
+# 效能指標 - 各階段/各服務商延遲直方圖、計數器，匯出為 Prometheus/OpenMetrics 文字格式
+# 可透過內建的小型HTTP端點 (/metrics) 或寫入檔案匯出
+
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger('YourPods_Metrics')
+
+# 對數分桶邊界 (秒)：1ms 起，每桶放大 √2 倍，最大約 17 分鐘
+BUCKET_BOUNDS = [0.001 * (2 ** (i / 2)) for i in range(41)]
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class LatencyHistogram:
+    """對數分桶延遲直方圖，可估算 p50/p95/p99"""
+
+    def __init__(self, bounds: Optional[List[float]] = None):
+        self.bounds = bounds or BUCKET_BOUNDS
+        self.counts = [0] * (len(self.bounds) + 1)  # 最後一桶為 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """以桶內線性內插估算分位數"""
+
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                fraction = (rank - cumulative) / bucket_count
+                estimate = lower + (upper - lower) * fraction
+                return min(max(estimate, self.min), self.max)
+            cumulative += bucket_count
+
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+            "p50": round(self.quantile(0.50), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "max": round(self.max, 4)
+        }
+
+
+class MetricsRegistry:
+    """指標登錄表：直方圖、計數器、量表，以及匯出時才計算的收集器"""
+
+    def __init__(self, prefix: str = 'yourpods'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, LatencyHistogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], List[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    # === 記錄 ===
+
+    def observe(self, name: str, value: float, **labels: str):
+        """記錄一筆延遲 (秒)"""
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = LatencyHistogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """計時區塊並記錄到直方圖 (例外時同樣記錄)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """計數器累加"""
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        """設定量表數值"""
+        key = self._label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def describe(self, name: str, help_text: str):
+        """設定指標說明文字"""
+        self._help[name] = help_text
+
+    def add_collector(self, collector: Callable[[], List[Tuple[str, str, Dict[str, str], float]]]):
+        """
+        註冊匯出時呼叫的收集器
+
+        collector() 回傳 [(名稱, 'counter'|'gauge', 標籤, 數值)]，用於快取命中率這類由其他元件維護的統計
+        """
+        self._collectors.append(collector)
+
+    # === 查詢與匯出 ===
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """各直方圖序列的 p50/p95/p99 摘要"""
+        with self._lock:
+            return {
+                name: {self._format_labels(key) or 'all': histogram.summary()
+                       for key, histogram in series.items()}
+                for name, series in self._histograms.items()
+            }
+
+    def render_openmetrics(self) -> str:
+        """輸出 OpenMetrics 文字格式"""
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                full = self._full_name(name)
+                self._header(lines, name, full, 'histogram')
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full}_bucket{self._render_labels(key, le=f'{bound:.6g}')} {cumulative}")
+                    lines.append(f"{full}_bucket{self._render_labels(key, le='+Inf')} {histogram.count}")
+                    lines.append(f"{full}_count{self._render_labels(key)} {histogram.count}")
+                    lines.append(f"{full}_sum{self._render_labels(key)} {histogram.sum:.6f}")
+
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+
+        for collector in self._collectors:
+            try:
+                for name, metric_type, labels, value in collector():
+                    target = counters if metric_type == 'counter' else gauges
+                    target.setdefault(name, {})[self._label_key(labels)] = value
+            except Exception as e:
+                logger.warning(f"⚠️ 指標收集器失敗: {str(e)}")
+
+        for name, series in sorted(counters.items()):
+            full = self._full_name(name)
+            self._header(lines, name, full, 'counter')
+            for key, value in sorted(series.items()):
+                lines.append(f"{full}_total{self._render_labels(key)} {value:g}")
+
+        for name, series in sorted(gauges.items()):
+            full = self._full_name(name)
+            self._header(lines, name, full, 'gauge')
+            for key, value in sorted(series.items()):
+                lines.append(f"{full}{self._render_labels(key)} {value:g}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """將目前指標寫入檔案 (供 node_exporter textfile collector 或離線分析使用)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_openmetrics())
+        os.replace(tmp_path, path)
+        logger.info(f"📈 指標已寫入 {path}")
+
+    def serve(self, port: int, host: Optional[str] = None) -> 'ThreadingHTTPServer':
+        """
+        在背景執行緒啟動 /metrics HTTP 端點
+
+        Args:
+            port: 監聽埠
+            host: 監聽位址 (None 時讀取環境變數 METRICS_HOST，預設只接受本機連線；對外開放請明確指定 0.0.0.0)
+        """
+        host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_openmetrics().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info(f"📈 指標端點已啟動: http://{host}:{port}/metrics")
+        return server
+
+    def reset(self):
+        """清除所有已記錄的指標 (收集器保留)"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    # === 內部函數 ===
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    def _header(self, lines: List[str], name: str, full: str, metric_type: str):
+        lines.append(f"# TYPE {full} {metric_type}")
+        if name in self._help:
+            lines.append(f"# HELP {full} {self._help[name]}")
+
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    @staticmethod
+    def _format_labels(key: LabelKey) -> str:
+        return ",".join(f"{k}={v}" for k, v in key)
+
+    @staticmethod
+    def _render_labels(key: LabelKey, **extra: str) -> str:
+        pairs = list(key) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = [
+            f'{k}="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for k, v in pairs
+        ]
+        return "{" + ",".join(escaped) + "}"
+
+
+# 全局登錄表 (所有階段共用)
+REGISTRY = MetricsRegistry()
+
+REGISTRY.describe('stage_seconds', 'Latency of each pipeline stage in seconds.')
+REGISTRY.describe('provider_seconds', 'Latency of external provider calls (Firecrawl, Gemini) in seconds.')
+REGISTRY.describe('parse_seconds', 'CPU time spent in local parsing and extraction steps in seconds.')
+REGISTRY.describe('queue_wait_seconds', 'Time a request waited for a concurrency slot in seconds.')
+REGISTRY.describe('request_seconds', 'End-to-end latency of process_stock_request in seconds.')
+REGISTRY.describe('llm_tokens', 'Estimated LLM tokens sent to and received from providers.')
+REGISTRY.describe('cache_requests', 'Cache lookups by cache and result.')
+REGISTRY.describe('cache_hit_ratio', 'Cache hit ratio since process start.')
@@ -0,0 +1,239 @@
+# 公司名稱解析索引 - 以代碼主檔的公司名稱與常用別名建立三字元組 (trigram) 與前綴索引，
+# 在本地把公司名稱、簡稱或打錯的輸入對應到股票代碼；分數接近的多個候選回傳「模稜兩可」而不是猜一個
+
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from symbol_master import SymbolMaster, get_symbol_master, normalize_symbol
+
+logger = logging.getLogger('YourPods_NameIndex')
+
+# 常用名稱/簡稱 → 代碼 (優先於模糊比對；主檔的同名多類股，如 GOOG/GOOGL，也由此決定預設)
+COMMON_ALIASES = {
+    "APPLE": "AAPL",
+    "MICROSOFT": "MSFT",
+    "GOOGLE": "GOOGL",
+    "ALPHABET": "GOOGL",
+    "AMAZON": "AMZN",
+    "TESLA": "TSLA",
+    "NVIDIA": "NVDA",
+    "FACEBOOK": "META",
+    "META": "META",
+    "NETFLIX": "NFLX",
+    "BERKSHIRE": "BRK-B",
+    "BERKSHIRE HATHAWAY": "BRK-B",
+    "JP MORGAN": "JPM",
+    "JPMORGAN": "JPM"
+}
+
+# 解析結果狀態
+RESOLVED_SYMBOL = 'symbol'        # 輸入本身就是主檔中的代碼
+RESOLVED_ALIAS = 'alias'          # 常用別名
+RESOLVED_EXACT = 'exact'          # 正規化後的公司名稱完全相同
+RESOLVED_FUZZY = 'fuzzy'          # 模糊比對，且明顯領先其他候選
+AMBIGUOUS = 'ambiguous'           # 多個候選分數接近
+NOT_FOUND = 'not_found'
+
+MIN_SCORE = 0.5           # 低於此分數不視為候選
+AMBIGUITY_MARGIN = 0.08   # 第二名與第一名差距在此之內即為模稜兩可
+MIN_PREFIX_LENGTH = 3
+MIN_FUZZY_LENGTH = 4      # 更短的輸入只做前綴比對 (三個字母的錯字沒有意義，且常見三字元組的候選太多)
+MAX_CANDIDATES = 5
+
+# 公司名稱結尾的組織型態，不參與比對
+_SUFFIXES = {
+    'INC', 'INCORPORATED', 'CORP', 'CORPORATION', 'CO', 'COMPANY', 'LTD', 'LIMITED', 'PLC',
+    'LLC', 'LP', 'NV', 'SA', 'AG', 'SE', 'HOLDINGS', 'HOLDING', 'GROUP', 'THE', 'AND'
+}
+# 證券類別說明從此處起截斷 ("... Class B Common Stock")
+_DESIGNATORS = re.compile(
+    r'\b(?:CLASS|COMMON|ORDINARY|SERIES|AMERICAN DEPOSITARY|DEPOSITARY|SHARES|ADS|ADR)\b.*$'
+)
+# 不是普通股的證券 (權證、認股權、單位、特別股、債券)，不放入名稱索引以免與普通股搶分數
+_NON_EQUITY = re.compile(r'\b(?:WARRANTS?|RIGHTS?|UNITS?|PREFERRED|NOTES?|DEBENTURES?)\b|%')
+_NON_ALNUM = re.compile(r'[^A-Z0-9 ]+')
+_SHARE_CLASS = re.compile(r'\bCLASS ([A-Z])\b')
+
+
+def normalize_name(name: str) -> str:
+    """正規化公司名稱：大寫、去除標點、證券類別說明與結尾的組織型態 ("JP Morgan Chase & Co." → "JP MORGAN CHASE")"""
+    cleaned = _NON_ALNUM.sub(' ', name.upper().replace('.', ''))
+    cleaned = _DESIGNATORS.sub('', cleaned)
+    tokens = cleaned.split()
+    while len(tokens) > 1 and tokens[-1] in _SUFFIXES:
+        tokens.pop()
+    return ' '.join(tokens)
+
+
+def trigrams(text: str) -> set:
+    """前面補兩個空白、後面補一個空白後的三字元組 (開頭的字元權重較高，打錯字尾影響較小)"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """公司名稱 → 代碼的模糊比對索引"""
+
+    def __init__(self, master: SymbolMaster, aliases: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            master: 代碼主檔 (提供代碼與公司名稱)
+            aliases: 常用名稱 → 代碼，預設為 COMMON_ALIASES
+        """
+        start = time.perf_counter()
+        self.master = master
+        self.version = master.version
+        self.aliases = {normalize_name(k): normalize_symbol(v) for k, v in (aliases or COMMON_ALIASES).items()}
+
+        # 每個項目: (正規化名稱, 代碼, 顯示名稱)
+        self._entries: List[Tuple[str, str, str]] = []
+        self._exact: Dict[str, List[int]] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._grams: List[frozenset] = []
+        for record in master.records():
+            if '-P' in record.symbol or _NON_EQUITY.search(record.name.upper()):
+                continue
+            normalized = normalize_name(record.name)
+            if normalized:
+                self._add(normalized, record.symbol, record.name)
+        # 前綴查詢用的排序名稱
+        self._sorted = sorted((entry[0], i) for i, entry in enumerate(self._entries))
+        self._sorted_names = [name for name, _ in self._sorted]
+
+        if self._entries:
+            logger.info(f"🔤 建立公司名稱索引 {len(self._entries)} 筆 "
+                        f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    def _add(self, normalized: str, symbol: str, name: str):
+        entry_id = len(self._entries)
+        self._entries.append((normalized, symbol, name))
+        self._exact.setdefault(normalized, []).append(entry_id)
+        grams = frozenset(trigrams(normalized))
+        self._grams.append(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(entry_id)
+
+    def _candidate(self, entry_id: int, score: float) -> Dict[str, Any]:
+        _, symbol, name = self._entries[entry_id]
+        return {"symbol": symbol, "name": name, "score": round(score, 3)}
+
+    def _result(self, status: str, ticker: Optional[str] = None,
+                candidates: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        return {"status": status, "ticker": ticker, "candidates": candidates or []}
+
+    def resolve(self, user_input: str) -> Dict[str, Any]:
+        """
+        將輸入解析為股票代碼
+
+        Args:
+            user_input: 代碼、公司名稱或別名 (可含錯字)
+
+        Returns:
+            {"status", "ticker", "candidates": [{"symbol", "name", "score"}]}；
+            status 為 ambiguous 時 ticker 為 None，candidates 依分數排序
+        """
+        cleaned = user_input.strip().upper()
+        if not cleaned:
+            return self._result(NOT_FOUND)
+
+        if cleaned in self.master:
+            return self._result(RESOLVED_SYMBOL, normalize_symbol(cleaned))
+
+        result = self._resolve_name(normalize_name(cleaned))
+        # 輸入指定了股份類別 ("Berkshire Hathaway Class A") 時改用該類別的代碼
+        share_class = _SHARE_CLASS.search(cleaned)
+        if share_class and result["ticker"]:
+            class_symbol = f"{result['ticker'].split('-')[0]}-{share_class.group(1)}"
+            if class_symbol in self.master:
+                result["ticker"] = class_symbol
+        return result
+
+    def _resolve_name(self, query: str) -> Dict[str, Any]:
+        """以正規化後的名稱依序比對別名、完整名稱與模糊索引"""
+        if query in self.aliases:
+            return self._result(RESOLVED_ALIAS, self.aliases[query])
+
+        exact = self._exact.get(query)
+        if exact:
+            candidates = [self._candidate(i, 1.0) for i in exact]
+            if len(candidates) == 1:
+                return self._result(RESOLVED_EXACT, candidates[0]["symbol"], candidates)
+            # 同名多類股 (例如 A/B 股)
+            return self._result(AMBIGUOUS, None, candidates[:MAX_CANDIDATES])
+
+        ranked = self._rank(query)
+        if not ranked:
+            return self._result(NOT_FOUND)
+
+        top_score = ranked[0][1]
+        close = [(i, score) for i, score in ranked if score >= top_score - AMBIGUITY_MARGIN]
+        candidates = [self._candidate(i, score) for i, score in ranked[:MAX_CANDIDATES]]
+        if len(close) == 1:
+            return self._result(RESOLVED_FUZZY, candidates[0]["symbol"], candidates)
+        return self._result(AMBIGUOUS, None, [self._candidate(i, score) for i, score in close[:MAX_CANDIDATES]])
+
+    def _trigram_scores(self, query: str) -> Dict[int, float]:
+        """三字元組 Dice 係數不低於 MIN_SCORE 的項目"""
+        query_grams = trigrams(query)
+        query_count = len(query_grams)
+        # 共有 c 個三字元組的項目 Dice = 2c / (q + n) 且 n ≥ c，要達到門檻 s 必須 c ≥ s·q / (2 - s)；
+        # 因此可略過最常見的 (門檻 - 1) 個三字元組，只由較少見的三字元組產生候選，結果不變
+        required = math.ceil(MIN_SCORE * query_count / (2 - MIN_SCORE))
+        skip = max(0, required - 1)
+        postings = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+        shared = Counter()
+        for entry_ids in postings[:len(postings) - skip]:
+            shared.update(entry_ids)
+
+        scores = {}
+        for entry_id, partial in shared.items():
+            entry_grams = self._grams[entry_id]
+            denominator = query_count + len(entry_grams)
+            # 加上略過的三字元組仍達不到門檻就不必精算
+            if 2.0 * (partial + skip) / denominator < MIN_SCORE:
+                continue
+            score = 2.0 * len(query_grams & entry_grams) / denominator
+            if score >= MIN_SCORE:
+                scores[entry_id] = score
+        return scores
+
+    def _rank(self, query: str) -> List[Tuple[int, float]]:
+        """以三字元組 Dice 係數與前綴比對為候選評分，回傳分數不低於 MIN_SCORE 的 (項目, 分數)，由高到低"""
+        scores: Dict[int, float] = {}
+        if len(query) >= MIN_FUZZY_LENGTH:
+            scores = self._trigram_scores(query)
+
+        # 名稱以查詢開頭：查詢涵蓋名稱越多分數越高 ("APPL" 對 "APPLE" 高於 "APPLIED MATERIALS")
+        if len(query) >= MIN_PREFIX_LENGTH:
+            position = bisect.bisect_left(self._sorted_names, query)
+            while position < len(self._sorted_names) and self._sorted_names[position].startswith(query):
+                name, entry_id = self._sorted[position]
+                prefix_score = 0.5 + 0.5 * len(query) / len(name)
+                if prefix_score > scores.get(entry_id, 0.0):
+                    scores[entry_id] = prefix_score
+                position += 1
+
+        return sorted(scores.items(), key=lambda item: (-item[1], self._entries[item[0]][1]))
+
+
+# 全局實例
+_index_instance = None
+_index_lock = threading.Lock()
+
+
+def get_name_index() -> NameIndex:
+    """取得共用的公司名稱索引 (代碼主檔更新後自動重建)"""
+    global _index_instance
+
+    master = get_symbol_master()
+    with _index_lock:
+        if _index_instance is None or _index_instance.version != master.version:
+            _index_instance = NameIndex(master)
+
+    return _index_instance
@@ -0,0 +1,130 @@
+# 段落相關性排序 - 以 BM25 對頁面段落評分，取代關鍵字過濾
+# 每個抓取的頁面建立一次索引，依股票代碼/公司名稱/行業查詢取前k個段落
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Pattern, Tuple
+
+from text_utils import tokenize
+
+# 公司名稱與行業描述中不具區別性的詞
+NAME_STOPWORDS = {
+    'inc', 'inc.', 'corp', 'corp.', 'corporation', 'co', 'co.', 'company', 'ltd', 'ltd.',
+    'plc', 'llc', 'lp', 'holdings', 'holding', 'group', 'class', 'the', 'and', 'of', '&',
+    'unknown', '未知'
+}
+
+# 財經關鍵字 (低權重，用於在沒有代碼提及的段落之間排序)
+FINANCIAL_KEYWORDS = [
+    'earnings', 'revenue', 'profit', 'guidance', 'analyst',
+    'rating', 'target', 'price', 'volume', 'trading',
+    'quarterly', 'annual', 'financial', 'results'
+]
+
+
+class BM25Index:
+    """輕量 BM25 索引 (純Python，單頁段落數量下不需要額外依賴)"""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if documents else 0.0
+
+        doc_freq: Counter = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def score(self, query: Dict[str, float]) -> List[float]:
+        """以加權查詢詞對每個文件評分"""
+
+        scores = []
+        for tf, length in zip(self.term_freqs, self.doc_lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            total = 0.0
+            for term, weight in query.items():
+                freq = tf.get(term)
+                if freq:
+                    total += weight * self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(total)
+        return scores
+
+
+def build_query(ticker: str, company_name: str = '', industry: str = '') -> Dict[str, float]:
+    """建立加權查詢：代碼 > 公司名稱 > 行業 > 財經關鍵字"""
+
+    query: Dict[str, float] = {}
+
+    def add(terms: List[str], weight: float):
+        for term in terms:
+            if term not in NAME_STOPWORDS:
+                query[term] = max(query.get(term, 0.0), weight)
+
+    add(FINANCIAL_KEYWORDS, 0.3)
+    add(tokenize(industry), 1.0)
+    add(tokenize(company_name), 2.0)
+    if ticker:
+        add([ticker.lower(), f"${ticker.lower()}"], 3.0)
+
+    return query
+
+
+def ticker_mention_pattern(ticker: str) -> Pattern:
+    """大小寫敏感的代碼提及 (AAPL、$AAPL、NASDAQ: AAPL、(AAPL))"""
+    return re.compile(r'(?<![A-Za-z0-9])\$?' + re.escape(ticker.upper()) + r'(?![A-Za-z0-9])')
+
+
+def rank_paragraphs(paragraphs: List[str], ticker: str, company_name: str = '',
+                    industry: str = '', top_k: int = 12, char_budget: int = 6000,
+                    min_length: int = 30) -> List[Tuple[int, float]]:
+    """
+    對段落評分並在數量與字數預算內選出最相關的段落
+
+    Returns:
+        [(段落索引, 分數)]，依原始順序排列
+    """
+
+    if not paragraphs:
+        return []
+
+    index = BM25Index(paragraphs)
+    query = build_query(ticker, company_name, industry)
+    scores = index.score(query)
+    mention = ticker_mention_pattern(ticker) if ticker else None
+    specific_terms = {term for term, weight in query.items() if weight >= 1.0}
+
+    candidates = []
+    for i, (paragraph, score) in enumerate(zip(paragraphs, scores)):
+        mentions_ticker = bool(mention and mention.search(paragraph))
+        if not mentions_ticker and (score <= 0 or len(paragraph) < min_length):
+            continue
+        specific = mentions_ticker or bool(specific_terms & index.term_freqs[i].keys())
+        candidates.append((mentions_ticker, specific, score, i))
+
+    # 只命中通用財經關鍵字的段落僅在頁面沒有任何代碼/公司/行業段落時使用
+    if any(c[1] for c in candidates):
+        candidates = [c for c in candidates if c[1]]
+
+    # 提及代碼的段落優先，其次依分數
+    candidates.sort(key=lambda c: (c[0], c[2]), reverse=True)
+
+    selected = []
+    used_chars = 0
+    for _, _, score, i in candidates:
+        if len(selected) >= top_k:
+            break
+        length = len(paragraphs[i])
+        if selected and used_chars + length > char_budget:
+            continue
+        selected.append((i, score))
+        used_chars += length
+
+    return sorted(selected)
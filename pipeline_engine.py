@@ -0,0 +1,409 @@
+# 流水線批次引擎 - 階段1、抓取、Gemini分析、本地分析各有獨立的有界佇列與工作池
+# 每支股票依序流經各段，各段同時處理不同股票：等待Gemini的股票不再佔用抓取名額，
+# 吞吐量由最慢的資源決定，而不是「端到端延遲 × 並行數」
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from job_queue import JobQueue, QueuedJob
+from metrics import REGISTRY
+from tracing import TRACER
+from script_2_improved import analyze_sources, collect_sources
+from script_3_improved import process as improved_content_analysis
+
+logger = logging.getLogger('YourPods_Pipeline')
+
+REGISTRY.describe('pipeline_queue_depth', 'Jobs waiting in each batch pipeline queue.')
+
+# 各段預設工作池大小：抓取受 Firecrawl 並行上限限制，Gemini 受每分鐘請求數限制
+DEFAULT_STAGE_WORKERS = {
+    'stage1': 8,
+    'scrape': 6,
+    'llm': 4,
+    'analysis': 4
+}
+
+# 每支股票抓取時同時送出的 Firecrawl 請求上限 (個股頁、今日新聞、盤中、財報季)
+SCRAPE_CALLS_PER_TICKER = 4
+
+# 各事件迴圈由本模組設定的預設執行緒池: (執行緒池, 執行緒數)
+_executors: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def ensure_executor_threads(threads: int):
+    """
+    確保事件迴圈的預設執行緒池至少有 threads 個執行緒
+
+    同步的SDK呼叫 (Firecrawl、Gemini、yfinance) 都在預設執行緒池中執行；
+    預設大小為 CPU 數 + 4，小於各段工作池總和時，工作池再大也只會在執行緒池前排隊。
+    只在需要更多執行緒時替換，被取代的執行緒池在進行中的呼叫完成後關閉
+    """
+    loop = asyncio.get_event_loop()
+    previous, current = _executors.get(loop, (None, min(32, (os.cpu_count() or 1) + 4)))
+    if threads <= current:
+        return
+
+    # 事件迴圈自行建立的預設執行緒池 (第一次 run_in_executor 時建立) 也一併關閉
+    previous = previous or getattr(loop, '_default_executor', None)
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='yourpods_io')
+    loop.set_default_executor(executor)
+    _executors[loop] = (executor, threads)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    logger.info(f"🧵 預設執行緒池擴充為 {threads} 個執行緒")
+
+
+class PipelineConfig:
+    """流水線各段工作池大小與佇列上限"""
+
+    def __init__(self, stage_workers: Optional[Dict[str, int]] = None, queue_size: Optional[int] = None):
+        """
+        Args:
+            stage_workers: 覆寫各段工作池大小 (預設讀取環境變數 PIPELINE_<段名>_WORKERS)
+            queue_size: 每段佇列上限，上游在佇列滿時等待 (預設讀取 PIPELINE_QUEUE_SIZE)
+        """
+        self.stage_workers = {
+            stage: int(os.getenv(f'PIPELINE_{stage.upper()}_WORKERS', str(default)))
+            for stage, default in DEFAULT_STAGE_WORKERS.items()
+        }
+        for stage, workers in (stage_workers or {}).items():
+            if stage not in DEFAULT_STAGE_WORKERS:
+                raise ValueError(f"未知的流水線段: {stage}")
+            self.stage_workers[stage] = workers
+        if any(workers < 1 for workers in self.stage_workers.values()):
+            raise ValueError(f"每段至少需要1個工作者: {self.stage_workers}")
+
+        self.queue_size = queue_size or int(os.getenv('PIPELINE_QUEUE_SIZE', '16'))
+
+
+class _Job:
+    """一支股票在流水線中的狀態"""
+
+    def __init__(self, index: int, stock_input: str, priority: int = 0,
+                 queued: Optional[QueuedJob] = None, include_analysis: bool = True,
+                 profile: Optional[str] = None):
+        self.index = index
+        self.stock_input = stock_input
+        self.priority = priority
+        self.queued = queued  # 來自持久化佇列時的工作紀錄 (含檢查點)
+        # 單筆工作的選項 (提交時指定，預設依流水線與協調器)
+        self.include_analysis = include_analysis
+        self.profile = profile
+        self.start_time = time.time()
+        self.processing_id = f"yourpods_{int(self.start_time)}"
+        self.trace = TRACER.start_trace('process_stock_request', stock_input=stock_input,
+                                        include_analysis=include_analysis, pipeline=True)
+        self.enqueued_at = time.perf_counter()
+
+        self.stage1_result: Optional[Dict[str, Any]] = None
+        self.collection: Optional[Dict[str, Any]] = None
+        self.stage2_result: Optional[Dict[str, Any]] = None
+        self.stage3_result: Optional[Dict[str, Any]] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.failed = False
+
+    def resume_position(self, stage_names: List[str]) -> int:
+        """依檢查點決定從哪一段開始：有階段2結果時不再重新抓取與呼叫Gemini"""
+        checkpoints = self.queued.checkpoints if self.queued else {}
+        if 'stage2' in checkpoints:
+            self.stage1_result = checkpoints['stage1']
+            self.stage2_result = checkpoints['stage2']
+            return stage_names.index('llm') + 1
+        if 'stage1' in checkpoints:
+            self.stage1_result = checkpoints['stage1']
+            return stage_names.index('scrape')
+        return 0
+
+
+class BatchPipeline:
+    """以協調器的階段函數組成的分段流水線"""
+
+    def __init__(self, orchestrator, config: Optional[PipelineConfig] = None,
+                 include_analysis: bool = True):
+        """
+        Args:
+            orchestrator: YourPodsOrchestrator (共用階段1處理器、回應格式與統計)
+            config: 各段工作池設定
+            include_analysis: 是否包含第三階段的深度分析
+        """
+        self.orchestrator = orchestrator
+        self.config = config or PipelineConfig()
+        self.include_analysis = include_analysis
+
+        self.job_queue: Optional[JobQueue] = None  # run_queue 執行中時寫入檢查點
+        self.stages = [
+            ('stage1', self._run_stage1),
+            ('scrape', self._run_scrape),
+            ('llm', self._run_llm)
+        ]
+        if include_analysis:
+            self.stages.append(('analysis', self._run_analysis))
+
+    async def run(self, stock_inputs: List[str]) -> List[Dict[str, Any]]:
+        """
+        處理整批股票
+
+        Returns:
+            與輸入順序相同的結果列表 (格式同 process_stock_request)
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(stock_inputs)
+
+        async def feed(enqueue: Callable[[_Job, int], Awaitable[None]]):
+            for index, stock_input in enumerate(stock_inputs):
+                await enqueue(_Job(index, stock_input), 0)
+
+        def collect(job: _Job):
+            results[job.index] = job.result
+
+        await self._execute(feed, collect, len(stock_inputs))
+        return results
+
+    async def run_stream(self, stock_inputs: AsyncIterator[str],
+                         emit: Callable[[int, str, Dict[str, Any]], None]) -> Dict[str, int]:
+        """
+        串流處理：邊讀取輸入邊送入流水線，每支股票完成即呼叫 emit (完成順序)
+
+        不保留結果，進行中的工作數受各段佇列上限與工作池大小限制，記憶體用量不隨輸入數量成長
+
+        Args:
+            stock_inputs: 股票輸入的非同步迭代器 (檔案或標準輸入)
+            emit: emit(輸入序號, 股票輸入, 結果)
+
+        Returns:
+            {"total", "success", "error"}
+        """
+        counts = {"total": 0, "success": 0, "error": 0}
+
+        async def feed(enqueue: Callable[[_Job, int], Awaitable[None]]):
+            index = 0
+            async for stock_input in stock_inputs:
+                await enqueue(_Job(index, stock_input), 0)
+                index += 1
+
+        def collect(job: _Job):
+            counts["total"] += 1
+            counts["success" if job.result.get('status') == 'success' else "error"] += 1
+            emit(job.index, job.stock_input, job.result)
+
+        await self._execute(feed, collect)
+        return counts
+
+    async def run_queue(self, job_queue: JobQueue, batch_id: Optional[str] = None,
+                        stop: Optional[asyncio.Event] = None) -> int:
+        """
+        從持久化佇列依優先度取出工作執行，直到沒有待處理的工作
+
+        每支股票的階段1/階段2輸出寫入檢查點，最終結果寫回佇列；
+        開始前先將中斷的工作 (上次崩潰時執行中) 重新排入
+
+        Args:
+            job_queue: 工作佇列
+            batch_id: 只處理此批次 (None 為所有批次，其他批次的高優先度工作也會插隊)
+            stop: 設定後不再取出新工作，已進入流水線的工作照常完成 (服務關閉時的優雅排空)
+
+        Returns:
+            本次完成的工作數
+        """
+        job_queue.requeue_stale()
+        if not job_queue.has_pending(batch_id):
+            # 佇列閒置 (服務輪詢時的常態)：不啟動工作池
+            return 0
+        stage_names = [name for name, _ in self.stages]
+        completed = 0
+
+        async def feed(enqueue: Callable[[_Job, int], Awaitable[None]]):
+            while not (stop and stop.is_set()):
+                queued = job_queue.claim(batch_id)
+                if queued is None:
+                    return
+                job = _Job(queued.position, queued.ticker, queued.priority, queued,
+                           include_analysis=queued.options.get('include_analysis', self.include_analysis),
+                           profile=queued.options.get('profile'))
+                position = job.resume_position(stage_names)
+                if position:
+                    resumed_at = stage_names[position] if position < len(stage_names) else '寫回結果'
+                    logger.info(f"⏩ {queued.ticker} 從檢查點續跑: {resumed_at}")
+                await enqueue(job, position)
+
+        def collect(job: _Job):
+            nonlocal completed
+            job_queue.complete(job.queued.id, job.result)
+            completed += 1
+
+        self.job_queue = job_queue
+        try:
+            await self._execute(feed, collect)
+        finally:
+            self.job_queue = None
+        return completed
+
+    async def _execute(self, feed: Callable[[Callable[[_Job, int], Awaitable[None]]], Awaitable[None]],
+                       collect: Callable[[_Job], None], total: Optional[int] = None):
+        """
+        啟動各段工作池並執行 feed() 送入的工作
+
+        各段佇列依 (優先度, 進入順序) 排序：高優先度的工作在每一段都排到前面
+        """
+        workers_by_stage = self.config.stage_workers
+        ensure_executor_threads(
+            workers_by_stage['stage1'] + workers_by_stage['scrape'] * SCRAPE_CALLS_PER_TICKER
+            + workers_by_stage['llm'] + workers_by_stage['analysis']
+        )
+        queues = [asyncio.PriorityQueue(maxsize=self.config.queue_size) for _ in self.stages]
+        sequence = itertools.count()
+
+        async def enqueue(job: _Job, position: int):
+            job.enqueued_at = time.perf_counter()
+            if position >= len(self.stages):
+                # 所有階段都已有檢查點 (例如只差寫回最終結果)
+                collect_finished(job)
+                return
+            await queues[position].put((-job.priority, next(sequence), job))
+
+        def collect_finished(job: _Job):
+            self._finish(job)
+            try:
+                collect(job)
+            except Exception as e:
+                logger.error(f"❌ 結果寫回失敗: {job.stock_input} - {str(e)}")
+
+        async def worker(position: int):
+            name, handler = self.stages[position]
+            queue = queues[position]
+            while True:
+                _, _, job = await queue.get()
+                if job is None:
+                    return
+                REGISTRY.observe('queue_wait_seconds', time.perf_counter() - job.enqueued_at,
+                                 queue=f'pipeline_{name}')
+                REGISTRY.set_gauge('pipeline_queue_depth', queue.qsize(), stage=name)
+
+                try:
+                    with TRACER.activate(job.trace.root):
+                        finished = await handler(job)
+                except Exception as e:
+                    logger.error(f"❌ [YourPods] 流水線 {name} 失敗: {job.stock_input} - {str(e)}")
+                    self._fail(job, str(e), count_in_stats=True)
+                    finished = True
+
+                if finished or position == len(self.stages) - 1:
+                    collect_finished(job)
+                else:
+                    await enqueue(job, position + 1)
+
+        workers = [
+            [asyncio.ensure_future(worker(position)) for _ in range(self.config.stage_workers[name])]
+            for position, (name, _) in enumerate(self.stages)
+        ]
+        logger.info(f"🏭 流水線批次啟動: {total if total is not None else '佇列中的'} 支股票，工作池 "
+                   + ", ".join(f"{name}={self.config.stage_workers[name]}" for name, _ in self.stages))
+
+        try:
+            # 佇列有上限：上游段在下游滿載時自然等待，記憶體中只保留有限的進行中工作
+            await feed(enqueue)
+
+            # 依序關閉：上一段的工作者全部結束後才對下一段送出結束訊號 (排在所有工作之後)
+            for position, stage_workers in enumerate(workers):
+                for _ in stage_workers:
+                    await queues[position].put((float('inf'), next(sequence), None))
+                await asyncio.gather(*stage_workers)
+        except BaseException:
+            for stage_workers in workers:
+                for task in stage_workers:
+                    task.cancel()
+            raise
+
+    # === 各段處理 (回傳 True 表示此股票已結束，不再送往下一段) ===
+
+    async def _run_stage1(self, job: _Job) -> bool:
+        with REGISTRY.timer('stage_seconds', stage='stage1'), TRACER.span('stage1'):
+            job.stage1_result = await self.orchestrator._execute_stage1(job.stock_input)
+
+        if job.stage1_result["status"] != "valid":
+            self._fail(job, f"階段1失敗: {job.stage1_result.get('error_message', '未知錯誤')}")
+            return True
+        self._checkpoint(job, 'stage1', job.stage1_result)
+        return False
+
+    def _single_shot(self, job: _Job) -> bool:
+        """階段2是否一併產生投資觀點 (只有需要階段3時才有意義)"""
+        return self.orchestrator.single_shot and self.include_analysis and job.include_analysis
+
+    async def _run_scrape(self, job: _Job) -> bool:
+        with REGISTRY.timer('stage_seconds', stage='stage2_scrape'), TRACER.span('stage2_scrape'):
+            job.collection = await collect_sources(job.stage1_result, self._single_shot(job))
+
+        # 快取命中或失敗時直接得到階段2結果，跳過Gemini段
+        if 'result' in job.collection:
+            job.stage2_result = job.collection.pop('result')
+            return self._stage2_failed(job)
+        return False
+
+    async def _run_llm(self, job: _Job) -> bool:
+        if job.stage2_result is None:
+            with REGISTRY.timer('stage_seconds', stage='stage2_llm'), TRACER.span('stage2_llm') as span:
+                job.stage2_result = await analyze_sources(job.collection,
+                                                          include_investment_view=self._single_shot(job))
+                span.set_attributes(
+                    data_sources=job.stage2_result.get('collection_metadata', {}).get('data_sources', 0),
+                    content_bytes=job.stage2_result.get('collection_metadata', {}).get('total_content_length', 0)
+                )
+            job.collection = None  # 頁面內容已整合進結果，釋放記憶體
+        if self._stage2_failed(job):
+            return True
+        self._checkpoint(job, 'stage2', job.stage2_result)
+        return False
+
+    async def _run_analysis(self, job: _Job) -> bool:
+        if not job.include_analysis:
+            return False
+        with REGISTRY.timer('stage_seconds', stage='stage3'), TRACER.span('stage3'):
+            job.stage3_result = await improved_content_analysis(job.stage2_result, self._single_shot(job))
+
+        if job.stage3_result["status"] != "success":
+            logger.warning(f"⚠️ {job.stock_input} 階段3分析失敗，但繼續處理")
+        return False
+
+    # === 內部函數 ===
+
+    def _checkpoint(self, job: _Job, stage: str, payload: Dict[str, Any]):
+        """持久化佇列模式下保存階段輸出，續跑時不再重做"""
+        if self.job_queue is not None and job.queued is not None:
+            self.job_queue.checkpoint(job.queued.id, stage, payload)
+
+    def _stage2_failed(self, job: _Job) -> bool:
+        if job.stage2_result["status"] != "success":
+            self._fail(job, f"階段2失敗: {job.stage2_result.get('error_message', '資訊收集失敗')}")
+            return True
+        return False
+
+    def _fail(self, job: _Job, error_message: str, count_in_stats: bool = False):
+        """記錄錯誤結果 (例外才計入失敗統計，與 process_stock_request 相同)"""
+        job.failed = True
+        job.result = self.orchestrator._create_error_response(
+            job.processing_id, job.stock_input, error_message, job.start_time
+        )
+        if count_in_stats:
+            self.orchestrator._update_stats(False, time.time() - job.start_time)
+
+    def _finish(self, job: _Job) -> Dict[str, Any]:
+        """組成最終結果並結束此股票的 trace"""
+
+        if not job.failed:
+            processing_time = time.time() - job.start_time
+            job.result = self.orchestrator._create_success_response(
+                job.processing_id, job.stock_input, job.stage1_result,
+                job.stage2_result, job.stage3_result, processing_time, job.profile
+            )
+            self.orchestrator._update_stats(True, processing_time, job.stage2_result)
+            logger.info(f"✅ [YourPods] 處理完成: {job.stock_input} (耗時: {processing_time:.1f}秒)")
+
+        job.trace.root.set_attribute('status', job.result.get('status', 'unknown'))
+        TRACER.finish_trace(job.trace)
+        return self.orchestrator._attach_trace(job.result, job.trace)
@@ -0,0 +1,207 @@
+# 自適應 Firecrawl 抓取參數 - 依URL模板學習最小 waitFor
+# 比較短等待與長等待的抽取結果，確認內容等價後才降低等待時間
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from serialization import dumps_bytes, loads
+
+logger = logging.getLogger('YourPods_ScrapeTuning')
+
+# 候選等待時間 (毫秒)，由短到長
+DEFAULT_WAIT_CANDIDATES = [0, 500, 1000, 2000]
+
+
+def url_template(url: str, ticker: str) -> str:
+    """將URL中的股票代碼替換為 {ticker}，得到可共用學習結果的模板"""
+    if not ticker:
+        return url
+    pattern = re.compile(r'(?<=/)' + re.escape(ticker) + r'(?=/|$|\.)', re.IGNORECASE)
+    return pattern.sub('{ticker}', url)
+
+
+def content_signature(relevant_content: str, rhea_ai_data: Dict[str, Any]) -> Dict[str, Any]:
+    """建立抽取結果的簽名：段落雜湊集合 + 找到的Rhea-AI欄位"""
+    paragraphs = [p.strip() for p in (relevant_content or '').split('\n\n') if p.strip()]
+    return {
+        "paragraphs": sorted({hashlib.sha1(p.encode('utf-8')).hexdigest()[:16] for p in paragraphs}),
+        "rhea_fields": sorted(k for k, v in (rhea_ai_data or {}).items() if v)
+    }
+
+
+def signatures_equivalent(short: Dict[str, Any], long: Dict[str, Any],
+                          min_overlap: float = 0.9) -> bool:
+    """判斷短等待的抽取結果是否與長等待等價"""
+    # Rhea-AI 區塊由動態內容載入，少任何一個欄位都視為不等價
+    if set(long["rhea_fields"]) - set(short["rhea_fields"]):
+        return False
+
+    long_paragraphs = set(long["paragraphs"])
+    if not long_paragraphs:
+        return True
+
+    overlap = len(long_paragraphs & set(short["paragraphs"])) / len(long_paragraphs)
+    return overlap >= min_overlap
+
+
+class ScrapeParameterTuner:
+    """依URL模板學習 Firecrawl 的最小 waitFor，並持久化學習結果"""
+
+    def __init__(self, state_path: str, default_wait_ms: int = 2000,
+                 candidates: Optional[List[int]] = None,
+                 confirmations: int = 3, probe_interval: int = 10,
+                 retry_after_hours: float = 24.0, save_interval: float = 60.0):
+        """
+        Args:
+            state_path: 學習結果的JSON檔案路徑
+            default_wait_ms: 尚未學習時使用的等待時間
+            candidates: 候選等待時間 (毫秒)
+            confirmations: 降低等待前需要連續確認等價的次數
+            probe_interval: 已收斂後每隔幾次抓取重新驗證一次
+            retry_after_hours: 候選值被判定不等價後，多久之後再重新嘗試
+            save_interval: 抓取耗時與抓取次數至少間隔多少秒才寫回 (比較結果立即寫回)
+        """
+        self.state_path = state_path
+        self.default_wait_ms = default_wait_ms
+        self.candidates = sorted(set((candidates or DEFAULT_WAIT_CANDIDATES) + [default_wait_ms]))
+        self.confirmations = confirmations
+        self.probe_interval = probe_interval
+        self.retry_after_seconds = retry_after_hours * 3600
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self.templates: Dict[str, Dict[str, Any]] = self._load_state()
+
+    def plan(self, url: str, ticker: str) -> Tuple[str, int, Optional[int]]:
+        """
+        決定此次抓取的參數
+
+        Returns:
+            (URL模板, 此次使用的 waitFor, 需要同時抓取比較的另一個 waitFor 或 None)
+        """
+        template = url_template(url, ticker)
+
+        with self._lock:
+            state = self._template_state(template)
+            state["scrapes"] += 1
+            wait_ms = state["wait_ms"]
+
+            # 學習階段：與下一個較短的候選值比較
+            compare_wait = self._next_probe_candidate(state)
+
+            # 已收斂的模板只在固定間隔與預設等待重新驗證，避免每次都多付一次抓取成本
+            if (compare_wait is None and wait_ms < self.default_wait_ms
+                    and state["scrapes"] % self.probe_interval == 0):
+                compare_wait = self.default_wait_ms
+
+        return template, wait_ms, compare_wait
+
+    def record_comparison(self, template: str, short_wait: int, long_wait: int, equivalent: bool):
+        """記錄一次短/長等待的比較結果，必要時調整該模板的等待時間"""
+
+        with self._lock:
+            state = self._template_state(template)
+            stats = state["probes"].setdefault(str(short_wait), {
+                "equivalent": 0, "different": 0, "last_different": 0.0
+            })
+
+            if equivalent:
+                stats["equivalent"] += 1
+                if short_wait < state["wait_ms"] and stats["equivalent"] >= self.confirmations:
+                    logger.info(f"⏱️ {template} waitFor 降低: {state['wait_ms']}ms → {short_wait}ms")
+                    state["wait_ms"] = short_wait
+            else:
+                stats["equivalent"] = 0
+                stats["different"] += 1
+                stats["last_different"] = time.time()
+                # 已採用的等待值被證實不足時，回退到下一個較長的候選值
+                if short_wait >= state["wait_ms"]:
+                    raised = min(self._higher_candidate(short_wait), long_wait)
+                    logger.info(f"⏱️ {template} waitFor 回升: {state['wait_ms']}ms → {raised}ms")
+                    state["wait_ms"] = raised
+
+            self._save_state()
+
+    def record_scrape_time(self, template: str, elapsed_seconds: float):
+        """記錄抓取耗時 (指數移動平均)，依 save_interval 與其他學習狀態一併寫回，下次執行沿用"""
+        with self._lock:
+            state = self._template_state(template)
+            previous = state.get("avg_scrape_seconds")
+            state["avg_scrape_seconds"] = round(
+                elapsed_seconds if previous is None else previous * 0.8 + elapsed_seconds * 0.2, 3
+            )
+            if time.time() - self._last_save >= self.save_interval:
+                self._save_state()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """學習狀態摘要"""
+        with self._lock:
+            return {
+                template: {
+                    "wait_ms": state["wait_ms"],
+                    "scrapes": state["scrapes"],
+                    "avg_scrape_seconds": state.get("avg_scrape_seconds")
+                }
+                for template, state in self.templates.items()
+            }
+
+    # === 內部函數 ===
+
+    def _template_state(self, template: str) -> Dict[str, Any]:
+        if template not in self.templates:
+            self.templates[template] = {
+                "wait_ms": self.default_wait_ms,
+                "scrapes": 0,
+                "probes": {}
+            }
+        return self.templates[template]
+
+    def _next_probe_candidate(self, state: Dict[str, Any]) -> Optional[int]:
+        """找出下一個值得探測的較短等待時間"""
+        candidate = self._lower_candidate(state["wait_ms"])
+        if candidate is None:
+            return None
+
+        stats = state["probes"].get(str(candidate))
+        if not stats:
+            return candidate
+
+        # 最近被判定不等價的候選值暫不重試
+        if stats["last_different"] and time.time() - stats["last_different"] < self.retry_after_seconds:
+            return None
+
+        return candidate
+
+    def _lower_candidate(self, wait_ms: int) -> Optional[int]:
+        lower = [c for c in self.candidates if c < wait_ms]
+        return lower[-1] if lower else None
+
+    def _higher_candidate(self, wait_ms: int) -> int:
+        higher = [c for c in self.candidates if c > wait_ms]
+        return higher[0] if higher else self.candidates[-1]
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'rb') as f:
+                return loads(f.read()).get("templates", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 無法載入抓取參數學習狀態: {str(e)}")
+            return {}
+
+    def _save_state(self):
+        self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(dumps_bytes({"templates": self.templates}, indent=True))
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.warning(f"⚠️ 無法儲存抓取參數學習狀態: {str(e)}")
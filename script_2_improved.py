@@ -2,33 +2,118 @@
 # 替代原本的 Perplexity API 實現
 
 import asyncio
+import contextvars
+import functools
 import json
 import logging
 import re
 import time
 import os
-from typing import Dict, List, Any, Optional
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from dataclasses import dataclass
 
 # Required packages:
-# pip install aiohttp firecrawl-py google-generativeai python-dotenv
+# pip install firecrawl-py google-generativeai python-dotenv
+# (SDK 延遲到第一次呼叫 Firecrawl/Gemini 時才匯入，見 bootstrap.py)
 
-import aiohttp
-import google.generativeai as genai
-from firecrawl import FirecrawlApp
-from dotenv import load_dotenv
+import bootstrap
 
-# 載入環境變數
-load_dotenv()
+# 載入環境變數 (每個行程一次；必須在匯入其他專案模組之前，serialization、tracing 在匯入時讀取環境變數)
+bootstrap.load_environment()
 
-# 配置日誌
-logging.basicConfig(
-    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from analysis_schema import parse_structured_analysis, render_analysis_text, stage2_response_schema
+from article_tracker import ArticleTracker, split_articles
+from cpu_pool import get_cpu_pool
+from llm_cache import get_llm_cache
+from metrics import REGISTRY
+from tracing import TRACER
+from paragraph_ranker import rank_paragraphs
+from scrape_tuning import ScrapeParameterTuner, content_signature, signatures_equivalent
+from source_table import build_source_table, empty_source_table
+from text_utils import ParagraphDeduplicator, estimate_tokens, normalize_text
+
+# 配置日誌 (每個行程一次)
+bootstrap.configure_logging()
 logger = logging.getLogger('YourPods_InformationGathering')
 
+# Rhea-AI 區塊的擷取規則
+RHEA_AI_PATTERNS = {
+    "summary": re.compile(r"Rhea-AI Summary[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)", re.DOTALL | re.IGNORECASE),
+    "sentiment": re.compile(r"Rhea-AI Sentiment[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)", re.DOTALL | re.IGNORECASE),
+    "impact": re.compile(r"Rhea-AI Impact[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)", re.DOTALL | re.IGNORECASE),
+    "end_of_day": re.compile(r"End-of-Day[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)", re.DOTALL | re.IGNORECASE)
+}
+RHEA_AI_TAGS_PATTERN = re.compile(r"Tags[:\s]*(.*?)(?=\n\n|$)", re.DOTALL | re.IGNORECASE)
+
+
+# === 頁面抽取 (模組層級純函數，可在 CPU 行程池的工作行程中執行) ===
+
+def extract_relevant_content(content: str, ticker: str, company_name: str = '', industry: str = '',
+                             top_k: int = 12, char_budget: int = 6000) -> str:
+    """智能提取與股票相關的內容 (BM25 段落排序，取預算內最相關的段落)"""
+    
+    if not content:
+        return ""
+    
+    # 分割內容為段落，建立一次頁面索引並依代碼/公司/行業評分
+    paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
+    selected = rank_paragraphs(
+        paragraphs, ticker, company_name, industry,
+        top_k=top_k,
+        char_budget=char_budget
+    )
+    relevant_paragraphs = [paragraphs[i] for i, _ in selected]
+    
+    result = '\n\n'.join(relevant_paragraphs)
+    logger.info(f"📝 為 {ticker} 智能提取了 {len(relevant_paragraphs)}/{len(paragraphs)} 個專業段落")
+    
+    return result
+
+
+def extract_rhea_ai_analysis(content: str) -> Dict[str, Any]:
+    """提取 StockTitan 的 Rhea-AI 專業分析數據"""
+    
+    rhea_analysis = {
+        "summary": "",
+        "sentiment": "",
+        "impact": "",
+        "end_of_day": "",
+        "tags": []
+    }
+    
+    for key, pattern in RHEA_AI_PATTERNS.items():
+        match = pattern.search(content)
+        if match:
+            rhea_analysis[key] = match.group(1).strip()
+    
+    # 提取標籤
+    tags_match = RHEA_AI_TAGS_PATTERN.search(content)
+    if tags_match:
+        tags_text = tags_match.group(1).strip()
+        rhea_analysis["tags"] = [tag.strip() for tag in tags_text.split() if tag.strip()]
+    
+    # 記錄找到的專業AI數據
+    found_data = [k for k, v in rhea_analysis.items() if v and k != 'tags']
+    if found_data:
+        logger.info(f"🤖 找到Rhea-AI專業分析: {', '.join(found_data)}")
+    
+    return rhea_analysis
+
+
+def extract_page_content(content: str, ticker: str, company_name: str, industry: str,
+                         top_k: int, char_budget: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    單頁抽取：相關段落 + Rhea-AI 數據 (沒有相關段落時不擷取Rhea-AI)
+    
+    Returns:
+        (相關內容, Rhea-AI數據)
+    """
+    relevant_content = extract_relevant_content(content, ticker, company_name, industry, top_k, char_budget)
+    rhea_ai_data = extract_rhea_ai_analysis(content) if relevant_content else {}
+    return relevant_content, rhea_ai_data
+
 @dataclass
 class YourPodsConfig:
     """YourPods 專案配置 - 安全的API管理"""
@@ -49,9 +134,28 @@ class YourPodsConfig:
         # YourPods 系統配置
         self.stocktitan_base = "https://www.stocktitan.net"
         self.cache_duration_hours = int(os.getenv('CACHE_DURATION_HOURS', '2'))
+        self.result_cache_max_entries = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '256'))
         self.max_content_length = int(os.getenv('MAX_CONTENT_LENGTH', '30000'))
+        
+        # 段落相關性排序 (BM25)：每頁保留的段落數與字數預算
+        self.relevant_top_k = int(os.getenv('RELEVANT_TOP_K', '12'))
+        self.relevant_char_budget = int(os.getenv('RELEVANT_CHAR_BUDGET', '6000'))
         self.request_timeout = int(os.getenv('REQUEST_TIMEOUT', '15000'))
         
+        # 本地狀態目錄 (學習結果、持久化快取)
+        self.cache_dir = os.getenv('YOURPODS_CACHE_DIR', '.yourpods_cache')
+        
+        # Firecrawl waitFor：預設值與依URL模板自動學習
+        self.firecrawl_wait_ms = int(os.getenv('FIRECRAWL_WAIT_MS', '2000'))
+        self.adaptive_wait_enabled = os.getenv('ADAPTIVE_WAIT_ENABLED', 'true').lower() == 'true'
+        
+        # 文章層級增量擷取：只處理新文章，搭配滾動摘要
+        self.incremental_ingestion = os.getenv('INCREMENTAL_INGESTION', 'true').lower() == 'true'
+        self.rolling_summary_hours = float(os.getenv('ROLLING_SUMMARY_HOURS', '24'))
+        
+        # Gemini 以 JSON schema 輸出結構化分析 (階段3直接讀取欄位)
+        self.structured_analysis = os.getenv('STRUCTURED_ANALYSIS_ENABLED', 'true').lower() == 'true'
+        
         # 成本控制
         self.daily_api_limit = int(os.getenv('DAILY_API_LIMIT', '100'))
         self.hourly_api_limit = int(os.getenv('HOURLY_API_LIMIT', '20'))
@@ -65,15 +169,24 @@ class ImprovedInformationGatherer:
         # 載入配置
         self.config = YourPodsConfig()
         
-        # 初始化服務
-        self.firecrawl = FirecrawlApp(api_key=self.config.firecrawl_api_key)
+        # 初始化服務 (Firecrawl 與 Gemini 客戶端在第一次使用時建立)
+        self._firecrawl = None
+        self.scrape_tuner = ScrapeParameterTuner(
+            state_path=os.path.join(self.config.cache_dir, 'scrape_tuning.json'),
+            default_wait_ms=self.config.firecrawl_wait_ms
+        ) if self.config.adaptive_wait_enabled else None
+        self.article_tracker = ArticleTracker(
+            state_path=os.path.join(self.config.cache_dir, 'article_state.sqlite3'),
+            summary_ttl_hours=self.config.rolling_summary_hours
+        ) if self.config.incremental_ingestion else None
         
         # 配置Gemini
-        genai.configure(api_key=self.config.gemini_api_key)
-        self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        self.gemini_model_name = 'gemini-2.0-flash-exp'
+        self._gemini_model = None
+        self.llm_cache = get_llm_cache()
         
-        # 快取和使用量追蹤
-        self.cache = {}
+        # 快取和使用量追蹤 (結果快取依寫入順序淘汰，大批次時記憶體不隨股票數成長)
+        self.cache: OrderedDict = OrderedDict()
         self.api_usage_tracker = {
             'daily_calls': 0,
             'hourly_calls': 0,
@@ -82,17 +195,63 @@ class ImprovedInformationGatherer:
         }
         
         logger.info("🚀 YourPods 改良版資訊收集器初始化完成")
-    
-    async def process(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+
+    @property
+    def firecrawl(self):
+        """Firecrawl 客戶端 (第一次抓取時匯入SDK並建立)"""
+        if self._firecrawl is None:
+            self._firecrawl = bootstrap.firecrawl_app(self.config.firecrawl_api_key)
+        return self._firecrawl
+
+    @firecrawl.setter
+    def firecrawl(self, client):
+        self._firecrawl = client
+
+    @property
+    def gemini_model(self):
+        """Gemini 模型 (第一次分析時匯入SDK並建立)"""
+        if self._gemini_model is None:
+            genai = bootstrap.genai()
+            genai.configure(api_key=self.config.gemini_api_key)
+            self._gemini_model = genai.GenerativeModel(self.gemini_model_name)
+        return self._gemini_model
+
+    @gemini_model.setter
+    def gemini_model(self, model):
+        self._gemini_model = model
+
+    async def process(self, stock_data: Dict[str, Any],
+                      include_investment_view: bool = False) -> Dict[str, Any]:
         """
         主要處理函數 - 與原本 script_2.py 完全相容
         
         Args:
             stock_data: 來自 script_1.py 的股票資料
+            include_investment_view: 單次呼叫模式 - 同一次Gemini呼叫一併產生投資觀點，
+                                     階段3不再另外呼叫Gemini增強
             
         Returns:
             與原本 script_2.py 相同格式的結果，但使用 StockTitan + Gemini
         """
+        collection = await self.collect_sources(stock_data, include_investment_view)
+        if 'result' in collection:
+            return collection['result']
+        return await self.analyze_sources(collection, include_investment_view)
+    
+    async def collect_sources(self, stock_data: Dict[str, Any],
+                              include_investment_view: bool = False) -> Dict[str, Any]:
+        """
+        抓取階段：API限制、快取、StockTitan與備用來源 (不呼叫Gemini)
+        
+        流水線批次引擎以獨立的工作池分別執行抓取與Gemini分析
+        
+        Args:
+            stock_data: 來自階段1的股票資料
+            include_investment_view: 單次呼叫模式 (結果快取依模式分開，兩種結果的內容不同)
+        
+        Returns:
+            交給 analyze_sources 的抓取結果；快取命中或失敗時只含 "result" (最終結果)
+        """
         ticker = stock_data['standardized_ticker']
         company_name = stock_data.get('company_name', '')
         industry = stock_data.get('industry', '')
@@ -102,33 +261,72 @@ class ImprovedInformationGatherer:
         try:
             # 1. 檢查API使用限制
             if not self._check_api_limits():
-                return self._create_error_response(ticker, "API使用量已達到每日/每小時限制")
+                return {"result": self._create_error_response(ticker, "API使用量已達到每日/每小時限制")}
             
             # 2. 檢查快取
-            cached_result = self._check_cache(ticker)
+            cached_result = self._check_cache(ticker, include_investment_view)
+            REGISTRY.inc('cache_requests', cache='stage2_result', result='hit' if cached_result else 'miss')
             if cached_result:
                 logger.info(f"📋 使用快取資料: {ticker}")
-                return cached_result
+                return {"result": cached_result}
             
-            # 3. 抓取 StockTitan 專業資料
+            # 3. 抓取 StockTitan 專業資料 (增量模式下只包含新文章)
             stocktitan_data = await self._fetch_professional_data(ticker, company_name, industry)
+            rolling_summary = self.article_tracker.get_summary(ticker) if self.article_tracker else None
             
             # 4. 品質檢查，必要時補充備用來源
-            if not self._is_data_sufficient(stocktitan_data):
+            with TRACER.span('sufficiency_evaluation', sources=len(stocktitan_data)) as span:
+                sufficient = self._is_data_sufficient(stocktitan_data, rolling_summary)
+                span.set_attribute('sufficient', sufficient)
+            
+            if not sufficient:
                 logger.info(f"📡 資料不足，啟用備用來源...")
-                backup_data = await self._fetch_backup_sources(ticker)
+                backup_data = await self._fetch_backup_sources(ticker, company_name, industry)
                 stocktitan_data.extend(backup_data)
             
+            return {
+                "ticker": ticker,
+                "industry": industry,
+                "sources": stocktitan_data,
+                "rolling_summary": rolling_summary
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ {ticker} 資訊收集失敗: {str(e)}")
+            return {"result": self._create_error_response(ticker, str(e))}
+    
+    async def analyze_sources(self, collection: Dict[str, Any],
+                              include_investment_view: bool = False) -> Dict[str, Any]:
+        """
+        分析階段：以 collect_sources 的抓取結果呼叫Gemini並輸出相容格式
+        
+        Args:
+            collection: collect_sources 的回傳值 (不含 "result")
+            include_investment_view: 單次呼叫模式 (見 process)
+        """
+        ticker = collection['ticker']
+        stocktitan_data = collection['sources']
+        rolling_summary = collection.get('rolling_summary')
+        
+        try:
             # 5. 使用 Gemini 2.5 Pro 進行專業分析
-            gemini_analysis = await self._analyze_with_gemini_pro(ticker, stocktitan_data, industry)
+            gemini_analysis = await self._analyze_with_gemini_pro(ticker, stocktitan_data, collection['industry'],
+                                                                  rolling_summary, include_investment_view)
             
             # 6. 結構化輸出 (與原本 script_2.py 格式完全相容)
-            result = self._format_compatible_result(ticker, stocktitan_data, gemini_analysis)
+            with REGISTRY.timer('parse_seconds', step='format_result'):
+                result = self._format_compatible_result(ticker, stocktitan_data, gemini_analysis)
             
             # 7. 更新快取和使用量
-            self._update_cache(ticker, result)
+            self._update_cache(ticker, include_investment_view, result)
             self._update_api_usage()
             
+            # 8. 分析成功後才記錄已處理文章，失敗時下次刷新會重新處理
+            if (self.article_tracker and gemini_analysis.get('success')
+                    and not gemini_analysis.get('reused_summary')):
+                new_ids = [aid for source in stocktitan_data for aid in source.get('new_article_ids', [])]
+                self.article_tracker.commit(ticker, new_ids, gemini_analysis['professional_analysis'])
+            
             logger.info(f"✅ {ticker} 專業資訊收集完成 - 來源數: {len(stocktitan_data)}")
             return result
             
@@ -153,48 +351,83 @@ class ImprovedInformationGatherer:
             primary_urls.append(f"{self.config.stocktitan_base}/news/earnings.html")
         
         # 並行抓取所有來源
-        tasks = [self._scrape_stocktitan_url(url, ticker) for url in primary_urls]
+        tasks = [self._scrape_stocktitan_url(url, ticker, company_name, industry) for url in primary_urls]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # 過濾和整理成功結果
         successful_results = []
+        unchanged = 0
         for i, result in enumerate(results):
             if isinstance(result, Exception):
                 logger.warning(f"⚠️ URL {primary_urls[i]} 抓取失敗: {str(result)}")
             elif result and result.get('success'):
                 successful_results.append(result)
+            elif result and result.get('unchanged'):
+                unchanged += 1
         
-        logger.info(f"📊 成功抓取 {len(successful_results)}/{len(primary_urls)} 個StockTitan來源")
+        logger.info(f"📊 成功抓取 {len(successful_results)}/{len(primary_urls)} 個StockTitan來源"
+                   + (f" ({unchanged}個無新文章)" if unchanged else ""))
         return successful_results
     
-    async def _scrape_stocktitan_url(self, url: str, ticker: str) -> Dict[str, Any]:
+    async def _scrape_stocktitan_url(self, url: str, ticker: str,
+                                     company_name: str = '', industry: str = '') -> Dict[str, Any]:
         """抓取單個 StockTitan URL"""
         
+        with TRACER.span('stocktitan_scrape', url=url) as span:
+            result = await self._scrape_and_extract(url, ticker, company_name, industry)
+            span.set_attributes(
+                success=bool(result.get('success')),
+                bytes=len(result.get('raw_content', '')),
+                relevant_bytes=len(result.get('relevant_content', '')),
+                wait_ms=result.get('wait_ms', 0),
+                new_articles=len(result.get('new_article_ids', []))
+            )
+            return result
+    
+    async def _scrape_and_extract(self, url: str, ticker: str,
+                                  company_name: str, industry: str) -> Dict[str, Any]:
+        """抓取並抽取單個 StockTitan 頁面"""
+        
         try:
             logger.info(f"🌐 抓取專業財經來源: {url}")
             
-            # 使用 Firecrawl 進行專業網頁抓取
-            result = self.firecrawl.scrape_url(
-                url=url,
-                params={
-                    'formats': ['markdown'],
-                    'onlyMainContent': True,
-                    'removeBase64Images': True,
-                    'timeout': self.config.request_timeout,
-                    'waitFor': 2000  # 等待動態內容載入
-                }
-            )
+            # 依URL模板決定 waitFor，學習中的模板會同時抓取另一個等待值做比較
+            template, wait_ms, compare_wait = url, self.config.firecrawl_wait_ms, None
+            if self.scrape_tuner:
+                template, wait_ms, compare_wait = self.scrape_tuner.plan(url, ticker)
+            
+            if compare_wait is None:
+                result = await self._firecrawl_scrape(url, wait_ms)
+            else:
+                result = await self._scrape_with_comparison(url, ticker, template, wait_ms, compare_wait,
+                                                            company_name, industry)
+            
+            if self.scrape_tuner and 'elapsed_seconds' in result:
+                self.scrape_tuner.record_scrape_time(template, result['elapsed_seconds'])
             
             if result.get('success'):
                 content = result.get('markdown', '')
                 
-                # 智能提取與目標股票相關的內容
-                relevant_content = self._extract_intelligent_content(content, ticker)
+                # 增量模式：切分文章，只把新文章送入抽取
+                article_info = {}
+                if self.article_tracker:
+                    articles = split_articles(content)
+                    fresh = self.article_tracker.new_articles(ticker, articles)
+                    if not fresh:
+                        logger.info(f"📭 {url} 自上次刷新後沒有新文章")
+                        return {'url': url, 'success': False, 'unchanged': True,
+                                'reason': 'No new articles since last refresh'}
+                    
+                    content = '\n\n'.join(article['text'] for article in fresh)
+                    article_info = {
+                        'new_article_ids': [article['id'] for article in fresh],
+                        'total_articles': len(articles)
+                    }
+                
+                # 智能提取與目標股票相關的內容，並提取 StockTitan 的 Rhea-AI 專業分析數據
+                relevant_content, rhea_ai_data = await self._extract_page(content, ticker, company_name, industry)
                 
                 if relevant_content:
-                    # 提取 StockTitan 的 Rhea-AI 專業分析數據
-                    rhea_ai_data = self._extract_rhea_ai_analysis(content)
-                    
                     return {
                         'url': url,
                         'source': 'StockTitan_Professional',
@@ -203,7 +436,9 @@ class ImprovedInformationGatherer:
                         'rhea_ai_analysis': rhea_ai_data,
                         'timestamp': datetime.now().isoformat(),
                         'success': True,
-                        'quality_score': self._calculate_content_quality(relevant_content, rhea_ai_data)
+                        'quality_score': self._calculate_content_quality(relevant_content, rhea_ai_data),
+                        'wait_ms': result.get('wait_ms', wait_ms),
+                        **article_info
                     }
                 else:
                     logger.info(f"📭 {url} 沒有找到 {ticker} 的相關專業內容")
@@ -215,86 +450,98 @@ class ImprovedInformationGatherer:
             logger.error(f"❌ 抓取 {url} 失敗: {str(e)}")
             return {'url': url, 'success': False, 'error': str(e)}
     
-    def _extract_intelligent_content(self, content: str, ticker: str) -> str:
-        """智能提取與股票相關的內容"""
-        
-        if not content:
-            return ""
-        
-        # 分割內容為段落和句子
-        paragraphs = content.split('\n\n')
-        relevant_paragraphs = []
-        
-        # 多層次搜索模式
-        primary_patterns = [
-            ticker.upper(),
-            ticker.lower(),
-            f"({ticker})",
-            f"NYSE: {ticker}",
-            f"NASDAQ: {ticker}",
-            f"${ticker}"
-        ]
-        
-        # 財經相關關鍵字
-        financial_keywords = [
-            'earnings', 'revenue', 'profit', 'guidance', 'analyst',
-            'rating', 'target', 'price', 'volume', 'trading',
-            'quarterly', 'annual', 'financial', 'results'
-        ]
+    async def _firecrawl_scrape(self, url: str, wait_ms: int) -> Dict[str, Any]:
+        """以指定的 waitFor 呼叫 Firecrawl (在執行緒中執行，避免阻塞事件迴圈)"""
+        
+        params = {
+            'formats': ['markdown'],
+            'onlyMainContent': True,
+            'removeBase64Images': True,
+            'timeout': self.config.request_timeout
+        }
+        if wait_ms > 0:
+            params['waitFor'] = wait_ms  # 等待動態內容載入
+        
+        start = time.time()
+        loop = asyncio.get_event_loop()
+        with REGISTRY.timer('provider_seconds', provider='firecrawl', call='stocktitan'):
+            result = await loop.run_in_executor(
+                None, functools.partial(self.firecrawl.scrape_url, url=url, params=params)
+            )
         
-        for paragraph in paragraphs:
-            # 檢查是否包含目標股票
-            contains_ticker = any(pattern in paragraph for pattern in primary_patterns)
-            
-            # 檢查是否包含財經關鍵字
-            contains_financial = any(keyword in paragraph.lower() for keyword in financial_keywords)
-            
-            if contains_ticker or (contains_financial and len(paragraph) > 100):
-                relevant_paragraphs.append(paragraph.strip())
+        result = dict(result or {})
+        result['wait_ms'] = wait_ms
+        result['elapsed_seconds'] = time.time() - start
+        return result
+    
+    async def _scrape_with_comparison(self, url: str, ticker: str, template: str,
+                                      wait_ms: int, compare_wait: int,
+                                      company_name: str = '', industry: str = '') -> Dict[str, Any]:
+        """
+        同時以兩個 waitFor 抓取，比較抽取結果並回報給學習器，回傳較長等待的結果
+
+        比較時的抽取查詢 (代碼、公司名稱、行業) 與實際抽取相同，等價判斷才反映實際輸出
+        """
         
-        result = '\n\n'.join(relevant_paragraphs)
-        logger.info(f"📝 為 {ticker} 智能提取了 {len(relevant_paragraphs)} 個專業段落")
+        short_wait, long_wait = sorted([wait_ms, compare_wait])
+        short_result, long_result = await asyncio.gather(
+            self._firecrawl_scrape(url, short_wait),
+            self._firecrawl_scrape(url, long_wait),
+            return_exceptions=True
+        )
+        
+        if isinstance(long_result, Exception) or not long_result.get('success'):
+            # 長等待失敗時無法比較，退回使用短等待的結果
+            if isinstance(short_result, Exception):
+                raise short_result
+            return short_result
+        
+        if not isinstance(short_result, Exception) and short_result.get('success'):
+            # 與實際抽取走相同路徑 (啟用行程池時在工作行程執行)
+            extracted = await asyncio.gather(*[
+                self._extract_page(candidate.get('markdown', ''), ticker, company_name, industry)
+                for candidate in (short_result, long_result)
+            ])
+            signatures = [content_signature(relevant, rhea) for relevant, rhea in extracted]
+            equivalent = signatures_equivalent(signatures[0], signatures[1])
+            self.scrape_tuner.record_comparison(template, short_wait, long_wait, equivalent)
+            logger.info(f"⏱️ waitFor 比較 {template}: {short_wait}ms vs {long_wait}ms → "
+                       f"{'等價' if equivalent else '不同'}")
+        
+        return long_result
+    
+    async def _extract_page(self, content: str, ticker: str, company_name: str,
+                            industry: str) -> Tuple[str, Dict[str, Any]]:
+        """單頁抽取 (相關段落, Rhea-AI數據)：啟用CPU行程池時在工作行程執行，否則在事件迴圈中直接執行"""
+        cpu_pool = get_cpu_pool()
+        if cpu_pool.enabled:
+            # 行程池模式：整頁抽取在工作行程執行，只傳回相關段落與Rhea-AI欄位
+            return await cpu_pool.run(
+                extract_page_content, content, ticker, company_name, industry,
+                self.config.relevant_top_k, self.config.relevant_char_budget,
+                step='stage2_extract_page'
+            )
         
-        return result
+        with REGISTRY.timer('parse_seconds', step='extract_content'):
+            relevant_content = self._extract_intelligent_content(content, ticker, company_name, industry)
+        rhea_ai_data = {}
+        if relevant_content:
+            with REGISTRY.timer('parse_seconds', step='rhea_ai'):
+                rhea_ai_data = self._extract_rhea_ai_analysis(content)
+        return relevant_content, rhea_ai_data
+    
+    def _extract_intelligent_content(self, content: str, ticker: str,
+                                     company_name: str = '', industry: str = '') -> str:
+        """智能提取與股票相關的內容 (BM25 段落排序，取預算內最相關的段落)"""
+        return extract_relevant_content(content, ticker, company_name, industry,
+                                        self.config.relevant_top_k, self.config.relevant_char_budget)
     
     def _extract_rhea_ai_analysis(self, content: str) -> Dict[str, str]:
         """提取 StockTitan 的 Rhea-AI 專業分析數據"""
-        
-        rhea_analysis = {
-            "summary": "",
-            "sentiment": "",
-            "impact": "",
-            "end_of_day": "",
-            "tags": []
-        }
-        
-        # 改良的正則表達式模式
-        patterns = {
-            "summary": r"Rhea-AI Summary[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)",
-            "sentiment": r"Rhea-AI Sentiment[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)",
-            "impact": r"Rhea-AI Impact[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)",
-            "end_of_day": r"End-of-Day[:\s]*(.*?)(?=\n\n|Rhea-AI|Tags|$)"
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, content, re.DOTALL | re.IGNORECASE)
-            if match:
-                rhea_analysis[key] = match.group(1).strip()
-        
-        # 提取標籤
-        tags_match = re.search(r"Tags[:\s]*(.*?)(?=\n\n|$)", content, re.DOTALL | re.IGNORECASE)
-        if tags_match:
-            tags_text = tags_match.group(1).strip()
-            rhea_analysis["tags"] = [tag.strip() for tag in tags_text.split() if tag.strip()]
-        
-        # 記錄找到的專業AI數據
-        found_data = [k for k, v in rhea_analysis.items() if v and k != 'tags']
-        if found_data:
-            logger.info(f"🤖 找到Rhea-AI專業分析: {', '.join(found_data)}")
-        
-        return rhea_analysis
+        return extract_rhea_ai_analysis(content)
     
-    async def _fetch_backup_sources(self, ticker: str) -> List[Dict[str, Any]]:
+    async def _fetch_backup_sources(self, ticker: str, company_name: str = '',
+                                    industry: str = '') -> List[Dict[str, Any]]:
         """備用資料來源"""
         
         backup_sources = [
@@ -305,23 +552,33 @@ class ImprovedInformationGatherer:
         logger.info(f"🔄 啟用備用財經來源...")
         
         backup_results = []
+        loop = asyncio.get_event_loop()
         for url in backup_sources[:1]:  # 控制成本，只使用1個備用來源
             try:
-                result = self.firecrawl.scrape_url(
-                    url=url,
-                    params={
-                        'formats': ['markdown'],
-                        'onlyMainContent': True,
-                        'timeout': 10000
-                    }
-                )
+                with TRACER.span('backup_fetch', url=url) as span, \
+                        REGISTRY.timer('provider_seconds', provider='firecrawl', call='backup'):
+                    # 同步的SDK呼叫在執行緒中執行，避免阻塞事件迴圈
+                    result = await loop.run_in_executor(
+                        None, functools.partial(
+                            self.firecrawl.scrape_url,
+                            url=url,
+                            params={
+                                'formats': ['markdown'],
+                                'onlyMainContent': True,
+                                'timeout': 10000
+                            }
+                        )
+                    )
+                    result = dict(result or {})
+                    span.set_attribute('bytes', len(result.get('markdown', '') or ''))
                 
                 if result.get('success'):
                     backup_results.append({
                         'url': url,
                         'source': 'Backup_Financial',
                         'raw_content': result.get('markdown', ''),
-                        'relevant_content': self._extract_intelligent_content(result.get('markdown', ''), ticker),
+                        'relevant_content': self._extract_intelligent_content(
+                            result.get('markdown', ''), ticker, company_name, industry),
                         'timestamp': datetime.now().isoformat(),
                         'success': True
                     })
@@ -331,25 +588,29 @@ class ImprovedInformationGatherer:
         
         return backup_results
     
-    async def _analyze_with_gemini_pro(self, ticker: str, data_sources: List[Dict[str, Any]], industry: str) -> Dict[str, Any]:
-        """使用 Gemini 2.5 Pro 進行專業財經分析"""
-        
-        # 整合所有專業內容
-        combined_analysis = self._combine_professional_content(data_sources)
-        
-        if not combined_analysis.strip():
-            return {"error": "沒有足夠的專業內容進行分析", "success": False}
-        
-        # 構建專業財經分析提示
-        professional_prompt = f"""
-你是頂級的華爾街財經分析師，專門分析美股市場。請對股票 {ticker} 進行專業分析。
-
-行業背景: {industry}
-
-可用的專業資料:
-{combined_analysis}
-
-請提供結構化的專業分析，包括：
+    def _structured_output_instructions(self, include_investment_view: bool = False) -> str:
+        """JSON schema 輸出的欄位說明"""
+        investment_view = """- investment_view.recommendation: 整體投資建議 (買入/持有/賣出)；watch_points: 關鍵關注點和觸發條件；
+  risk_reward: 風險收益評估；investor_fit: 適合的投資者類型 (避免絕對性建議)
+""" if include_investment_view else ""
+        return """請依照指定的 JSON schema 回覆 (只輸出JSON)，欄位說明：
+- catalyst.event / significance: 最重要的價格驅動事件，以及其重要性和時效性
+- metrics.price_change / volume / financial_highlights / peer_comparison: 價格變動、交易量與價格行為、關鍵財務指標、與同業競爭對手比較
+- sentiment.overall: positive / neutral / negative；market_reaction: 投資者反應和情緒指標；bull_points: 看多理由
+- consensus.summary: 專業機構的評級和目標價；rating_changes: 近期評級變化和理由
+- risks: 主要風險因素 (含上檔和下檔目標)
+- outlook.short_term / medium_term: 短期 (1-3個月) 展望、中期 (3-12個月) 趨勢
+- limitations: 資訊不足之處
+""" + investment_view + """
+要求:
+- 基於具體事實和數據，沒有資料的欄位留空，不要臆測
+- 保持客觀中性的專業角度
+- 使用繁體中文與專業財經術語
+"""
+    
+    def _markdown_output_instructions(self) -> str:
+        """自由文字 (Markdown段落) 輸出的說明"""
+        return """請提供結構化的專業分析，包括：
 
 ## 1. 核心催化劑 (Key Catalyst)
 - 識別最重要的價格驅動事件
@@ -381,28 +642,119 @@ class ImprovedInformationGatherer:
 - 使用專業財經術語
 - 如果資訊不足，請明確指出限制
 """
+    
+    async def _analyze_with_gemini_pro(self, ticker: str, data_sources: List[Dict[str, Any]], industry: str,
+                                       rolling_summary: Optional[str] = None,
+                                       include_investment_view: bool = False) -> Dict[str, Any]:
+        """使用 Gemini 2.5 Pro 進行專業財經分析"""
+        
+        # 跨來源去除近似重複段落後再整合所有專業內容
+        with REGISTRY.timer('parse_seconds', step='combine_content'):
+            deduped_sources, dedup_stats = self._deduplicate_sources(data_sources)
+            combined_analysis = self._combine_professional_content(deduped_sources)
+        
+        if not combined_analysis.strip():
+            # 增量模式下沒有新文章：沿用滾動摘要，不再呼叫Gemini
+            if rolling_summary:
+                logger.info(f"♻️ {ticker} 沒有新文章，沿用滾動摘要")
+                return {
+                    "professional_analysis": rolling_summary,
+                    "structured_analysis": None,
+                    "model_used": "gemini-2.0-flash-exp",
+                    "analysis_type": "professional_financial",
+                    "timestamp": datetime.now().isoformat(),
+                    "success": True,
+                    "content_processed": 0,
+                    "industry_context": industry,
+                    "incremental": True,
+                    "reused_summary": True
+                }
+            return {"error": "沒有足夠的專業內容進行分析", "success": False}
+        
+        # 增量模式：先前的分析作為背景，新文章作為更新
+        previous_context = ""
+        if rolling_summary:
+            previous_context = f"""
+先前的分析摘要 (已涵蓋較早的新聞):
+{rolling_summary}
+
+以下僅為自上次分析後的新資料，請據此更新分析:
+"""
+        
+        # 輸出格式：JSON schema 欄位或 Markdown 段落
+        # 單次呼叫模式需要結構化輸出才能取出投資觀點
+        structured = self.config.structured_analysis or include_investment_view
+        output_instructions = (self._structured_output_instructions(include_investment_view) if structured
+                               else self._markdown_output_instructions())
+        
+        # 構建專業財經分析提示
+        professional_prompt = f"""
+你是頂級的華爾街財經分析師，專門分析美股市場。請對股票 {ticker} 進行專業分析。
+
+行業背景: {industry}
+{previous_context}
+可用的專業資料:
+{combined_analysis}
+
+{output_instructions}"""
 
         try:
             logger.info(f"🤖 使用 Gemini 2.5 Pro 分析 {ticker}...")
             
-            response = self.gemini_model.generate_content(
-                professional_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.2,  # 較低溫度確保專業準確性
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=2048
+            generation_config = {
+                "temperature": 0.2,  # 較低溫度確保專業準確性
+                "top_p": 0.8,
+                "top_k": 40,
+                "max_output_tokens": 2048
+            }
+            if structured:
+                generation_config["response_mime_type"] = "application/json"
+                generation_config["response_schema"] = stage2_response_schema(include_investment_view)
+            
+            def call_gemini() -> str:
+                with REGISTRY.timer('provider_seconds', provider='gemini', call='stage2_analysis'):
+                    return self.gemini_model.generate_content(
+                        professional_prompt,
+                        generation_config=bootstrap.genai().types.GenerationConfig(**generation_config)
+                    ).text
+            
+            # 相同提示 (重跑批次、重試) 直接使用快取的回應
+            with TRACER.span('stage2_gemini', model=self.gemini_model_name,
+                             prompt_bytes=len(professional_prompt.encode('utf-8')),
+                             prompt_tokens=estimate_tokens(professional_prompt)) as span:
+                # 同步的SDK呼叫放到執行緒池，等待回應時其他股票的抓取與分析照常進行
+                loop = asyncio.get_event_loop()
+                analysis_text, cache_hit = await loop.run_in_executor(
+                    None, functools.partial(
+                        contextvars.copy_context().run, self.llm_cache.get_or_generate,
+                        self.gemini_model_name, generation_config, professional_prompt, call_gemini
+                    )
                 )
-            )
+                span.set_attributes(cache_hit=cache_hit, completion_tokens=estimate_tokens(analysis_text))
+            if not cache_hit:
+                REGISTRY.inc('llm_tokens', estimate_tokens(professional_prompt), call='stage2_analysis', kind='prompt')
+                REGISTRY.inc('llm_tokens', estimate_tokens(analysis_text), call='stage2_analysis', kind='completion')
+            
+            # 結構化回應轉為可讀文字；解析失敗時保留原始文字，階段3改用正則擷取
+            structured_analysis = parse_structured_analysis(analysis_text) if structured else None
+            if structured and structured_analysis is None:
+                logger.warning(f"⚠️ {ticker} Gemini 回應不是有效的結構化JSON，改用文字分析")
+            if structured_analysis:
+                analysis_text = render_analysis_text(structured_analysis)
             
             return {
-                "professional_analysis": response.text,
-                "model_used": "gemini-2.0-flash-exp",
+                "professional_analysis": analysis_text,
+                "structured_analysis": structured_analysis,
+                "model_used": self.gemini_model_name,
+                "cache_hit": cache_hit,
                 "analysis_type": "professional_financial",
                 "timestamp": datetime.now().isoformat(),
                 "success": True,
                 "content_processed": len(combined_analysis),
-                "industry_context": industry
+                "industry_context": industry,
+                "incremental": bool(rolling_summary),
+                "reused_summary": False,
+                "dedup_stats": dedup_stats
             }
             
         except Exception as e:
@@ -412,6 +764,56 @@ class ImprovedInformationGatherer:
                 "success": False
             }
     
+    def _deduplicate_sources(self, data_sources: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """跨來源去除近似重複的段落與Rhea-AI區塊，保留品質最高來源的副本"""
+        
+        stats = {"paragraphs_removed": 0, "chars_saved": 0, "tokens_saved": 0}
+        deduplicator = ParagraphDeduplicator()
+        seen_rhea = set()
+        replacements = {}
+        
+        # 依品質分數由高到低決定保留哪個副本 (同分時保持原順序)
+        ranked = sorted(
+            (i for i, source in enumerate(data_sources) if source.get('success')),
+            key=lambda i: data_sources[i].get('quality_score', 0),
+            reverse=True
+        )
+        
+        for i in ranked:
+            source = data_sources[i]
+            kept_paragraphs = []
+            for paragraph in source.get('relevant_content', '').split('\n\n'):
+                if deduplicator.add(paragraph):
+                    kept_paragraphs.append(paragraph)
+                else:
+                    stats["paragraphs_removed"] += 1
+                    stats["chars_saved"] += len(paragraph)
+                    stats["tokens_saved"] += estimate_tokens(paragraph)
+            
+            changes = {'relevant_content': '\n\n'.join(kept_paragraphs)}
+            
+            # 同一則新聞的Rhea-AI摘要常出現在多個頁面
+            rhea_analysis = source.get('rhea_ai_analysis') or {}
+            rhea_key = normalize_text(rhea_analysis.get('summary', ''))
+            if rhea_key:
+                if rhea_key in seen_rhea:
+                    duplicated = ' '.join(v for v in rhea_analysis.values() if isinstance(v, str))
+                    stats["chars_saved"] += len(duplicated)
+                    stats["tokens_saved"] += estimate_tokens(duplicated)
+                    changes['rhea_ai_analysis'] = {}
+                seen_rhea.add(rhea_key)
+            
+            replacements[i] = changes
+        
+        deduped = [dict(source, **replacements[i]) if i in replacements else source
+                   for i, source in enumerate(data_sources)]
+        
+        if stats["paragraphs_removed"] or stats["tokens_saved"]:
+            logger.info(f"🧹 去除重複段落 {stats['paragraphs_removed']} 個，"
+                       f"節省約 {stats['tokens_saved']} tokens")
+        
+        return deduped, stats
+    
     def _combine_professional_content(self, data_sources: List[Dict[str, Any]]) -> str:
         """整合專業內容，優先處理AI分析數據"""
         
@@ -460,53 +862,10 @@ class ImprovedInformationGatherer:
     
     def _format_compatible_result(self, ticker: str, raw_data: List[Dict[str, Any]], 
                                  gemini_analysis: Dict[str, Any]) -> Dict[str, Any]:
-        """格式化結果，與原本 script_2.py 完全相容"""
-        
-        # 創建與原本 script_2.py 相同的 structured_data 格式
-        structured_data = {
-            "price_data": [],
-            "news_events": [],
-            "analyst_opinions": [],
-            "market_context": [],
-            "company_fundamentals": []
-        }
+        """格式化結果 (欄位與原本 script_2.py 相同，structured_data 為正規化來源表)"""
         
-        # 智能內容分類
-        for source in raw_data:
-            if not source.get('success'):
-                continue
-                
-            content = source.get('relevant_content', '')
-            rhea_data = source.get('rhea_ai_analysis', {})
-            
-            # 基於關鍵字和AI數據進行分類
-            content_item = {
-                "content": content[:800],  # 限制長度
-                "source": source.get('url', ''),
-                "timestamp": source.get('timestamp', ''),
-                "quality_score": source.get('quality_score', 0),
-                "ai_analysis": rhea_data
-            }
-            
-            # 價格和交易數據
-            if any(keyword in content.lower() for keyword in ['price', 'trading', 'volume', 'market']):
-                structured_data["price_data"].append(content_item)
-            
-            # 分析師觀點
-            if any(keyword in content.lower() for keyword in ['analyst', 'rating', 'target', 'upgrade', 'downgrade']):
-                structured_data["analyst_opinions"].append(content_item)
-            
-            # 新聞事件
-            if any(keyword in content.lower() for keyword in ['announce', 'report', 'release', 'launch']):
-                structured_data["news_events"].append(content_item)
-            
-            # 基本面數據
-            if any(keyword in content.lower() for keyword in ['earnings', 'revenue', 'profit', 'guidance']):
-                structured_data["company_fundamentals"].append(content_item)
-            
-            # 市場背景
-            else:
-                structured_data["market_context"].append(content_item)
+        # 智能內容分類：正規化來源表，各分類只存來源ID與相關度 (以 source_table.category_items 讀取)
+        structured_data = build_source_table(raw_data)
         
         # 創建與原本格式相容的返回結果
         return {
@@ -521,6 +880,10 @@ class ImprovedInformationGatherer:
                 "analysis_success": gemini_analysis.get('success', False),
                 "total_content_length": sum(len(s.get('relevant_content', '')) for s in raw_data),
                 "ai_analysis_found": sum(1 for s in raw_data if s.get('rhea_ai_analysis', {}).get('summary')),
+                "new_articles": sum(len(s.get('new_article_ids', [])) for s in raw_data),
+                "reused_rolling_summary": gemini_analysis.get('reused_summary', False),
+                "dedup_tokens_saved": gemini_analysis.get('dedup_stats', {}).get('tokens_saved', 0),
+                "llm_cache_hit": gemini_analysis.get('cache_hit', False),
                 "method": "StockTitan_Gemini_Pro",
                 "cost_estimate": self._calculate_processing_cost(raw_data, gemini_analysis)
             }
@@ -553,13 +916,22 @@ class ImprovedInformationGatherer:
         """計算處理成本"""
         
         firecrawl_cost = len(raw_data) * 0.5  # $0.5 per page
-        gemini_cost = 0.02 if gemini_analysis.get('success') else 0  # ~$0.02 per analysis
+        # 快取命中或沿用滾動摘要時沒有實際的Gemini呼叫
+        gemini_called = (gemini_analysis.get('success') and not gemini_analysis.get('cache_hit')
+                         and not gemini_analysis.get('reused_summary'))
+        gemini_cost = 0.02 if gemini_called else 0  # ~$0.02 per analysis
         
         return round(firecrawl_cost + gemini_cost, 3)
     
-    def _is_data_sufficient(self, data: List[Dict[str, Any]]) -> bool:
+    def _is_data_sufficient(self, data: List[Dict[str, Any]],
+                            rolling_summary: Optional[str] = None) -> bool:
         """評估資料充分性"""
         
+        # 已有滾動摘要時，新資料只是增量，不需要備用來源補充
+        if rolling_summary:
+            logger.info(f"📊 資料充分性評估: 使用滾動摘要 + {len(data)}個新來源")
+            return True
+        
         if not data:
             return False
         
@@ -589,13 +961,7 @@ class ImprovedInformationGatherer:
             "ticker": ticker,
             "error_message": error_message,
             "raw_information": [],
-            "structured_data": {
-                "price_data": [],
-                "news_events": [],
-                "analyst_opinions": [],
-                "market_context": [],
-                "company_fundamentals": []
-            },
+            "structured_data": empty_source_table(),
             "collection_metadata": {
                 "timestamp": datetime.now().isoformat(),
                 "error": True,
@@ -631,10 +997,11 @@ class ImprovedInformationGatherer:
         self.api_usage_tracker['daily_calls'] += 1
         self.api_usage_tracker['hourly_calls'] += 1
     
-    def _check_cache(self, ticker: str) -> Optional[Dict[str, Any]]:
-        """檢查快取"""
-        if ticker in self.cache:
-            cached_time, cached_data = self.cache[ticker]
+    def _check_cache(self, ticker: str, include_investment_view: bool = False) -> Optional[Dict[str, Any]]:
+        """檢查快取 (單次呼叫模式的結果含投資觀點，與兩次呼叫模式分開快取)"""
+        key = (ticker, include_investment_view)
+        if key in self.cache:
+            cached_time, cached_data = self.cache[key]
             hours_elapsed = (time.time() - cached_time) / 3600
             
             if hours_elapsed < self.config.cache_duration_hours:
@@ -642,9 +1009,15 @@ class ImprovedInformationGatherer:
         
         return None
     
-    def _update_cache(self, ticker: str, data: Dict[str, Any]):
-        """更新快取"""
-        self.cache[ticker] = (time.time(), data)
+    def _update_cache(self, ticker: str, include_investment_view: bool, data: Dict[str, Any]):
+        """更新快取 (超過上限時淘汰最早寫入的項目)"""
+        if self.config.cache_duration_hours <= 0 or self.config.result_cache_max_entries <= 0:
+            return
+        key = (ticker, include_investment_view)
+        self.cache[key] = (time.time(), data)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.config.result_cache_max_entries:
+            self.cache.popitem(last=False)
     
     def _is_market_hours(self) -> bool:
         """檢查美國市場交易時間"""
@@ -664,24 +1037,36 @@ class ImprovedInformationGatherer:
 # 全局實例 (單例模式)
 _gatherer_instance = None
 
-async def process(stock_data: Dict[str, Any]) -> Dict[str, Any]:
+def _get_gatherer() -> ImprovedInformationGatherer:
+    """取得全局收集器 (延遲初始化，避免導入時的錯誤)"""
+    global _gatherer_instance
+    
+    if _gatherer_instance is None:
+        _gatherer_instance = ImprovedInformationGatherer()
+    
+    return _gatherer_instance
+
+async def process(stock_data: Dict[str, Any], include_investment_view: bool = False) -> Dict[str, Any]:
     """
     直接替換原本 script_2.py 中的 process 函數
     完全相容的接口，無需修改其他代碼
     
     Args:
         stock_data: 來自 script_1.py 的股票資料
+        include_investment_view: 單次呼叫模式 (見 ImprovedInformationGatherer.process)
         
     Returns:
         與原本 script_2.py 相同格式的結果，但使用 StockTitan + Gemini 2.5 Pro
     """
-    global _gatherer_instance
-    
-    # 延遲初始化 (避免導入時的錯誤)
-    if _gatherer_instance is None:
-        _gatherer_instance = ImprovedInformationGatherer()
-    
-    return await _gatherer_instance.process(stock_data)
+    return await _get_gatherer().process(stock_data, include_investment_view)
+
+async def collect_sources(stock_data: Dict[str, Any], include_investment_view: bool = False) -> Dict[str, Any]:
+    """流水線抓取段 (見 ImprovedInformationGatherer.collect_sources)"""
+    return await _get_gatherer().collect_sources(stock_data, include_investment_view)
+
+async def analyze_sources(collection: Dict[str, Any], include_investment_view: bool = False) -> Dict[str, Any]:
+    """流水線Gemini分析段 (見 ImprovedInformationGatherer.analyze_sources)"""
+    return await _get_gatherer().analyze_sources(collection, include_investment_view)
 
 # 測試和驗證函數
 async def test_improved_gatherer():
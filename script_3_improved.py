@@ -1,28 +1,44 @@
 # 階段3: 改良版內容分析與結構化 - 整合StockTitan + Gemini資料
 # 三層內容金字塔框架 (What/Why/So What)
 
-import json
+import asyncio
+import contextvars
+import functools
 import logging
-import re
 import os
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from dataclasses import dataclass
 
 # 如果需要額外的Gemini分析
-import google.generativeai as genai
-from dotenv import load_dotenv
+import bootstrap
 
-# 載入環境變數
-load_dotenv()
+# 載入環境變數 (必須在匯入其他專案模組之前，serialization、tracing 在匯入時讀取環境變數)
+bootstrap.load_environment()
+
+from analysis_document import AnalysisDocument
+from analysis_schema import SENTIMENT_LABELS, render_investment_view
+from cpu_pool import get_cpu_pool
+from extraction_patterns import ANALYSIS_TEMPLATES, GEMINI_PATTERNS, PERCENT_CHANGE, has_indicator
+from llm_cache import get_llm_cache
+from metrics import REGISTRY
+from serialization import dumps
+from source_table import CATEGORIES, category_items
+from stage_dag import StageGraph
+from tracing import TRACER
+from text_utils import estimate_tokens
 
 # 配置日誌
-logging.basicConfig(
-    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+bootstrap.configure_logging()
 logger = logging.getLogger('YourPods_ContentAnalysis')
 
+# 本地三層分析的輸出 (行程池模式下由工作行程傳回)
+LOCAL_ANALYSIS_STEPS = ('layer_1_what', 'layer_2_why', 'layer_3_so_what', 'quality')
+
+# 原始資訊中分析會用到的欄位 (送往工作行程時不帶整頁的 raw_content)
+ANALYSIS_SOURCE_FIELDS = ('success', 'source', 'url', 'timestamp', 'quality_score',
+                          'relevant_content', 'rhea_ai_analysis')
+
 @dataclass
 class AnalysisConfig:
     """內容分析配置"""
@@ -31,14 +47,30 @@ class AnalysisConfig:
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
         self.use_gemini_enhancement = os.getenv('USE_GEMINI_ENHANCEMENT', 'true').lower() == 'true'
         
-        # Gemini配置 (如果需要額外分析)
-        if self.gemini_api_key and self.use_gemini_enhancement:
-            genai.configure(api_key=self.gemini_api_key)
-            self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        else:
-            self.gemini_model = None
+        # Gemini配置 (如果需要額外分析；模型在第一次增強分析時才匯入SDK並建立)
+        self.gemini_enabled = bool(self.gemini_api_key and self.use_gemini_enhancement)
+        self.gemini_model_name = 'gemini-2.0-flash-exp'
+        self._gemini_model = None
         
         logger.info("✅ YourPods內容分析配置載入完成")
+    
+    @property
+    def gemini_model(self):
+        """Gemini 模型 (未啟用增強分析時為 None)"""
+        if self._gemini_model is None and self.gemini_enabled:
+            genai = bootstrap.genai()
+            genai.configure(api_key=self.gemini_api_key)
+            self._gemini_model = genai.GenerativeModel(self.gemini_model_name)
+        return self._gemini_model
+    
+    @gemini_model.setter
+    def gemini_model(self, model):
+        self._gemini_model = model
+    
+    @property
+    def llm_cache(self):
+        """LLM回應快取 (第一次增強分析時才建立；CPU行程池的工作行程只做本地分析，不必掃描快取目錄)"""
+        return get_llm_cache()
 
 class ImprovedContentAnalyzer:
     """改良版內容分析與結構化處理器 - 整合StockTitan + Gemini數據"""
@@ -46,14 +78,17 @@ class ImprovedContentAnalyzer:
     def __init__(self):
         self.config = AnalysisConfig()
         self.analysis_templates = self._load_analysis_templates()
+        self.analysis_graph = self._build_analysis_graph()
+        self.local_graph = self._build_analysis_graph(include_enhancement=False)
         logger.info("🧠 YourPods改良版內容分析器初始化完成")
     
-    async def process(self, information_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def process(self, information_data: Dict[str, Any], single_shot: bool = False) -> Dict[str, Any]:
         """
         主要處理函數 - 與原本script_3.py完全相容
         
         Args:
             information_data: 來自script_2_improved.py的資訊數據
+            single_shot: 單次呼叫模式 - 以階段2已產生的投資觀點組成增強分析，不再另外呼叫Gemini
             
         Returns:
             三層金字塔結構的分析結果
@@ -62,19 +97,29 @@ class ImprovedContentAnalyzer:
         logger.info(f"🎯 [YourPods] 開始三層金字塔分析: {ticker}")
         
         try:
-            # 1. 智能提取關鍵資訊 (處理新的資料格式)
-            key_info = self._extract_enhanced_information(information_data)
-            
-            # 2. 執行三層金字塔分析
-            layer_1 = await self._analyze_what_layer(key_info)
-            layer_2 = await self._analyze_why_layer(key_info, layer_1)
-            layer_3 = await self._analyze_so_what_layer(key_info, layer_1, layer_2)
-            
-            # 3. 品質檢查和信心評估
-            quality_assessment = self._assess_analysis_quality(layer_1, layer_2, layer_3, key_info)
-            
-            # 4. 整合Gemini專業分析 (如果可用)
-            enhanced_analysis = await self._enhance_with_gemini(key_info, layer_1, layer_2, layer_3)
+            cpu_pool = get_cpu_pool()
+            if cpu_pool.enabled:
+                # 行程池模式：資訊整合與三層分析在工作行程執行 (只傳送分析所需欄位)，Gemini增強留在本行程
+                steps = await cpu_pool.run(analyze_local_layers, compact_analysis_input(information_data),
+                                           step='stage3_local_analysis')
+                gemini_structured = information_data.get('gemini_professional_analysis', {}).get('structured_analysis')
+                with TRACER.span('stage3_enhancement'):
+                    steps["enhanced_analysis"] = await self._run_enhancement(
+                        {"gemini_structured": gemini_structured or {}},
+                        steps["layer_1_what"], steps["layer_2_why"], steps["layer_3_so_what"], single_shot
+                    )
+            else:
+                # 1. 智能提取關鍵資訊 (處理新的資料格式)
+                with REGISTRY.timer('parse_seconds', step='stage3_extract'):
+                    key_info = self._extract_enhanced_information(information_data)
+                
+                # 2-4. 三層金字塔分析、品質評估、Gemini增強 (依相依圖排程，品質評估與Gemini增強並行)
+                steps = await self.analysis_graph.run({"key_info": key_info, "single_shot": single_shot})
+            layer_1 = steps["layer_1_what"]
+            layer_2 = steps["layer_2_why"]
+            layer_3 = steps["layer_3_so_what"]
+            quality_assessment = steps["quality"]
+            enhanced_analysis = steps["enhanced_analysis"]
             
             result = {
                 "status": "success",
@@ -109,6 +154,45 @@ class ImprovedContentAnalyzer:
                 }
             }
     
+    def _build_analysis_graph(self, include_enhancement: bool = True) -> StageGraph:
+        """
+        宣告階段3步驟的相依關係
+        
+        同業比較與分析師共識只需要整合資訊，不等待第一層；
+        品質評估與Gemini增強都只依賴三層結果，兩者並行
+        
+        Args:
+            include_enhancement: 是否包含Gemini增強步驟 (行程池的工作行程只執行本地分析)
+        """
+        graph = StageGraph('stage3')
+        graph.add_step('layer_1_what', lambda key_info: self._analyze_what_layer(key_info),
+                       ['key_info'], span='stage3_layer_what')
+        graph.add_step('peer_comparison', lambda key_info: self._analyze_enhanced_comparison(key_info),
+                       ['key_info'])
+        graph.add_step('analyst_consensus', lambda key_info: self._analyze_enhanced_consensus(key_info),
+                       ['key_info'])
+        graph.add_step('layer_2_why',
+                       lambda key_info, layer_1_what, peer_comparison, analyst_consensus: self._analyze_why_layer(
+                           key_info, layer_1_what, peer_comparison, analyst_consensus),
+                       ['key_info', 'layer_1_what', 'peer_comparison', 'analyst_consensus'],
+                       span='stage3_layer_why')
+        graph.add_step('layer_3_so_what',
+                       lambda key_info, layer_1_what, layer_2_why: self._analyze_so_what_layer(
+                           key_info, layer_1_what, layer_2_why),
+                       ['key_info', 'layer_1_what', 'layer_2_why'], span='stage3_layer_so_what')
+        graph.add_step('quality',
+                       lambda key_info, layer_1_what, layer_2_why, layer_3_so_what: self._assess_analysis_quality(
+                           layer_1_what, layer_2_why, layer_3_so_what, key_info),
+                       ['key_info', 'layer_1_what', 'layer_2_why', 'layer_3_so_what'], span='stage3_quality')
+        if include_enhancement:
+            graph.add_step('enhanced_analysis',
+                           lambda key_info, layer_1_what, layer_2_why, layer_3_so_what, single_shot:
+                           self._run_enhancement(key_info, layer_1_what, layer_2_why, layer_3_so_what, single_shot),
+                           ['key_info', 'layer_1_what', 'layer_2_why', 'layer_3_so_what', 'single_shot'],
+                           span='stage3_enhancement')
+        graph.validate(['key_info', 'single_shot'])
+        return graph
+    
     def _extract_enhanced_information(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """提取並整合來自StockTitan + Gemini的資訊"""
         
@@ -116,27 +200,36 @@ class ImprovedContentAnalyzer:
         gemini_analysis = data.get('gemini_professional_analysis', {})
         raw_information = data.get('raw_information', [])
         
+        gemini_text = gemini_analysis.get('professional_analysis', '')
+        consolidated_content = self._consolidate_enhanced_content(raw_information)
+        
         # 整合所有資訊來源
         enhanced_info = {
             "ticker": data.get('ticker'),
             "collection_metadata": data.get('collection_metadata', {}),
             
             # 來自StockTitan的結構化數據
-            "price_data": structured_data.get('price_data', []),
-            "news_events": structured_data.get('news_events', []),
-            "analyst_opinions": structured_data.get('analyst_opinions', []),
-            "market_context": structured_data.get('market_context', []),
-            "company_fundamentals": structured_data.get('company_fundamentals', []),
+            # (正規化來源表依分類展開為同一批來源物件的引用，不複製內容；舊格式同樣可讀)
+            "price_data": category_items(structured_data, 'price_data'),
+            "news_events": category_items(structured_data, 'news_events'),
+            "analyst_opinions": category_items(structured_data, 'analyst_opinions'),
+            "market_context": category_items(structured_data, 'market_context'),
+            "company_fundamentals": category_items(structured_data, 'company_fundamentals'),
             
-            # 來自Gemini的專業分析
-            "gemini_professional_analysis": gemini_analysis.get('professional_analysis', ''),
+            # 來自Gemini的專業分析 (結構化欄位可用時，各輔助函數直接讀取，不再做正則擷取)
+            "gemini_professional_analysis": gemini_text,
+            "gemini_structured": gemini_analysis.get('structured_analysis') or {},
             "gemini_success": gemini_analysis.get('success', False),
             
             # Rhea-AI專業數據
             "rhea_ai_insights": self._extract_rhea_ai_insights(raw_information),
             
             # 整合的原始內容
-            "consolidated_content": self._consolidate_enhanced_content(raw_information),
+            "consolidated_content": consolidated_content,
+            
+            # 分析文件索引 (小寫副本、關鍵字位置)，三層分析共用，避免各自重掃全文
+            "gemini_document": AnalysisDocument(gemini_text),
+            "content_document": AnalysisDocument(consolidated_content),
             
             # 內容品質指標
             "content_quality_scores": self._calculate_content_scores(structured_data, gemini_analysis, raw_information)
@@ -206,7 +299,7 @@ class ImprovedContentAnalyzer:
         }
         
         # 資料豐富度
-        total_items = sum(len(structured_data.get(key, [])) for key in structured_data)
+        total_items = sum(len(category_items(structured_data, category)) for category in CATEGORIES)
         scores["data_richness"] = min(total_items / 10.0, 1.0)  # 10個項目為滿分
         
         # AI分析品質
@@ -248,8 +341,10 @@ class ImprovedContentAnalyzer:
             "data_sources_used": self._count_data_sources(key_info)
         }
     
-    async def _analyze_why_layer(self, key_info: Dict[str, Any], layer_1: Dict[str, Any]) -> Dict[str, Any]:
-        """第二層分析：Why - 敘事層"""
+    async def _analyze_why_layer(self, key_info: Dict[str, Any], layer_1: Dict[str, Any],
+                                 peer_comparison: Optional[str] = None,
+                                 analyst_consensus: Optional[str] = None) -> Dict[str, Any]:
+        """第二層分析：Why - 敘事層 (同業比較、分析師共識可由排程器預先算好傳入)"""
         
         logger.info("🔍 分析第二層: Why (敘事層)")
         
@@ -257,10 +352,12 @@ class ImprovedContentAnalyzer:
         market_narrative = self._analyze_enhanced_narrative(key_info, layer_1)
         
         # 同業比較
-        peer_comparison = self._analyze_enhanced_comparison(key_info)
+        if peer_comparison is None:
+            peer_comparison = self._analyze_enhanced_comparison(key_info)
         
         # 分析師共識
-        analyst_consensus = self._analyze_enhanced_consensus(key_info)
+        if analyst_consensus is None:
+            analyst_consensus = self._analyze_enhanced_consensus(key_info)
         
         return {
             "market_narrative": market_narrative,
@@ -304,27 +401,19 @@ class ImprovedContentAnalyzer:
             if primary_summary:
                 return f"核心催化劑: {primary_summary[:200]}..."
         
-        # 其次使用Gemini分析
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            # 提取第一個重要事件
-            catalyst_match = re.search(r'核心事件[：:]\s*([^。\n]{20,100})', gemini_analysis)
-            if catalyst_match:
-                return f"根據AI分析: {catalyst_match.group(1)}"
+        # 其次使用Gemini分析 (結構化欄位，或提取第一個重要事件)
+        structured_event = self._structured_field(key_info, 'catalyst', 'event')
+        if structured_event:
+            return f"根據AI分析: {structured_event}"
+        catalyst_match = self._search_gemini(key_info, "catalyst")
+        if catalyst_match:
+            return f"根據AI分析: {catalyst_match.group(1)}"
         
         # 最後使用關鍵字匹配
-        consolidated_content = key_info.get('consolidated_content', '').lower()
-        
-        catalyst_patterns = {
-            "財報發布": ["earnings", "quarterly", "revenue", "profit", "guidance", "財報", "季報"],
-            "併購消息": ["merger", "acquisition", "deal", "takeover", "併購", "收購"],
-            "產品發布": ["product", "launch", "release", "innovation", "產品", "發布"],
-            "監管變化": ["fda", "approval", "regulation", "policy", "監管", "批准"],
-            "管理層變動": ["ceo", "executive", "management", "leadership", "管理層", "高管"]
-        }
+        content_document = self._content_document(key_info)
         
-        for catalyst_type, keywords in catalyst_patterns.items():
-            if any(keyword in consolidated_content for keyword in keywords):
+        for catalyst_type, keywords in self.analysis_templates["catalyst_patterns"].items():
+            if content_document.contains_any(keywords):
                 return f"檢測到{catalyst_type}相關的重要事件"
         
         return "未發現明確的特定催化劑，建議關注整體市場表現"
@@ -346,7 +435,7 @@ class ImprovedContentAnalyzer:
                 content = item.get('content', '').lower()
                 
                 # 提取價格變化資訊
-                price_match = re.search(r'(\d+\.?\d*%|\+\d+\.?\d*%|-\d+\.?\d*%)', content)
+                price_match = PERCENT_CHANGE.search(content)
                 if price_match:
                     metrics["price_change"] = f"價格變動: {price_match.group(1)}"
                 
@@ -355,13 +444,20 @@ class ImprovedContentAnalyzer:
                 if any(keyword in content for keyword in volume_keywords):
                     metrics["volume_analysis"] = "發現異常成交量活動"
         
-        # 從Gemini分析中提取
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            # 提取關鍵數據
-            data_match = re.search(r'關鍵數據[：:]\s*([^。\n]{20,150})', gemini_analysis)
-            if data_match:
-                metrics["financial_highlights"] = data_match.group(1)
+        # 從Gemini結構化欄位補充 (價格與成交量只在原始資料沒有時使用)
+        structured_metrics = {
+            "price_change": self._structured_field(key_info, 'metrics', 'price_change'),
+            "volume_analysis": self._structured_field(key_info, 'metrics', 'volume'),
+            "financial_highlights": self._structured_field(key_info, 'metrics', 'financial_highlights')
+        }
+        for field, value in structured_metrics.items():
+            if value and (field == "financial_highlights" or metrics[field] == "數據收集中"):
+                metrics[field] = value
+        
+        # 從Gemini分析中提取關鍵數據
+        data_match = self._search_gemini(key_info, "key_data")
+        if data_match:
+            metrics["financial_highlights"] = data_match.group(1)
         
         return metrics
     
@@ -406,15 +502,20 @@ class ImprovedContentAnalyzer:
                 narrative = f"市場情緒: {primary_sentiment}。"
             else:
                 narrative = "市場情緒: 中性。"
+        elif self._structured_field(key_info, 'sentiment', 'overall'):
+            overall = self._structured_field(key_info, 'sentiment', 'overall')
+            narrative = f"市場情緒: {SENTIMENT_LABELS.get(overall, overall)}。"
         else:
             narrative = "市場情緒: 觀察中。"
         
+        structured_reaction = self._structured_field(key_info, 'sentiment', 'market_reaction')
+        if structured_reaction:
+            narrative += f" {structured_reaction}"
+        
         # 從Gemini分析中提取市場反應
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            reaction_match = re.search(r'市場反應[：:]\s*([^。\n]{30,200})', gemini_analysis)
-            if reaction_match:
-                narrative += f" {reaction_match.group(1)}"
+        reaction_match = self._search_gemini(key_info, "reaction")
+        if reaction_match:
+            narrative += f" {reaction_match.group(1)}"
         
         # 分析交易行為
         price_data = key_info.get('price_data', [])
@@ -427,11 +528,12 @@ class ImprovedContentAnalyzer:
         """增強版同業比較"""
         
         # 從Gemini分析中提取比較資訊
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            comparison_match = re.search(r'(同業|競爭|比較)[^。]*([^。]{50,200})', gemini_analysis)
-            if comparison_match:
-                return f"同業比較: {comparison_match.group(2)}"
+        structured_comparison = self._structured_field(key_info, 'metrics', 'peer_comparison')
+        if structured_comparison:
+            return f"同業比較: {structured_comparison}"
+        comparison_match = self._search_gemini(key_info, "comparison")
+        if comparison_match:
+            return f"同業比較: {comparison_match.group(2)}"
         
         # 基於行業分析
         market_context = key_info.get('market_context', [])
@@ -453,9 +555,9 @@ class ImprovedContentAnalyzer:
             for opinion in analyst_opinions:
                 content = opinion.get('content', '').lower()
                 
-                if 'upgrade' in content or 'buy' in content or '買入' in content:
+                if has_indicator(content, "positive", "analyst"):
                     consensus_items.append("正面")
-                elif 'downgrade' in content or 'sell' in content or '賣出' in content:
+                elif has_indicator(content, "negative", "analyst"):
                     consensus_items.append("負面")
                 else:
                     consensus_items.append("中性")
@@ -469,11 +571,12 @@ class ImprovedContentAnalyzer:
             consensus = "分析師覆蓋有限，建議關注官方指引"
         
         # 從Gemini分析中補充
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            analyst_match = re.search(r'分析師[^。]*([^。]{30,150})', gemini_analysis)
-            if analyst_match:
-                consensus += f"。專業分析: {analyst_match.group(1)}"
+        structured_consensus = self._structured_field(key_info, 'consensus', 'summary')
+        if structured_consensus:
+            consensus += f"。專業分析: {structured_consensus}"
+        analyst_match = self._search_gemini(key_info, "analyst")
+        if analyst_match:
+            consensus += f"。專業分析: {analyst_match.group(1)}"
         
         return consensus
     
@@ -490,23 +593,22 @@ class ImprovedContentAnalyzer:
             sentiment = insight.get('sentiment', '').lower()
             impact = insight.get('impact', '').lower()
             
-            if 'positive' in sentiment or 'bullish' in sentiment or 'strong' in impact:
+            if has_indicator(sentiment, "positive", "sentiment") or has_indicator(impact, "positive", "impact"):
                 summary = insight.get('summary', '')
                 if summary:
                     bull_points.append(summary[:100])
         
         # 從Gemini分析中提取
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            bull_match = re.search(r'(看多|正面|優勢|機會)[^。]*([^。]{50,200})', gemini_analysis)
-            if bull_match:
-                bull_points.append(bull_match.group(2))
+        bull_points.extend(self._structured_field(key_info, 'sentiment', 'bull_points') or [])
+        bull_match = self._search_gemini(key_info, "bull")
+        if bull_match:
+            bull_points.append(bull_match.group(2))
         
         # 從基本面數據中提取
         fundamentals = key_info.get('company_fundamentals', [])
         for item in fundamentals:
             content = item.get('content', '').lower()
-            if any(keyword in content for keyword in ['growth', 'profit', 'revenue', 'strong']):
+            if has_indicator(content, "positive", "fundamentals"):
                 bull_points.append("基本面表現強勁")
                 break
         
@@ -528,17 +630,16 @@ class ImprovedContentAnalyzer:
             sentiment = insight.get('sentiment', '').lower()
             impact = insight.get('impact', '').lower()
             
-            if 'negative' in sentiment or 'bearish' in sentiment or 'weak' in impact:
+            if has_indicator(sentiment, "negative", "sentiment") or has_indicator(impact, "negative", "impact"):
                 summary = insight.get('summary', '')
                 if summary:
                     bear_points.append(summary[:100])
         
         # 從Gemini分析中提取風險
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            risk_match = re.search(r'(風險|挑戰|擔憂|負面)[^。]*([^。]{50,200})', gemini_analysis)
-            if risk_match:
-                bear_points.append(risk_match.group(2))
+        bear_points.extend(key_info.get('gemini_structured', {}).get('risks', [])[:2])
+        risk_match = self._search_gemini(key_info, "bear")
+        if risk_match:
+            bear_points.append(risk_match.group(2))
         
         # 通用風險因素
         bear_points.append("市場整體波動風險")
@@ -553,16 +654,16 @@ class ImprovedContentAnalyzer:
         outlook_points = []
         
         # 從Gemini分析中提取前瞻觀點
-        gemini_analysis = key_info.get('gemini_professional_analysis', '')
-        if gemini_analysis:
-            outlook_match = re.search(r'(展望|未來|趨勢|預期)[^。]*([^。]{50,200})', gemini_analysis)
-            if outlook_match:
-                outlook_points.append(outlook_match.group(2))
+        outlook_match = self._search_gemini(key_info, "outlook")
+        if outlook_match:
+            outlook_points.append(outlook_match.group(2))
         
-        # 時間框架分析
+        # 時間框架分析 (結構化欄位有短中期展望時取代通用描述)
+        short_term = self._structured_field(key_info, 'outlook', 'short_term')
+        medium_term = self._structured_field(key_info, 'outlook', 'medium_term')
         outlook_points.extend([
-            "短期(1-3個月): 關注財報季表現和市場情緒",
-            "中期(3-12個月): 注意行業趨勢和競爭格局變化",
+            f"短期(1-3個月): {short_term or '關注財報季表現和市場情緒'}",
+            f"中期(3-12個月): {medium_term or '注意行業趨勢和競爭格局變化'}",
             "長期: 持續監控基本面改善和成長動能"
         ])
         
@@ -574,22 +675,18 @@ class ImprovedContentAnalyzer:
         """增強版風險評估"""
         
         risk_categories = {
+            "AI識別風險": list(key_info.get('gemini_structured', {}).get('risks', [])),
             "公司特定風險": [],
             "行業風險": [],
             "市場風險": ["整體市場波動", "利率變化", "流動性風險"]
         }
         
         # 從內容中識別風險
-        consolidated_content = key_info.get('consolidated_content', '').lower()
-        
-        risk_keywords = {
-            "公司特定風險": ["lawsuit", "debt", "management", "competition"],
-            "行業風險": ["regulation", "technology", "disruption", "cycle"]
-        }
+        content_document = self._content_document(key_info)
         
-        for category, keywords in risk_keywords.items():
+        for category, keywords in self.analysis_templates["risk_keywords"].items():
             for keyword in keywords:
-                if keyword in consolidated_content:
+                if content_document.contains(keyword):
                     risk_categories[category].append(f"{keyword}相關風險")
         
         # 格式化風險評估
@@ -600,6 +697,33 @@ class ImprovedContentAnalyzer:
         
         return "; ".join(risk_summary) if risk_summary else "風險評估: 維持標準市場風險監控"
     
+    async def _run_enhancement(self, key_info: Dict[str, Any], layer_1: Dict[str, Any],
+                               layer_2: Dict[str, Any], layer_3: Dict[str, Any],
+                               single_shot: bool = False) -> Optional[Dict[str, Any]]:
+        """Gemini增強步驟 (記錄快取命中與輸出Token到目前的 span)"""
+        
+        # 單次呼叫模式：階段2的同一次Gemini呼叫已產生投資觀點，直接在本地組成增強分析
+        # (只在呼叫端要求單次呼叫時使用；投資觀點不存在時仍另外呼叫Gemini)
+        investment_view = key_info.get('gemini_structured', {}).get('investment_view')
+        if single_shot and investment_view and self.config.use_gemini_enhancement:
+            TRACER.current_span().set_attribute('single_shot', True)
+            return {
+                "comprehensive_analysis": render_investment_view(investment_view),
+                "investment_view": investment_view,
+                "enhancement_timestamp": datetime.now().isoformat(),
+                "cache_hit": False,
+                "source": "single_shot",
+                "success": True
+            }
+        
+        enhanced_analysis = await self._enhance_with_gemini(key_info, layer_1, layer_2, layer_3)
+        if enhanced_analysis:
+            TRACER.current_span().set_attributes(
+                cache_hit=enhanced_analysis.get('cache_hit', False),
+                completion_tokens=estimate_tokens(enhanced_analysis.get('comprehensive_analysis', ''))
+            )
+        return enhanced_analysis
+    
     async def _enhance_with_gemini(self, key_info: Dict[str, Any], 
                                  layer_1: Dict[str, Any], 
                                  layer_2: Dict[str, Any], 
@@ -615,13 +739,13 @@ class ImprovedContentAnalyzer:
 基於以下三層金字塔分析結果，請提供綜合投資洞見：
 
 第一層 (What - 事實):
-{json.dumps(layer_1, ensure_ascii=False, indent=2)}
+{dumps(layer_1, indent=True)}
 
 第二層 (Why - 敘事):
-{json.dumps(layer_2, ensure_ascii=False, indent=2)}
+{dumps(layer_2, indent=True)}
 
 第三層 (So What - 洞見):
-{json.dumps(layer_3, ensure_ascii=False, indent=2)}
+{dumps(layer_3, indent=True)}
 
 請提供：
 1. 整體投資建議 (買入/持有/賣出)
@@ -632,17 +756,40 @@ class ImprovedContentAnalyzer:
 請保持客觀專業，避免絕對性建議。
 """
             
-            response = self.config.gemini_model.generate_content(
-                enhancement_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,
-                    max_output_tokens=1024
+            generation_config = {
+                "temperature": 0.3,
+                "max_output_tokens": 1024
+            }
+            
+            def call_gemini() -> str:
+                with REGISTRY.timer('provider_seconds', provider='gemini', call='stage3_enhancement'):
+                    return self.config.gemini_model.generate_content(
+                        enhancement_prompt,
+                        generation_config=bootstrap.genai().types.GenerationConfig(**generation_config)
+                    ).text
+            
+            TRACER.current_span().set_attributes(
+                prompt_bytes=len(enhancement_prompt.encode('utf-8')),
+                prompt_tokens=estimate_tokens(enhancement_prompt)
+            )
+            
+            # 各層內容未變時直接使用快取的回應；同步的SDK呼叫放到執行緒池，讓品質評估等步驟同時進行
+            loop = asyncio.get_event_loop()
+            enhancement_text, cache_hit = await loop.run_in_executor(
+                None, functools.partial(
+                    contextvars.copy_context().run, self.config.llm_cache.get_or_generate,
+                    self.config.gemini_model_name, generation_config, enhancement_prompt, call_gemini
                 )
             )
+            if not cache_hit:
+                REGISTRY.inc('llm_tokens', estimate_tokens(enhancement_prompt), call='stage3_enhancement', kind='prompt')
+                REGISTRY.inc('llm_tokens', estimate_tokens(enhancement_text), call='stage3_enhancement', kind='completion')
             
             return {
-                "comprehensive_analysis": response.text,
+                "comprehensive_analysis": enhancement_text,
                 "enhancement_timestamp": datetime.now().isoformat(),
+                "cache_hit": cache_hit,
+                "source": "gemini_enhancement",
                 "success": True
             }
             
@@ -652,6 +799,31 @@ class ImprovedContentAnalyzer:
     
     # === 輔助功能函數 ===
     
+    def _structured_field(self, key_info: Dict[str, Any], section: str, field: str) -> Any:
+        """讀取Gemini結構化分析的欄位 (沒有時回傳 None)"""
+        return key_info.get('gemini_structured', {}).get(section, {}).get(field) or None
+    
+    def _search_gemini(self, key_info: Dict[str, Any], extractor: str) -> Optional[Any]:
+        """
+        以共用的分析文件執行Gemini段落擷取規則
+        
+        只作為自由文字回應的備用路徑：有結構化欄位時直接回傳 None，不執行正則
+        """
+        if key_info.get('gemini_structured'):
+            return None
+        keywords, pattern = GEMINI_PATTERNS[extractor]
+        document = key_info.get('gemini_document')
+        if document is None:
+            document = AnalysisDocument(key_info.get('gemini_professional_analysis', ''))
+        return document.search(pattern, keywords)
+    
+    def _content_document(self, key_info: Dict[str, Any]) -> AnalysisDocument:
+        """整合內容的分析文件 (未經 _extract_enhanced_information 時即時建立)"""
+        document = key_info.get('content_document')
+        if document is None:
+            document = AnalysisDocument(key_info.get('consolidated_content', ''))
+        return document
+    
     def _count_data_sources(self, key_info: Dict[str, Any]) -> Dict[str, int]:
         """統計數據來源"""
         return {
@@ -743,32 +915,22 @@ class ImprovedContentAnalyzer:
         }
     
     def _load_analysis_templates(self) -> Dict[str, Any]:
-        """載入分析模板"""
-        return {
-            "catalyst_patterns": {
-                "earnings": ["earnings", "quarterly", "revenue", "profit"],
-                "merger": ["merger", "acquisition", "deal"],
-                "product": ["product", "launch", "release"],
-                "regulatory": ["FDA", "approval", "regulation"]
-            },
-            "sentiment_indicators": {
-                "positive": ["strong", "growth", "beat", "exceed"],
-                "negative": ["weak", "decline", "miss", "concern"]
-            }
-        }
+        """載入分析模板 (催化劑、情緒判斷詞、風險關鍵字，定義於 extraction_patterns)"""
+        return ANALYSIS_TEMPLATES
 
 # === 與現有系統整合的主要函數 ===
 
 # 全局實例
 _analyzer_instance = None
 
-async def process(information_data: Dict[str, Any]) -> Dict[str, Any]:
+async def process(information_data: Dict[str, Any], single_shot: bool = False) -> Dict[str, Any]:
     """
     直接替換原本script_3.py中的process函數
     完全相容的接口，能夠處理來自script_2_improved.py的新資料格式
     
     Args:
         information_data: 來自script_2_improved.py的資訊數據
+        single_shot: 單次呼叫模式 (見 ImprovedContentAnalyzer.process)
         
     Returns:
         三層金字塔分析結果，增強版格式
@@ -778,7 +940,44 @@ async def process(information_data: Dict[str, Any]) -> Dict[str, Any]:
     if _analyzer_instance is None:
         _analyzer_instance = ImprovedContentAnalyzer()
     
-    return await _analyzer_instance.process(information_data)
+    return await _analyzer_instance.process(information_data, single_shot)
+
+def compact_analysis_input(information_data: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留本地分析用到的欄位，降低送往工作行程的序列化量"""
+    
+    gemini_analysis = information_data.get('gemini_professional_analysis', {})
+    return {
+        "ticker": information_data.get('ticker'),
+        "collection_metadata": information_data.get('collection_metadata', {}),
+        "structured_data": information_data.get('structured_data', {}),
+        "gemini_professional_analysis": {
+            "professional_analysis": gemini_analysis.get('professional_analysis', ''),
+            "structured_analysis": gemini_analysis.get('structured_analysis'),
+            "success": gemini_analysis.get('success', False)
+        },
+        "raw_information": [
+            {field: item[field] for field in ANALYSIS_SOURCE_FIELDS if field in item}
+            for item in information_data.get('raw_information', [])
+        ]
+    }
+
+def analyze_local_layers(information_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    CPU行程池的工作函數：資訊整合 + 三層分析 + 品質評估 (不呼叫Gemini)
+    
+    Returns:
+        各層結果 (只含 LOCAL_ANALYSIS_STEPS，不傳回分析文件索引)
+    """
+    global _analyzer_instance
+    
+    # 每個工作行程建立一次分析器並重複使用
+    if _analyzer_instance is None:
+        _analyzer_instance = ImprovedContentAnalyzer()
+    
+    analyzer = _analyzer_instance
+    key_info = analyzer._extract_enhanced_information(information_data)
+    steps = asyncio.run(analyzer.local_graph.run({"key_info": key_info}))
+    return {name: steps[name] for name in LOCAL_ANALYSIS_STEPS}
 
 # 測試函數
 async def test_improved_analyzer():
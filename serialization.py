@@ -0,0 +1,172 @@
+# 序列化層 - 結果輸出、快取與工作佇列共用的 JSON / 二進位編碼
+# 已安裝 orjson 或 msgspec 時使用之，否則退回標準函式庫 json；
+# 快取與佇列內容可用精簡的二進位格式 (msgpack)，讀取時自動辨識，舊的 JSON 資料照常可讀
+
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger('YourPods_Serialization')
+
+JSON_BACKENDS = ('orjson', 'msgspec', 'stdlib')
+BINARY_FORMATS = ('msgpack', 'json')
+
+# msgpack 內容的標頭：JSON 文字不會以 0x00 開頭，讀取時據此區分二進位與 JSON (含舊資料)
+MSGPACK_MAGIC = b'\x00MP1'
+
+
+def available_json_backends() -> Dict[str, bool]:
+    return {"orjson": orjson is not None, "msgspec": msgspec is not None, "stdlib": True}
+
+
+class JSONCodec:
+    """JSON 編碼器 (非 ASCII 字元不跳脫、無法序列化的物件轉為字串，行為與 json.dumps(ensure_ascii=False, default=str) 相同)"""
+
+    def __init__(self, backend: str = 'auto'):
+        """
+        Args:
+            backend: orjson / msgspec / stdlib，auto 為依序選擇第一個已安裝的
+        """
+        available = available_json_backends()
+        if backend == 'auto':
+            backend = next(name for name in JSON_BACKENDS if available[name])
+        if backend not in available:
+            raise ValueError(f"未知的序列化後端: {backend} (可用: {', '.join(JSON_BACKENDS)})")
+        if not available[backend]:
+            raise ValueError(f"序列化後端 {backend} 未安裝")
+        self.backend = backend
+
+        self._encode: Callable[[Any, bool], bytes]
+        self._decode: Callable[[Union[bytes, str]], Any]
+        if backend == 'orjson':
+            compact = orjson.OPT_NON_STR_KEYS
+            indented = compact | orjson.OPT_INDENT_2
+            self._encode = lambda obj, indent: orjson.dumps(obj, default=str, option=indented if indent else compact)
+            self._decode = orjson.loads
+        elif backend == 'msgspec':
+            encoder = msgspec.json.Encoder(enc_hook=str)
+            decoder = msgspec.json.Decoder()
+
+            def encode(obj: Any, indent: bool) -> bytes:
+                data = encoder.encode(obj)
+                return msgspec.json.format(data, indent=2) if indent else data
+
+            self._encode = encode
+            self._decode = decoder.decode
+        else:
+            self._encode = lambda obj, indent: json.dumps(
+                obj, ensure_ascii=False, default=str,
+                indent=2 if indent else None, separators=None if indent else (',', ':')
+            ).encode('utf-8')
+            self._decode = json.loads
+
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        """編碼為 JSON 文字 (indent=True 時縮排2格)"""
+        return self._encode(obj, indent).decode('utf-8')
+
+    def dumps_bytes(self, obj: Any, indent: bool = False) -> bytes:
+        """編碼為 UTF-8 JSON 位元組 (寫入檔案或網路時省去一次轉換)"""
+        return self._encode(obj, indent)
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        return self._decode(data)
+
+
+class BinaryCodec:
+    """快取與佇列內容的編碼器：msgpack (msgspec 或 msgpack 套件) 不可用時退回精簡 JSON"""
+
+    def __init__(self, json_codec: JSONCodec, preferred: str = 'msgpack'):
+        """
+        Args:
+            json_codec: JSON 編碼與舊資料解碼使用的編碼器
+            preferred: msgpack / json
+        """
+        if preferred not in BINARY_FORMATS:
+            raise ValueError(f"未知的內容格式: {preferred} (可用: {', '.join(BINARY_FORMATS)})")
+        self.json_codec = json_codec
+
+        self._msgpack_encode = self._msgpack_decode = None
+        if msgspec is not None:
+            self._msgpack_encode = msgspec.msgpack.Encoder(enc_hook=str).encode
+            self._msgpack_decode = msgspec.msgpack.Decoder().decode
+        elif msgpack is not None:
+            self._msgpack_encode = lambda obj: msgpack.packb(obj, default=str, use_bin_type=True)
+            self._msgpack_decode = lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+        if preferred == 'msgpack' and not self.msgpack_available:
+            logger.warning("⚠️ PAYLOAD_FORMAT=msgpack 但 msgspec 與 msgpack 皆未安裝，快取與佇列內容改用 JSON "
+                           "(pip install msgpack，或設定 PAYLOAD_FORMAT=json)")
+            preferred = 'json'
+        self.format = preferred
+
+    @property
+    def msgpack_available(self) -> bool:
+        return self._msgpack_encode is not None
+
+    def pack(self, obj: Any) -> bytes:
+        if self.format == 'msgpack':
+            return MSGPACK_MAGIC + self._msgpack_encode(obj)
+        return self.json_codec.dumps_bytes(obj)
+
+    def unpack(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """解碼 pack() 的輸出或 JSON 文字/位元組 (依標頭判斷)"""
+        if isinstance(data, str):
+            return self.json_codec.loads(data)
+        data = bytes(data)
+        if data.startswith(MSGPACK_MAGIC):
+            if self._msgpack_decode is None:
+                raise ValueError("內容為 msgpack 格式，但 msgspec 與 msgpack 皆未安裝")
+            return self._msgpack_decode(data[len(MSGPACK_MAGIC):])
+        return self.json_codec.loads(data)
+
+
+# 全局編碼器 (後端由環境變數選擇，預設自動)
+CODEC = JSONCodec(os.getenv('SERIALIZATION_BACKEND', 'auto'))
+BINARY = BinaryCodec(CODEC, os.getenv('PAYLOAD_FORMAT', 'msgpack'))
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """編碼為 JSON 文字"""
+    return CODEC.dumps(obj, indent)
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """編碼為 UTF-8 JSON 位元組"""
+    return CODEC.dumps_bytes(obj, indent)
+
+
+def loads(data: Union[bytes, bytearray, str]) -> Any:
+    """解碼 JSON 文字或位元組"""
+    return CODEC.loads(data)
+
+
+def pack(obj: Any) -> bytes:
+    """編碼快取/佇列內容 (msgpack 可用時為二進位，否則為精簡 JSON)"""
+    return BINARY.pack(obj)
+
+
+def unpack(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """解碼 pack() 的輸出，亦接受舊的 JSON 內容"""
+    return BINARY.unpack(data)
+
+
+def describe() -> Dict[str, Any]:
+    """目前使用的後端 (系統狀態用)"""
+    return {"json": CODEC.backend, "payload": BINARY.format, "available": available_json_backends(),
+            "msgpack_available": BINARY.msgpack_available}
@@ -0,0 +1,347 @@
+# HTTP 服務 - 以 aiohttp 提供分析、批次提交、工作狀態與系統狀態端點
+# 單一長駐協調器 (共用快取、CPU行程池與流水線工作池)；同步分析有界排隊，滿載時回 429；
+# 關閉時停止接收新請求、等待進行中的分析完成，佇列中未開始的工作留在持久化佇列由下次啟動接續
+#
+# 啟動:
+#   python service.py --port 8080
+#   gunicorn "service:create_app" --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:8080 --graceful-timeout 90
+#
+# 端點:
+#   POST /v1/analyze          {"ticker": "AAPL", "include_analysis": true, "async": false, "profile": "standard"}
+#   POST /v1/batches          {"tickers": ["AAPL", "MSFT"], "priority": 0, "batch_id": "可選"}
+#   GET  /v1/jobs/{job_id}    非同步分析與批次的狀態 (?results=1 一併回傳結果)
+#   GET  /v1/status           系統狀態 (處理統計、快取、延遲、佇列)
+#   GET  /healthz             存活檢查 (排空中回 503)
+#   GET  /metrics             OpenMetrics 指標
+
+import asyncio
+import logging
+import math
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Optional
+
+from aiohttp import web
+
+import bootstrap
+
+# .env 必須在匯入其他專案模組之前載入 (serialization、tracing 在匯入時讀取環境變數)
+bootstrap.load_environment()
+
+from cpu_pool import get_cpu_pool
+from job_queue import PRIORITY_BULK, PRIORITY_INTERACTIVE, get_job_queue
+from main import RESULT_PROFILES, YourPodsOrchestrator
+from metrics import REGISTRY
+from pipeline_engine import SCRAPE_CALLS_PER_TICKER, BatchPipeline, PipelineConfig, ensure_executor_threads
+from serialization import dumps, loads
+from symbol_master import flush_symbol_master
+
+logger = logging.getLogger('YourPods_Service')
+
+REGISTRY.describe('service_requests', 'HTTP requests handled by the service, by route and status.')
+
+
+class ServiceConfig:
+    """服務配置 (環境變數)"""
+
+    def __init__(self):
+        # 同時執行的同步分析數與等待名額，兩者皆滿時回 429
+        self.max_inflight = int(os.getenv('SERVICE_MAX_INFLIGHT', '8'))
+        self.max_queued = int(os.getenv('SERVICE_MAX_QUEUED', '32'))
+        self.request_timeout = float(os.getenv('SERVICE_REQUEST_TIMEOUT', '180'))
+
+        # 預設結果輸出模式 (API 回應預設不含原始頁面內容；非同步工作與批次結果也以此模式寫入佇列)
+        self.result_profile = os.getenv('SERVICE_RESULT_PROFILE', 'standard')
+
+        # 持久化佇列中待處理工作的上限 (非同步分析與批次提交的背壓)
+        self.max_pending_jobs = int(os.getenv('SERVICE_MAX_PENDING_JOBS', '20000'))
+        self.max_batch_tickers = int(os.getenv('SERVICE_MAX_BATCH_TICKERS', '10000'))
+
+        # 佇列工作者在沒有工作時的輪詢間隔 (其他行程提交的工作)，以及關閉時的排空等待上限
+        self.queue_poll_seconds = float(os.getenv('SERVICE_QUEUE_POLL_SECONDS', '2'))
+        self.drain_seconds = float(os.getenv('SERVICE_DRAIN_SECONDS', '60'))
+
+
+class AdmissionController:
+    """有界請求佇列：最多 max_inflight 個同時執行，另有 max_queued 個等待名額"""
+
+    def __init__(self, max_inflight: int, max_queued: int):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.inflight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def has_capacity(self) -> bool:
+        return self.inflight + self.waiting < self.max_inflight + self.max_queued
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """等待並佔用一個執行名額 (呼叫前先以 has_capacity 檢查)"""
+        self.waiting += 1
+        self._idle.clear()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+            if not self.inflight and not self.waiting:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """等待所有進行中與排隊中的請求完成"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class YourPodsService:
+    """服務狀態：協調器、請求准入、持久化佇列與背景佇列工作者"""
+
+    def __init__(self, config: Optional[ServiceConfig] = None):
+        self.config = config or ServiceConfig()
+        self.orchestrator = YourPodsOrchestrator(result_profile=self.config.result_profile)
+        self.job_queue = get_job_queue()
+        self.pipeline = BatchPipeline(self.orchestrator, PipelineConfig())
+        self.admission: Optional[AdmissionController] = None
+        self.draining = False
+        self._queue_task: Optional[asyncio.Future] = None
+        self._stop = None
+        self._wakeup = None
+
+    # === 生命週期 ===
+
+    async def start(self, app: web.Application):
+        # asyncio 物件需在服務的事件迴圈中建立
+        self.admission = AdmissionController(self.config.max_inflight, self.config.max_queued)
+        # 同步分析的SDK呼叫在預設執行緒池中執行，需容納所有進行中的分析 (背景流水線啟動時另行擴充)
+        ensure_executor_threads(self.config.max_inflight * (SCRAPE_CALLS_PER_TICKER + 1))
+        self._stop = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._queue_task = asyncio.ensure_future(self._run_queue_worker())
+        logger.info(f"🌐 YourPods 服務啟動 (同步分析上限 {self.config.max_inflight}+{self.config.max_queued} 排隊)")
+
+    async def drain(self, app: web.Application):
+        """優雅排空：拒絕新請求，等待同步分析與流水線中的工作完成"""
+        self.draining = True
+        self._stop.set()
+        self._wakeup.set()
+        logger.info("🛑 服務排空中，等待進行中的請求完成...")
+
+        if not await self.admission.drain(self.config.drain_seconds):
+            logger.warning(f"⚠️ 排空逾時 ({self.config.drain_seconds}s)，仍有 {self.admission.inflight} 個分析進行中")
+        try:
+            await asyncio.wait_for(asyncio.shield(self._queue_task), self.config.drain_seconds)
+        except asyncio.TimeoutError:
+            # 未完成的工作保留在佇列中 (執行中狀態於下次啟動時依持有行程判定為中斷並重新排入)
+            logger.warning("⚠️ 佇列工作者排空逾時，取消剩餘工作")
+            self._queue_task.cancel()
+
+    async def cleanup(self, app: web.Application):
+        get_cpu_pool().shutdown()
+        flush_symbol_master()
+        logger.info("👋 YourPods 服務已關閉")
+
+    async def _run_queue_worker(self):
+        """持續處理持久化佇列 (依優先度)，沒有工作時等待提交通知或輪詢 (閒置時 run_queue 不啟動工作池)"""
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            try:
+                await self.pipeline.run_queue(self.job_queue, stop=self._stop)
+            except Exception as e:
+                logger.error(f"❌ 佇列工作者錯誤: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.config.queue_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    # === 端點 ===
+
+    async def analyze(self, request: web.Request) -> web.Response:
+        body = await self._json_body(request)
+        ticker = str(body.get('ticker') or '').strip()
+        if not ticker or len(ticker) > 64:
+            raise web.HTTPBadRequest(text=dumps({"error": "需要 ticker (股票代碼或公司名稱)"}),
+                                     content_type='application/json')
+        include_analysis = bool(body.get('include_analysis', True))
+        profile = body.get('profile')
+        if profile is not None and profile not in RESULT_PROFILES:
+            raise web.HTTPBadRequest(text=dumps({"error": f"profile 需為 {', '.join(RESULT_PROFILES)} 之一"}),
+                                     content_type='application/json')
+
+        if body.get('async'):
+            self._check_queue_capacity(1)
+            # 選項隨工作存入佇列，背景流水線執行與寫入結果時套用 (與同步分析相同的輸出)
+            batch_id = self.job_queue.submit([ticker], priority=PRIORITY_INTERACTIVE,
+                                             batch_id=f"req-{uuid.uuid4().hex[:12]}",
+                                             options={"include_analysis": include_analysis, "profile": profile})
+            self._wakeup.set()
+            return self._accepted(batch_id)
+
+        if not self.admission.has_capacity():
+            raise self._too_many_requests("同步分析佇列已滿")
+
+        async with self.admission.slot():
+            try:
+                result = await asyncio.wait_for(
+                    self.orchestrator.process_stock_request(ticker, include_analysis, profile),
+                    self.config.request_timeout
+                )
+            except asyncio.TimeoutError:
+                raise web.HTTPGatewayTimeout(text=dumps({"error": f"分析逾時 ({self.config.request_timeout}s)"}),
+                                             content_type='application/json')
+
+        return web.json_response(result, status=200 if result.get('status') == 'success' else 422, dumps=dumps)
+
+    async def submit_batch(self, request: web.Request) -> web.Response:
+        body = await self._json_body(request)
+        tickers = body.get('tickers')
+        if (not isinstance(tickers, list) or not tickers
+                or not all(isinstance(t, str) and t.strip() for t in tickers)):
+            raise web.HTTPBadRequest(text=dumps({"error": "需要非空的 tickers 字串列表"}),
+                                     content_type='application/json')
+        if len(tickers) > self.config.max_batch_tickers:
+            raise web.HTTPRequestEntityTooLarge(
+                max_size=self.config.max_batch_tickers, actual_size=len(tickers),
+                text=dumps({"error": f"單一批次最多 {self.config.max_batch_tickers} 支"}),
+                content_type='application/json'
+            )
+
+        priority = body.get('priority', PRIORITY_BULK)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise web.HTTPBadRequest(text=dumps({"error": "priority 需為整數 (越大越優先)"}),
+                                     content_type='application/json')
+        batch_id = body.get('batch_id')
+        if batch_id is not None and (not isinstance(batch_id, str) or not batch_id.strip()):
+            raise web.HTTPBadRequest(text=dumps({"error": "batch_id 需為非空字串"}),
+                                     content_type='application/json')
+
+        self._check_queue_capacity(len(tickers))
+        try:
+            batch_id = self.job_queue.submit([t.strip() for t in tickers], priority=priority, batch_id=batch_id)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=dumps({"error": str(e)}), content_type='application/json')
+        self._wakeup.set()
+        return self._accepted(batch_id)
+
+    async def job_status(self, request: web.Request) -> web.Response:
+        job_id = request.match_info['job_id']
+        status = self.job_queue.batch_status(job_id)
+        if not status['total']:
+            raise web.HTTPNotFound(text=dumps({"error": f"找不到工作 {job_id}"}), content_type='application/json')
+
+        state = 'running' if status['pending'] + status['running'] else 'completed'
+        payload: Dict[str, Any] = {"job_id": job_id, "state": state, "counts": status}
+        if request.query.get('results') in ('1', 'true'):
+            payload["results"] = self.job_queue.batch_results(job_id)
+        elif status['total'] == 1 and state == 'completed':
+            payload["result"] = self.job_queue.batch_results(job_id)[0]
+        return web.json_response(payload, dumps=dumps)
+
+    async def system_status(self, request: web.Request) -> web.Response:
+        status = self.orchestrator.get_system_status()
+        status["service"] = {
+            "draining": self.draining,
+            "inflight": self.admission.inflight,
+            "queued": self.admission.waiting,
+            "max_inflight": self.config.max_inflight,
+            "max_queued": self.config.max_queued,
+            "pending_jobs": self.job_queue.pending_count()
+        }
+        return web.json_response(status, dumps=dumps)
+
+    async def health(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.json_response({"status": "draining"}, status=503)
+        return web.json_response({"status": "ok"})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=REGISTRY.render_openmetrics(),
+                            content_type='application/openmetrics-text', charset='utf-8')
+
+    # === 內部函數 ===
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """排空中拒絕新的分析請求，並記錄各路由的回應狀態"""
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else 'unknown'
+        if self.draining and request.method == 'POST':
+            REGISTRY.inc('service_requests', route=route, status='503')
+            raise web.HTTPServiceUnavailable(text=dumps({"error": "服務關閉中"}), content_type='application/json',
+                                             headers={"Retry-After": "30"})
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            REGISTRY.inc('service_requests', route=route, status=str(e.status))
+            raise
+        REGISTRY.inc('service_requests', route=route, status=str(response.status))
+        return response
+
+    async def _json_body(self, request: web.Request) -> Dict[str, Any]:
+        try:
+            body = await request.json(loads=loads)
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=dumps({"error": "請求內容需為 JSON 物件"}), content_type='application/json')
+        return body
+
+    def _check_queue_capacity(self, incoming: int):
+        if self.job_queue.pending_count() + incoming > self.config.max_pending_jobs:
+            raise self._too_many_requests("工作佇列已滿")
+
+    def _too_many_requests(self, reason: str) -> web.HTTPTooManyRequests:
+        # 以平均處理時間估計何時有空位
+        average = self.orchestrator.processing_stats.get('average_processing_time') or 5.0
+        return web.HTTPTooManyRequests(text=dumps({"error": reason}), content_type='application/json',
+                                       headers={"Retry-After": str(max(1, math.ceil(average)))})
+
+    def _accepted(self, batch_id: str) -> web.Response:
+        return web.json_response({"job_id": batch_id, "status_url": f"/v1/jobs/{batch_id}"},
+                                 status=202, dumps=dumps)
+
+
+async def create_app(service: Optional[YourPodsService] = None) -> web.Application:
+    """
+    建立 aiohttp 應用 (gunicorn 的 aiohttp.GunicornWebWorker 會呼叫此工廠)
+
+    每個工作行程一個長駐協調器；多個 gunicorn 工作行程共用同一個 SQLite 工作佇列
+    """
+    service = service or YourPodsService()
+    app = web.Application(middlewares=[service.middleware])
+    app['service'] = service
+
+    app.router.add_post('/v1/analyze', service.analyze)
+    app.router.add_post('/v1/batches', service.submit_batch)
+    app.router.add_get('/v1/jobs/{job_id}', service.job_status)
+    app.router.add_get('/v1/status', service.system_status)
+    app.router.add_get('/healthz', service.health)
+    app.router.add_get('/metrics', service.metrics)
+
+    app.on_startup.append(service.start)
+    app.on_shutdown.append(service.drain)
+    app.on_cleanup.append(service.cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="YourPods HTTP 服務")
+    parser.add_argument("--host", default=os.getenv('SERVICE_HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('SERVICE_PORT', '8080')))
+    args = parser.parse_args()
+
+    web.run_app(create_app(), host=args.host, port=args.port,
+                shutdown_timeout=ServiceConfig().drain_seconds)
@@ -0,0 +1,101 @@
+# 正規化的來源表 - structured_data 以單一 sources 表保存每個來源的內容，
+# 各分類只存來源ID與相關度，避免同一段內容與Rhea-AI資料在多個分類中重複序列化
+#
+# 格式 (schema_version 2):
+#   {"schema_version": 2,
+#    "sources": {"s1": {"content", "source", "timestamp", "quality_score", "ai_analysis"}, ...},
+#    "categories": {"price_data": [{"id": "s1", "score": 0.62}, ...], ...}}
+#
+# 讀取端一律透過 category_items()，舊格式 (各分類直接存內容列表) 同樣可讀
+
+from typing import Any, Dict, List
+
+SCHEMA_VERSION = 2
+
+CONTENT_SNIPPET_CHARS = 800
+
+# 分類與其關鍵字 (market_context 為沒有基本面關鍵字時的背景分類，沒有自己的關鍵字)
+CATEGORY_KEYWORDS = {
+    "price_data": ['price', 'trading', 'volume', 'market'],
+    "analyst_opinions": ['analyst', 'rating', 'target', 'upgrade', 'downgrade'],
+    "news_events": ['announce', 'report', 'release', 'launch'],
+    "company_fundamentals": ['earnings', 'revenue', 'profit', 'guidance'],
+    "market_context": []
+}
+
+CATEGORIES = tuple(CATEGORY_KEYWORDS)
+
+
+def build_source_table(raw_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    由階段2的原始來源建立正規化的 structured_data
+
+    分類規則與舊格式相同；相關度 = 來源品質分數 × (0.5 + 0.5 × 分類關鍵字命中比例)
+
+    Args:
+        raw_data: 階段2抓取結果 (只處理成功的來源)
+    """
+
+    sources: Dict[str, Dict[str, Any]] = {}
+    categories: Dict[str, List[Dict[str, Any]]] = {category: [] for category in CATEGORIES}
+
+    for source in raw_data:
+        if not source.get('success'):
+            continue
+
+        content = source.get('relevant_content', '')
+        lowered = content.lower()
+        source_id = f"s{len(sources) + 1}"
+        quality = source.get('quality_score', 0)
+        sources[source_id] = {
+            "content": content[:CONTENT_SNIPPET_CHARS],  # 限制長度
+            "source": source.get('url', ''),
+            "timestamp": source.get('timestamp', ''),
+            "quality_score": quality,
+            "ai_analysis": source.get('rhea_ai_analysis', {})
+        }
+
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            if keywords:
+                hits = sum(1 for keyword in keywords if keyword in lowered)
+                if not hits:
+                    continue
+                coverage = hits / len(keywords)
+            elif any(keyword in lowered for keyword in CATEGORY_KEYWORDS['company_fundamentals']):
+                # 背景分類只收沒有命中基本面關鍵字的內容
+                continue
+            else:
+                coverage = 0.0
+
+            categories[category].append({
+                "id": source_id,
+                "score": round(quality * (0.5 + 0.5 * coverage), 3)
+            })
+
+    return {"schema_version": SCHEMA_VERSION, "sources": sources, "categories": categories}
+
+
+def empty_source_table() -> Dict[str, Any]:
+    """沒有任何來源時的 structured_data"""
+    return {"schema_version": SCHEMA_VERSION, "sources": {},
+            "categories": {category: [] for category in CATEGORIES}}
+
+
+def category_items(structured_data: Dict[str, Any], category: str) -> List[Dict[str, Any]]:
+    """
+    相容存取：回傳分類中的內容項目 (與舊格式相同的 {"content", "source", ...} 字典)
+
+    新格式回傳 sources 表中的同一個物件 (不複製)；舊格式直接回傳該分類的列表
+    """
+
+    if 'categories' not in structured_data:
+        return structured_data.get(category, [])
+
+    sources = structured_data.get('sources', {})
+    return [sources[entry['id']] for entry in structured_data['categories'].get(category, [])
+            if entry['id'] in sources]
+
+
+def expand_structured_data(structured_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """展開為舊格式 (各分類直接存內容列表)，供仍依賴舊形狀的外部消費者使用"""
+    return {category: category_items(structured_data, category) for category in CATEGORIES}
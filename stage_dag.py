@@ -0,0 +1,134 @@
+# 階段內步驟的相依圖排程器 - 每個步驟在其輸入完成後立即開始，互不相依的步驟並行執行
+# 同步的阻塞步驟 (例如外部API呼叫) 交給執行緒池，避免卡住事件迴圈
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from typing import Dict, Any, Callable, List, Optional, Sequence
+
+from metrics import REGISTRY
+from tracing import TRACER
+
+logger = logging.getLogger('YourPods_StageDAG')
+
+
+class StageStep:
+    """相依圖中的一個步驟"""
+
+    def __init__(self, name: str, func: Callable[..., Any], depends_on: Sequence[str] = (),
+                 blocking: bool = False, span: Optional[str] = None):
+        """
+        Args:
+            name: 步驟名稱 (也是結果的鍵)
+            func: 以相依步驟的結果為關鍵字參數呼叫；可為協程函數
+            depends_on: 相依的步驟或初始輸入名稱
+            blocking: 同步且會阻塞的函數，在執行緒池中執行
+            span: 追蹤 span 名稱 (預設為步驟名稱)
+        """
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+        self.blocking = blocking
+        self.span = span or name
+
+
+class StageGraph:
+    """小型非同步DAG排程器"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.steps: Dict[str, StageStep] = {}
+
+    def add_step(self, name: str, func: Callable[..., Any], depends_on: Sequence[str] = (),
+                 blocking: bool = False, span: Optional[str] = None) -> 'StageGraph':
+        if name in self.steps:
+            raise ValueError(f"重複的步驟名稱: {name}")
+        self.steps[name] = StageStep(name, func, depends_on, blocking, span)
+        return self
+
+    def validate(self, inputs: Sequence[str] = ()) -> List[str]:
+        """檢查相依是否存在且無循環，回傳一個拓撲順序"""
+
+        available = set(inputs)
+        for step in self.steps.values():
+            missing = [d for d in step.depends_on if d not in self.steps and d not in available]
+            if missing:
+                raise ValueError(f"步驟 {step.name} 的相依不存在: {missing}")
+
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = 拜訪中, 2 = 完成
+
+        def visit(name: str):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"步驟相依形成循環: {name}")
+            state[name] = 1
+            for dependency in self.steps[name].depends_on:
+                if dependency in self.steps:
+                    visit(dependency)
+            state[name] = 2
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return order
+
+    async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        執行所有步驟
+
+        Args:
+            inputs: 初始輸入 (名稱 -> 值)
+
+        Returns:
+            初始輸入加上每個步驟的結果；任一步驟失敗時取消其餘步驟並拋出該例外
+        """
+
+        order = self.validate(inputs.keys())
+        results: Dict[str, Any] = dict(inputs)
+        tasks: Dict[str, asyncio.Future] = {}
+
+        async def run_step(step: StageStep) -> Any:
+            dependencies = [tasks[d] for d in step.depends_on if d in tasks]
+            if dependencies:
+                await asyncio.gather(*dependencies)
+            kwargs = {d: results[d] for d in step.depends_on}
+
+            with TRACER.span(step.span, graph=self.name):
+                start = time.perf_counter()
+                if step.blocking:
+                    loop = asyncio.get_event_loop()
+                    context = contextvars.copy_context()
+                    value = await loop.run_in_executor(
+                        None, functools.partial(context.run, step.func, **kwargs)
+                    )
+                else:
+                    value = step.func(**kwargs)
+                    if inspect.isawaitable(value):
+                        value = await value
+                REGISTRY.observe('dag_step_seconds', time.perf_counter() - start,
+                                 graph=self.name, step=step.name)
+
+            results[step.name] = value
+            return value
+
+        # 依拓撲順序建立任務，每個任務自行等待其相依
+        for name in order:
+            tasks[name] = asyncio.ensure_future(run_step(self.steps[name]))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return results
+
+
+REGISTRY.describe('dag_step_seconds', 'Wall time of each step in a stage dependency graph in seconds.')
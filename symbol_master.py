@@ -0,0 +1,312 @@
+# 股票代碼主檔 - 將 NASDAQ Trader 格式的上市清單 (nasdaqlisted.txt / otherlisted.txt) 載入記憶體雜湊索引，
+# 階段1的代碼驗證與公司名稱、交易所、行業查詢不需要網路；只有明確執行 refresh 時才下載清單
+#
+# 用法:
+#   python symbol_master.py --refresh                                  # 從 NASDAQ Trader 下載並更新主檔
+#   python symbol_master.py --import nasdaqlisted.txt otherlisted.txt  # 由已下載的清單建立主檔 (離線)
+#   python symbol_master.py --lookup AAPL BRK.B
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Iterable
+
+logger = logging.getLogger('YourPods_SymbolMaster')
+
+NASDAQ_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt'
+OTHER_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt'
+
+# otherlisted.txt 的交易所代碼
+EXCHANGE_CODES = {
+    'A': 'NYSE American',
+    'N': 'NYSE',
+    'P': 'NYSE Arca',
+    'Z': 'Cboe BZX',
+    'V': 'IEX'
+}
+
+# 主檔本身的欄位 (與上市清單相同的 | 分隔格式，多了學習到的行業)
+MASTER_HEADER = ['Symbol', 'Security Name', 'Exchange', 'ETF', 'Industry']
+FOOTER_PREFIX = 'File Creation Time'
+
+
+def normalize_symbol(symbol: str) -> str:
+    """
+    將代碼轉為索引鍵 (Yahoo 格式)：大寫，股份類別的 . 或 / 轉為 -，特別股的 $ 轉為 -P
+
+    例如 BRK.B、BRK/B → BRK-B；ABR$D → ABR-PD
+    """
+    cleaned = symbol.strip().upper()
+    return cleaned.replace('$', '-P').replace('.', '-').replace('/', '-')
+
+
+def company_name(security_name: str) -> str:
+    """由清單中的證券名稱取公司名稱 ("Apple Inc. - Common Stock" → "Apple Inc.")"""
+    return security_name.split(' - ')[0].strip()
+
+
+class SymbolRecord:
+    """主檔中的一支證券"""
+
+    __slots__ = ('symbol', 'name', 'exchange', 'etf', 'industry')
+
+    def __init__(self, symbol: str, name: str, exchange: str, etf: bool = False, industry: str = ''):
+        self.symbol = symbol
+        self.name = name
+        self.exchange = exchange
+        self.etf = etf
+        self.industry = industry
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "name": self.name,
+            "exchange": self.exchange,
+            "etf": self.etf,
+            "industry": self.industry
+        }
+
+
+def parse_listing(text: str) -> List[SymbolRecord]:
+    """
+    解析 | 分隔的上市清單，依標題列自動判斷格式：
+    nasdaqlisted.txt (Symbol|Security Name|Market Category|Test Issue|...)、
+    otherlisted.txt (ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|...)
+    或本模組寫出的主檔
+
+    測試代碼 (Test Issue = Y) 與結尾的 File Creation Time 列會略過
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return []
+
+    columns = {name.strip(): i for i, name in enumerate(lines[0].split('|'))}
+    if 'ACT Symbol' in columns:
+        symbol_column, listing = 'ACT Symbol', 'other'
+    elif 'Market Category' in columns:
+        symbol_column, listing = 'Symbol', 'nasdaq'
+    elif 'Symbol' in columns and 'Exchange' in columns:
+        symbol_column, listing = 'Symbol', 'master'
+    else:
+        raise ValueError(f"無法辨識的上市清單格式: {lines[0][:80]}")
+
+    def field(row: List[str], name: str) -> str:
+        index = columns.get(name)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    records = []
+    for line in lines[1:]:
+        if line.startswith(FOOTER_PREFIX):
+            continue
+        row = line.split('|')
+        symbol = field(row, symbol_column)
+        if not symbol or field(row, 'Test Issue') == 'Y':
+            continue
+
+        if listing == 'nasdaq':
+            exchange = 'NASDAQ'
+        elif listing == 'other':
+            code = field(row, 'Exchange')
+            exchange = EXCHANGE_CODES.get(code, code)
+        else:
+            exchange = field(row, 'Exchange')
+
+        name = field(row, 'Security Name')
+        records.append(SymbolRecord(
+            symbol=normalize_symbol(symbol),
+            name=name if listing == 'master' else company_name(name),
+            exchange=exchange,
+            etf=field(row, 'ETF') == 'Y',
+            industry=field(row, 'Industry')
+        ))
+    return records
+
+
+class SymbolMaster:
+    """代碼 → 證券資料的記憶體索引，查詢為 O(1) 且不使用網路"""
+
+    def __init__(self, path: str, save_interval: float = 300.0):
+        """
+        Args:
+            path: 主檔路徑
+            save_interval: 由行情資料補上的行業，至少間隔多少秒才寫回主檔
+        """
+        self.path = path
+        self.save_interval = save_interval
+        self._index: Dict[str, SymbolRecord] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        self.loaded_at: Optional[float] = None
+        # 每次重建索引遞增，衍生索引 (公司名稱索引) 據此判斷是否需要重建
+        self.version = 0
+
+    @property
+    def available(self) -> bool:
+        """主檔已載入 (未載入時呼叫端應改用網路驗證)"""
+        return bool(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, symbol: str) -> bool:
+        return normalize_symbol(symbol) in self._index
+
+    def lookup(self, symbol: str) -> Optional[SymbolRecord]:
+        """查詢代碼 (接受 BRK.B / BRK-B / brk/b 等寫法)"""
+        return self._index.get(normalize_symbol(symbol))
+
+    def records(self) -> List[SymbolRecord]:
+        return list(self._index.values())
+
+    def load(self) -> int:
+        """
+        載入主檔，檔案不存在時索引為空
+
+        Returns:
+            載入的代碼數
+        """
+        if not os.path.exists(self.path):
+            logger.warning(f"⚠️ 找不到代碼主檔 {self.path}，階段1將改用網路驗證 "
+                           f"(執行 python symbol_master.py --refresh 建立)")
+            return 0
+
+        start = time.perf_counter()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            records = parse_listing(f.read())
+        self._replace(records, keep_industries=False)
+        self.loaded_at = time.time()
+        logger.info(f"📇 載入代碼主檔 {len(self._index)} 筆 ({(time.perf_counter() - start) * 1000:.0f}ms)")
+        return len(self._index)
+
+    def _replace(self, records: Iterable[SymbolRecord], keep_industries: bool = True):
+        """以新的清單取代索引；keep_industries 時保留舊索引中學習到的行業"""
+        index = {}
+        for record in records:
+            # 同一代碼重複出現時保留第一筆 (nasdaqlisted 先於 otherlisted)
+            if record.symbol in index:
+                continue
+            if keep_industries and not record.industry:
+                previous = self._index.get(record.symbol)
+                if previous is not None:
+                    record.industry = previous.industry
+            index[record.symbol] = record
+        with self._lock:
+            self._index = index
+            self.version += 1
+
+    def import_listings(self, texts: Iterable[str], save: bool = True) -> int:
+        """由上市清單內容重建索引 (save 時寫回主檔)，回傳代碼數"""
+        records = []
+        for text in texts:
+            records.extend(parse_listing(text))
+        if not records:
+            raise ValueError("上市清單沒有任何代碼")
+        self._replace(records)
+        if save:
+            self.save()
+        return len(self._index)
+
+    def refresh(self, urls: Optional[List[str]] = None, timeout: float = 30.0) -> int:
+        """
+        從 NASDAQ Trader 下載上市清單並更新主檔 (只在明確要求時呼叫)
+
+        Returns:
+            更新後的代碼數
+        """
+        from urllib.request import urlopen
+
+        texts = []
+        for url in urls or [NASDAQ_LISTED_URL, OTHER_LISTED_URL]:
+            with urlopen(url, timeout=timeout) as response:
+                texts.append(response.read().decode('utf-8', errors='replace'))
+        count = self.import_listings(texts)
+        logger.info(f"🔄 代碼主檔已更新: {count} 筆")
+        return count
+
+    def enrich(self, symbol: str, industry: str):
+        """補上主檔缺少的行業 (取自行情資料)，依 save_interval 批次寫回"""
+        record = self.lookup(symbol)
+        if record is None or not industry or record.industry == industry:
+            return
+        record.industry = industry
+        self._dirty = True
+        if time.time() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """將索引寫回主檔 (先寫暫存檔再取代，讀取端不會看到寫到一半的檔案)"""
+        with self._lock:
+            records = list(self._index.values())
+            self._dirty = False
+            self._last_save = time.time()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('|'.join(MASTER_HEADER) + '\n')
+            for record in records:
+                f.write('|'.join([record.symbol, record.name, record.exchange,
+                                  'Y' if record.etf else 'N', record.industry]) + '\n')
+            f.write(f"{FOOTER_PREFIX}: {time.strftime('%m%d%Y%H:%M')}\n")
+        os.replace(tmp_path, self.path)
+
+    def flush(self):
+        """有未寫回的行業時寫回主檔"""
+        if self._dirty:
+            self.save()
+
+
+# 全局實例
+_master_instance = None
+_master_lock = threading.Lock()
+
+
+def get_symbol_master() -> SymbolMaster:
+    """取得共用的代碼主檔 (路徑預設讀取環境變數 SYMBOL_MASTER_PATH，第一次呼叫時載入)"""
+    global _master_instance
+
+    with _master_lock:
+        if _master_instance is None:
+            cache_dir = os.getenv('YOURPODS_CACHE_DIR', '.yourpods_cache')
+            _master_instance = SymbolMaster(
+                os.getenv('SYMBOL_MASTER_PATH') or os.path.join(cache_dir, 'symbol_master.txt')
+            )
+            _master_instance.load()
+
+    return _master_instance
+
+
+def flush_symbol_master():
+    """結束時寫回尚未存檔的行業 (主檔未曾載入時不做任何事)"""
+    if _master_instance is not None:
+        _master_instance.flush()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='股票代碼主檔')
+    parser.add_argument('--refresh', action='store_true', help='從 NASDAQ Trader 下載上市清單並更新主檔')
+    parser.add_argument('--import', dest='import_files', nargs='+', metavar='PATH',
+                        help='由已下載的 nasdaqlisted.txt / otherlisted.txt 建立主檔')
+    parser.add_argument('--lookup', nargs='+', metavar='SYMBOL', help='查詢代碼')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    master = get_symbol_master()
+
+    if args.refresh:
+        master.refresh()
+    if args.import_files:
+        contents = []
+        for path in args.import_files:
+            with open(path, 'r', encoding='utf-8') as f:
+                contents.append(f.read())
+        print(f"✅ 已匯入 {master.import_listings(contents)} 個代碼 → {master.path}")
+    for symbol in args.lookup or []:
+        record = master.lookup(symbol)
+        print(f"{symbol}: {record.to_dict() if record else '不在主檔中'}")
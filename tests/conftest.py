@@ -0,0 +1,6 @@
+# 測試共用設定 - 專案模組位於上層目錄 (直接執行 pytest tests/ 時也能匯入)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
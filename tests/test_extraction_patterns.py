@@ -0,0 +1,100 @@
+# 擷取規則等價性測試 - KeywordTailPattern 與 PERCENT_CHANGE 的結果必須與取代的舊版正則完全相同
+
+import random
+import re
+
+import pytest
+
+from extraction_patterns import GEMINI_PATTERNS, PERCENT_CHANGE, KeywordTailPattern
+
+LEGACY_PERCENT = re.compile(r'(\d+\.?\d*%|\+\d+\.?\d*%|-\d+\.?\d*%)')
+LEGACY_ANALYST = re.compile(r'分析師[^。]*([^。]{30,150})')
+
+TAIL_RULES = ["comparison", "bull", "bear", "outlook", "analyst"]
+
+PERCENT_CORPUS = [
+    '', '%', '5%', '股價上漲 5%', '股價上漲 5.2% 至新高', '+3.5%', '-12%', '漲幅 +0.8%，跌幅 -1.25%',
+    '12.%', '1.2.3%', '+-5%', '-+5%', '5+3%', '1-2%', 'a12%', '12a%', '3 %', '.5%', '0.5%',
+    '1' * 300, '1' * 300 + '%', ('9' * 50 + ' ') * 6, '營收 1234567 億，成長 15%。', '100%%', '++1%', '--1%',
+]
+
+
+def _legacy_tail(rule: str):
+    if rule == 'analyst':
+        return LEGACY_ANALYST
+    return re.compile(GEMINI_PATTERNS[rule][1].legacy)
+
+
+def _groups(match):
+    """匹配的各組 (起點, 終點, 內容)；re.Match 與 TailMatch 超出組數時皆拋出 IndexError"""
+    if match is None:
+        return None
+    spans = []
+    index = 0
+    while True:
+        try:
+            spans.append((match.start(index), match.end(index), match.group(index)))
+        except IndexError:
+            return spans
+        index += 1
+
+
+def _tail_corpus(keywords):
+    keyword = keywords[0]
+    other = keywords[-1]
+    filler = '營收成長優於預期且毛利率提升'
+    return [
+        '',
+        keyword,
+        # 句段不足最短長度
+        keyword + '好' * 20 + '。',
+        # 剛好達到最短長度
+        keyword + 'x' * 50 + '。',
+        keyword + 'x' * 49 + '。' + keyword + 'y' * 60 + '。',
+        # 沒有句尾「。」(匹配到文末)
+        keyword + filler * 10,
+        '前言。' + keyword + filler * 3,
+        # 關鍵字重複出現，且在同一句段內
+        (keyword + 'x' * 8) * 40,
+        (keyword + '好' * 40 + '。') * 10 + keyword + '好' * 60,
+        keyword + other + 'x' * 60 + '。',
+        other + '。' + keyword + 'x' * 70 + '。後記',
+        # 超過最長長度的句段
+        keyword + 'z' * 500 + '。',
+        '換行\n' + keyword + '\n' * 80 + '。',
+        keyword + '。' * 5 + keyword + 'x' * 55,
+    ]
+
+
+@pytest.mark.parametrize('text', PERCENT_CORPUS)
+def test_percent_change_matches_legacy(text):
+    assert _groups(PERCENT_CHANGE.search(text)) == _groups(LEGACY_PERCENT.search(text))
+    assert PERCENT_CHANGE.findall(text) == LEGACY_PERCENT.findall(text)
+
+
+def test_percent_change_matches_legacy_random():
+    rng = random.Random(36)
+    for _ in range(3000):
+        text = ''.join(rng.choice('0123456789.%+- a') for _ in range(rng.randint(0, 20)))
+        assert PERCENT_CHANGE.findall(text) == LEGACY_PERCENT.findall(text), text
+
+
+@pytest.mark.parametrize('rule', TAIL_RULES)
+def test_gemini_tail_patterns_match_legacy(rule):
+    keywords, pattern = GEMINI_PATTERNS[rule]
+    legacy = _legacy_tail(rule)
+    for text in _tail_corpus(keywords):
+        for pos in (0, 1, len(text) // 2):
+            assert _groups(pattern.search(text, pos)) == _groups(legacy.search(text, pos)), (rule, text, pos)
+
+
+@pytest.mark.parametrize('keywords', [['ab', 'a'], ['a', 'ab'], ['b', 'ab', 'x']])
+def test_keyword_tail_pattern_matches_legacy_random(keywords):
+    # 較短的句尾長度與小字母表，讓重疊的關鍵字、句尾與文末的各種組合都會出現
+    pattern = KeywordTailPattern(keywords, 3, 6)
+    legacy = re.compile(pattern.legacy)
+    rng = random.Random(''.join(keywords))
+    for _ in range(3000):
+        text = ''.join(rng.choice('abx。') for _ in range(rng.randint(0, 24)))
+        pos = rng.randint(0, len(text))
+        assert _groups(pattern.search(text, pos)) == _groups(legacy.search(text, pos)), (text, pos)
@@ -0,0 +1,19 @@
+# 啟動匯入測試 - 匯入 main 不應載入服務商 SDK (第一次呼叫服務商時才載入；耗時預算見 benchmarks/import_time.py)
+
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import DEFERRED_MODULES, ROOT
+
+
+def test_importing_main_defers_provider_sdks():
+    completed = subprocess.run(
+        [sys.executable, '-c', 'import json, sys; import main; print(json.dumps(sorted(sys.modules)))'],
+        cwd=ROOT, env=dict(os.environ), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=60
+    )
+    assert completed.returncode == 0, completed.stderr
+    loaded = set(json.loads(completed.stdout.strip().splitlines()[-1]))
+    assert 'pipeline_engine' in loaded
+    assert [name for name in DEFERRED_MODULES if name in loaded] == []
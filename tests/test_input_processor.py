@@ -0,0 +1,87 @@
+# 階段1 輸入處理測試 - 以本地代碼主檔驗證代碼、解析公司名稱，模稜兩可與不存在的輸入不猜測
+
+import asyncio
+import os
+import time
+
+import pytest
+
+import name_index
+import symbol_master
+from input_processor import InputProcessor
+from symbol_master import SymbolMaster
+
+LISTING = '\n'.join([
+    'Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares',
+    'AAPL|Apple Inc. - Common Stock|Q|N|N|100|N|N',
+    'MSFT|Microsoft Corporation - Common Stock|Q|N|N|100|N|N',
+    'GOOGL|Alphabet Inc. - Class A Common Stock|Q|N|N|100|N|N',
+    'GOOG|Alphabet Inc. - Class C Capital Stock|Q|N|N|100|N|N',
+    'NTAP|NetApp, Inc. - Common Stock|Q|N|N|100|N|N',
+    'NTES|NetEase, Inc. - American Depositary Shares|Q|N|N|100|N|N',
+    'BRK.B|Berkshire Hathaway Inc.|Q|N|N|100|N|N',
+    'File Creation Time: 0101202600:00||||||'
+])
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    master = SymbolMaster(str(tmp_path / 'symbol_master.txt'))
+    master.import_listings([LISTING], save=False)
+    monkeypatch.setattr(symbol_master, '_master_instance', master)
+    monkeypatch.setattr(name_index, '_index_instance', None)
+    return InputProcessor(fetch_prices=False)
+
+
+def _process(processor: InputProcessor, user_input: str):
+    return asyncio.run(processor.process(user_input))
+
+
+def test_valid_ticker_uses_symbol_master(processor):
+    result = _process(processor, 'aapl')
+    assert result["status"] == "valid"
+    assert result["standardized_ticker"] == "AAPL"
+    assert result["company_name"] == "Apple Inc."
+    assert result["exchange"] == "NASDAQ"
+    assert result["current_price"] is None
+
+
+def test_company_names_and_typos_resolve_locally(processor):
+    assert _process(processor, 'Microsft')["standardized_ticker"] == "MSFT"
+    assert _process(processor, 'google')["standardized_ticker"] == "GOOGL"
+    assert _process(processor, 'brk.b')["standardized_ticker"] == "BRK-B"
+
+
+def test_ambiguous_input_returns_candidates(processor):
+    result = _process(processor, 'NET')
+    assert result["status"] == "ambiguous"
+    assert {c["symbol"] for c in result["candidates"]} == {"NTAP", "NTES"}
+
+
+def test_unknown_ticker_is_invalid_without_network(processor, monkeypatch):
+    async def no_network(ticker):
+        raise AssertionError("主檔已載入時不應連網")
+
+    monkeypatch.setattr(processor, '_fetch_stock_info', no_network)
+    result = _process(processor, 'ZZZZ')
+    assert result["status"] == "invalid"
+    assert result["standardized_ticker"] == "ZZZZ"
+
+
+def test_learned_industry_is_written_on_flush(processor, monkeypatch):
+    async def stock_info(ticker):
+        return {"regularMarketPrice": 190.5, "currency": "USD", "industry": "Consumer Electronics"}
+
+    master = symbol_master.get_symbol_master()
+    master._last_save = time.time()  # 在存檔間隔內：只標記，不立即寫回
+    processor.fetch_prices = True
+    monkeypatch.setattr(processor, '_fetch_stock_info', stock_info)
+
+    result = _process(processor, 'AAPL')
+    assert result["industry"] == "Consumer Electronics"
+    assert not os.path.exists(master.path)
+
+    symbol_master.flush_symbol_master()
+    reloaded = SymbolMaster(master.path)
+    reloaded.load()
+    assert reloaded.lookup('AAPL').industry == "Consumer Electronics"
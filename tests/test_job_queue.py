@@ -0,0 +1,110 @@
+# 持久化工作佇列測試 - 續跑、優先度與中斷工作的重新排入
+
+import socket
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+@pytest.fixture
+def queue(tmp_path):
+    jobs = JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=60)
+    yield jobs
+    jobs.close()
+
+
+def _run_all(jobs: JobQueue, batch_id: str):
+    """取出並完成批次中所有待處理的工作，回傳處理順序"""
+    order = []
+    while True:
+        job = jobs.claim(batch_id)
+        if job is None:
+            return order
+        order.append(job.ticker)
+        jobs.complete(job.id, {"status": "success", "ticker": job.ticker})
+
+
+def test_resubmit_resumes_without_redoing_finished_jobs(queue, monkeypatch):
+    batch_id = queue.submit(['AAPL', 'MSFT', 'NVDA'], batch_id='nightly')
+    job = queue.claim(batch_id)
+    queue.checkpoint(job.id, 'stage2', {"articles": 3})
+    queue.complete(job.id, {"status": "success", "ticker": job.ticker})
+    interrupted = queue.claim(batch_id)
+    queue.checkpoint(interrupted.id, 'stage2', {"articles": 5})
+
+    # 崩潰重啟 (同主機同PID，新的行程代號) 後以相同的 batch_id 重新提交，多加一支
+    monkeypatch.setattr(job_queue, 'PROCESS_TOKEN', 'restarted')
+    reopened = JobQueue(queue.path, lease_seconds=60)
+    try:
+        assert reopened.submit(['AAPL', 'MSFT', 'NVDA', 'AMD'], batch_id='nightly') == 'nightly'
+        assert reopened.batch_status('nightly')['total'] == 4
+        # 中斷的工作 (持有行程已重啟) 重新排入，保留檢查點
+        assert reopened.requeue_stale() == 1
+        resumed = reopened.claim('nightly')
+        assert resumed.ticker == 'MSFT'
+        assert resumed.checkpoints == {'stage2': {"articles": 5}}
+        reopened.complete(resumed.id, {"status": "success", "ticker": resumed.ticker})
+        assert _run_all(reopened, 'nightly') == ['NVDA', 'AMD']
+        assert [r['ticker'] for r in reopened.batch_results('nightly')] == ['AAPL', 'MSFT', 'NVDA', 'AMD']
+    finally:
+        reopened.close()
+
+
+def test_duplicate_tickers_are_rejected(queue):
+    with pytest.raises(ValueError, match='AAPL'):
+        queue.submit(['AAPL', 'MSFT', 'AAPL'], batch_id='dup')
+    assert queue.batch_status('dup')['total'] == 0
+
+
+def test_interactive_jobs_jump_ahead_of_bulk(queue):
+    bulk = queue.submit(['A', 'B', 'C'], priority=PRIORITY_BULK)
+    first = queue.claim()
+    assert first.ticker == 'A'
+    queue.submit(['URGENT'], priority=PRIORITY_INTERACTIVE)
+    assert queue.claim().ticker == 'URGENT'
+    # 同優先度依提交順序
+    assert queue.claim().ticker == 'B'
+    assert queue.claim(bulk).ticker == 'C'
+    assert queue.claim() is None
+
+
+def test_requeue_stale_owners(queue, monkeypatch):
+    queue.submit(['LIVE', 'EXPIRED', 'RESTARTED', 'GONE', 'REMOTE'], batch_id='stale')
+    jobs = {}
+    for _ in range(5):
+        job = queue.claim('stale')
+        jobs[job.ticker] = job.id
+
+    hostname = socket.gethostname()
+    owners = {
+        # 本行程持有且租約有效
+        'LIVE': (queue.owner, time.time() + 60),
+        'EXPIRED': (f"other-host:1:{'0' * 12}", time.time() - 1),
+        # 同主機同PID但行程代號不同 (容器重啟後的 PID 1)
+        'RESTARTED': (f"{hostname}:{job_queue.os.getpid()}:{'f' * 12}", time.time() + 60),
+        'GONE': (f"{hostname}:999999999:{'e' * 12}", time.time() + 60),
+        # 其他主機的工作租約未過期前不動
+        'REMOTE': (f"other-host:1:{'0' * 12}", time.time() + 60),
+    }
+    with queue._conn:
+        for ticker, (owner, lease_until) in owners.items():
+            queue._conn.execute('UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ?',
+                                (owner, lease_until, jobs[ticker]))
+
+    assert queue.requeue_stale() == 3
+    status = {row['ticker']: row['status'] for row in queue._conn.execute(
+        "SELECT ticker, status FROM jobs WHERE batch_id = 'stale'")}
+    assert status == {'LIVE': 'running', 'EXPIRED': 'pending', 'RESTARTED': 'pending',
+                      'GONE': 'pending', 'REMOTE': 'running'}
+
+
+def test_owner_is_dead_formats():
+    hostname = 'host-a'
+    pid = job_queue.os.getpid()
+    assert job_queue._owner_is_dead(None, hostname)
+    assert not job_queue._owner_is_dead(f"{hostname}:{pid}:{job_queue.PROCESS_TOKEN}", hostname)
+    assert job_queue._owner_is_dead(f"{hostname}:{pid}:another", hostname)
+    assert not job_queue._owner_is_dead(f"host-b:{pid}:another", hostname)
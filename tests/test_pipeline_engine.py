@@ -0,0 +1,68 @@
+# 流水線引擎測試 - 預設執行緒池的擴充與持久化佇列的閒置、單筆選項
+
+import asyncio
+
+import pytest
+
+from job_queue import JobQueue
+from pipeline_engine import BatchPipeline, PipelineConfig, ensure_executor_threads
+
+
+def test_executor_is_replaced_only_when_growing():
+    async def scenario():
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, lambda: None)
+        original = loop._default_executor
+
+        ensure_executor_threads(64)
+        grown = loop._default_executor
+        assert grown is not original
+        with pytest.raises(RuntimeError):
+            original.submit(lambda: None)
+
+        ensure_executor_threads(64)
+        ensure_executor_threads(8)
+        assert loop._default_executor is grown
+
+        ensure_executor_threads(96)
+        assert loop._default_executor is not grown
+        with pytest.raises(RuntimeError):
+            grown.submit(lambda: None)
+        assert await loop.run_in_executor(None, lambda: 42) == 42
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def queue(tmp_path):
+    jobs = JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=60)
+    yield jobs
+    jobs.close()
+
+
+def test_idle_queue_does_not_start_the_pipeline(queue, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise AssertionError("佇列閒置時不應啟動工作池")
+
+    pipeline = BatchPipeline(orchestrator=None, config=PipelineConfig())
+    monkeypatch.setattr(pipeline, '_execute', fail)
+    assert asyncio.run(pipeline.run_queue(queue)) == 0
+
+    queue.submit(['AAPL'], batch_id='done')
+    queue.complete(queue.claim().id, {"status": "success"})
+    assert asyncio.run(pipeline.run_queue(queue)) == 0
+
+
+def test_job_options_reach_the_pipeline(queue, monkeypatch):
+    queue.submit(['AAPL'], batch_id='req', options={"include_analysis": False, "profile": "summary"})
+    seen = []
+
+    async def execute(feed, collect, total=None):
+        async def enqueue(job, position):
+            seen.append((job.stock_input, job.include_analysis, job.profile))
+        await feed(enqueue)
+
+    pipeline = BatchPipeline(orchestrator=None, config=PipelineConfig())
+    monkeypatch.setattr(pipeline, '_execute', execute)
+    asyncio.run(pipeline.run_queue(queue))
+    assert seen == [('AAPL', False, 'summary')]
@@ -0,0 +1,66 @@
+# 序列化層測試 - msgpack 內容的往返、標頭辨識與舊 JSON 資料的相容
+
+import logging
+
+import pytest
+
+import serialization
+from serialization import BinaryCodec, JSONCodec, MSGPACK_MAGIC
+
+PAYLOAD = {
+    "ticker": "AAPL",
+    "summary": "營收成長 5.2%",
+    "scores": [1, 2.5, None, True],
+    "nested": {"sources": [{"title": "Q3", "count": 3}]}
+}
+
+
+@pytest.fixture
+def msgpack_codec():
+    codec = BinaryCodec(JSONCodec('stdlib'), 'msgpack')
+    if not codec.msgpack_available:
+        pytest.skip('msgspec 與 msgpack 皆未安裝')
+    return codec
+
+
+def test_msgpack_round_trip(msgpack_codec):
+    data = msgpack_codec.pack(PAYLOAD)
+    assert data.startswith(MSGPACK_MAGIC)
+    assert msgpack_codec.unpack(data) == PAYLOAD
+    # SQLite BLOB 讀回時可能是 memoryview
+    assert msgpack_codec.unpack(memoryview(data)) == PAYLOAD
+
+
+def test_msgpack_codec_reads_legacy_json(msgpack_codec):
+    legacy = JSONCodec('stdlib').dumps(PAYLOAD)
+    assert msgpack_codec.unpack(legacy) == PAYLOAD
+    assert msgpack_codec.unpack(legacy.encode('utf-8')) == PAYLOAD
+
+
+def test_unserializable_values_become_strings(msgpack_codec):
+    value = object()
+    assert msgpack_codec.unpack(msgpack_codec.pack({"value": value})) == {"value": str(value)}
+
+
+def test_json_format_round_trip():
+    codec = BinaryCodec(JSONCodec('stdlib'), 'json')
+    data = codec.pack(PAYLOAD)
+    assert not data.startswith(MSGPACK_MAGIC)
+    assert codec.unpack(data) == PAYLOAD
+
+
+def test_missing_msgpack_falls_back_to_json_with_warning(monkeypatch, caplog):
+    monkeypatch.setattr(serialization, 'msgspec', None)
+    monkeypatch.setattr(serialization, 'msgpack', None)
+    with caplog.at_level(logging.WARNING, logger='YourPods_Serialization'):
+        codec = BinaryCodec(JSONCodec('stdlib'), 'msgpack')
+    assert codec.format == 'json'
+    assert 'PAYLOAD_FORMAT=msgpack' in caplog.text
+    assert codec.unpack(codec.pack(PAYLOAD)) == PAYLOAD
+    with pytest.raises(ValueError):
+        codec.unpack(MSGPACK_MAGIC + b'\x80')
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        BinaryCodec(JSONCodec('stdlib'), 'pickle')
@@ -0,0 +1,125 @@
+# 文字處理工具 - 分詞、Token估算、SimHash 近似重複偵測
+# 供資訊收集與內容分析階段共用
+
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+# 英數字詞 (含 $AAPL、BRK.B 這類代碼) 與中日韓文字
+WORD_PATTERN = re.compile(r'[a-z0-9$][a-z0-9$.\-]*[a-z0-9]|[a-z0-9]')
+CJK_PATTERN = re.compile(r'[㐀-鿿豈-﫿]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """分詞：英文轉小寫取詞，中文取相鄰雙字 (bigram)"""
+
+    if not text:
+        return []
+
+    lowered = text.lower()
+    tokens = WORD_PATTERN.findall(lowered)
+
+    for run in CJK_PATTERN.findall(lowered):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估LLM Token數：中文約每字1個Token，其餘約每4字元1個Token"""
+
+    if not text:
+        return 0
+
+    cjk_chars = sum(len(run) for run in CJK_PATTERN.findall(text))
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
+
+
+def normalize_text(text: str) -> str:
+    """正規化文字 (小寫、合併空白、移除Markdown符號)，用於精確比對"""
+    text = re.sub(r'[*_#>`\[\]()]', ' ', text.lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def simhash(text: str, bits: int = 64) -> int:
+    """計算文字的SimHash指紋 (以相鄰詞組為特徵)"""
+
+    tokens = tokenize(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return 0
+
+    weights = [0] * bits
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=bits // 8).digest()
+        value = int.from_bytes(digest, 'big')
+        for i in range(bits):
+            weights[i] += 1 if value >> i & 1 else -1
+
+    fingerprint = 0
+    for i, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """兩個指紋之間的漢明距離"""
+    return bin(a ^ b).count('1')
+
+
+class ParagraphDeduplicator:
+    """近似重複段落偵測 - SimHash + 分段索引 (漢明距離 ≤ max_distance 視為重複)"""
+
+    def __init__(self, max_distance: int = 6, bits: int = 64, min_length: int = 40):
+        """
+        Args:
+            max_distance: 判定為重複的最大漢明距離 (段落層級的改寫、加註通常落在4-7之間)
+            bits: 指紋位元數
+            min_length: 短於此長度的段落只做精確比對 (SimHash在短文字上誤判率高)
+        """
+        self.max_distance = max_distance
+        self.bits = bits
+        self.min_length = min_length
+
+        # 鴿籠原理：距離 ≤ k 的兩個指紋，在 k+1 個分段中至少有一段完全相同
+        self.bands = max_distance + 1
+        self.band_width = bits // self.bands
+        self._band_index: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+        self._exact: set = set()
+
+    def add(self, paragraph: str) -> bool:
+        """加入段落；若與已加入的段落近似重複則回傳 False"""
+
+        normalized = normalize_text(paragraph)
+        if not normalized:
+            return True
+
+        if normalized in self._exact:
+            return False
+
+        fingerprint = None
+        if len(normalized) >= self.min_length:
+            fingerprint = simhash(normalized, self.bits)
+            if self._find_near(fingerprint) is not None:
+                return False
+
+        self._exact.add(normalized)
+        if fingerprint is not None:
+            for band, key in enumerate(self._band_keys(fingerprint)):
+                self._band_index[band].setdefault(key, []).append(fingerprint)
+        return True
+
+    def _find_near(self, fingerprint: int) -> Optional[int]:
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for candidate in self._band_index[band].get(key, []):
+                if hamming_distance(candidate, fingerprint) <= self.max_distance:
+                    return candidate
+        return None
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self.band_width) - 1
+        return [(fingerprint >> (band * self.band_width)) & mask for band in range(self.bands)]
@@ -0,0 +1,270 @@
+# 結構化追蹤 - 每個請求一條 trace，各階段/各外部呼叫為 span
+# 以 contextvars 傳遞目前的 span (asyncio.gather 產生的子任務會繼承)，
+# 匯出為 OTLP 相容的 JSON Lines，並產生關鍵路徑瀑布圖摘要
+
+import contextvars
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+from serialization import dumps
+
+logger = logging.getLogger('YourPods_Tracing')
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('yourpods_current_span', default=None)
+
+
+class Span:
+    """追蹤區段"""
+
+    def __init__(self, trace: 'Trace', name: str, parent: Optional['Span'] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP/JSON 形狀的 span"""
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+
+
+class _NullSpan:
+    """沒有進行中的 trace 時使用的空 span"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes: Any):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """一個請求的所有 span"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = secrets.token_hex(16)
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+        self.root = self.new_span(name, None, attributes)
+
+    def new_span(self, name: str, parent: Optional[Span],
+                 attributes: Optional[Dict[str, Any]] = None) -> Span:
+        span = Span(self, name, parent, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def waterfall(self) -> List[Dict[str, Any]]:
+        """依開始時間排列的瀑布圖 (相對於 trace 起點的毫秒數與層級)"""
+
+        depth = {self.root.span_id: 0}
+        by_start = sorted(self.spans, key=lambda s: s.start_ns)
+        rows = []
+        for span in by_start:
+            level = depth.get(span.parent_id, -1) + 1 if span.parent_id else 0
+            depth[span.span_id] = level
+            rows.append({
+                "name": span.name,
+                "depth": level,
+                "start_offset_ms": round((span.start_ns - self.root.start_ns) / 1e6, 1),
+                "duration_ms": round(span.duration_ms, 1),
+                **({"error": span.error} if span.error else {})
+            })
+        return rows
+
+    def critical_path(self) -> List[Dict[str, Any]]:
+        """
+        關鍵路徑：在每一層從最晚結束的子 span 往回串接
+        (每次取在前一段開始前結束、且最晚結束者)，再遞迴進入路徑上的 span
+        """
+
+        children: Dict[str, List[Span]] = {}
+        for span in self.spans:
+            if span.parent_id:
+                children.setdefault(span.parent_id, []).append(span)
+
+        def end_of(span: Span) -> int:
+            return span.end_ns or time.time_ns()
+
+        def chain(parent: Span, depth: int) -> List[Dict[str, Any]]:
+            remaining = children.get(parent.span_id, [])
+            sequence = []
+            boundary = end_of(parent)
+            while True:
+                candidates = [s for s in remaining if end_of(s) <= boundary]
+                if not candidates:
+                    break
+                last = max(candidates, key=end_of)
+                sequence.append(last)
+                boundary = last.start_ns
+
+            path = []
+            for span in reversed(sequence):
+                path.append({
+                    "name": span.name,
+                    "depth": depth,
+                    "duration_ms": round(span.duration_ms, 1),
+                    "share": round(span.duration_ms / self.root.duration_ms, 3) if self.root.duration_ms else 0.0
+                })
+                path.extend(chain(span, depth + 1))
+            return path
+
+        return chain(self.root, 1)
+
+    def summary(self) -> Dict[str, Any]:
+        """放入結果 metadata 的摘要"""
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(self.root.duration_ms, 1),
+            "critical_path": self.critical_path(),
+            "waterfall": self.waterfall()
+        }
+
+
+class Tracer:
+    """建立 trace/span 並匯出為 JSON Lines"""
+
+    def __init__(self, export_path: Optional[str] = None):
+        self.export_path = export_path
+        self._export_lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Trace]:
+        """開始一條新的 trace，結束時匯出"""
+
+        trace = Trace(name, attributes)
+        token = _current_span.set(trace.root)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.root.error = str(e)
+            raise
+        finally:
+            trace.root.end()
+            _current_span.reset(token)
+            self.export(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """在目前的 trace 下建立子 span；沒有 trace 時為空操作"""
+
+        parent = _current_span.get()
+        if parent is None:
+            yield NULL_SPAN
+            return
+
+        span = parent.trace.new_span(name, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+
+    def start_trace(self, name: str, **attributes: Any) -> Trace:
+        """
+        開始一條 trace 但不設為目前的 span
+
+        供流水線使用：同一請求依序經過多個工作協程，各段以 activate() 掛上，結束時呼叫 finish_trace()
+        """
+        return Trace(name, attributes)
+
+    @contextmanager
+    def activate(self, span: Span) -> Iterator[Span]:
+        """在區塊內以指定的 span 作為目前的 span"""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    def finish_trace(self, trace: Trace, error: Optional[str] = None):
+        """結束 start_trace() 建立的 trace 並匯出"""
+        if error:
+            trace.root.error = error
+        trace.root.end()
+        self.export(trace)
+
+    def current_span(self) -> Any:
+        """目前的 span (沒有時回傳空 span)"""
+        return _current_span.get() or NULL_SPAN
+
+    def export(self, trace: Trace):
+        """以 OTLP 相容形狀附加寫入 JSON Lines (每行一個 resourceSpans)"""
+
+        if not self.export_path:
+            return
+
+        record = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", "yourpods")]},
+                "scopeSpans": [{
+                    "scope": {"name": "yourpods"},
+                    "spans": [span.to_otlp() for span in trace.spans]
+                }]
+            }]
+        }
+
+        try:
+            os.makedirs(os.path.dirname(self.export_path) or '.', exist_ok=True)
+            with self._export_lock:
+                with open(self.export_path, 'a', encoding='utf-8') as f:
+                    f.write(dumps(record) + "\n")
+        except OSError as e:
+            logger.warning(f"⚠️ Trace 匯出失敗: {str(e)}")
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+# 全局 tracer (匯出路徑由環境變數或 CLI 設定)
+TRACER = Tracer(os.getenv('TRACE_EXPORT_PATH') or None)